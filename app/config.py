@@ -1,5 +1,6 @@
 from pydantic_settings import BaseSettings
 from pathlib import Path
+from typing import Dict, List
 import os
 
 # 获取项目根目录
@@ -13,6 +14,8 @@ class Settings(BaseSettings):
     DB_PASSWORD: str
     DB_NAME: str
     
+    DATABASE_URL: str = ""  # 完整的异步数据库URL，设置后覆盖上面的 MySQL 配置，如本地测试用 sqlite+aiosqlite:///./data/dev.db
+    
     # 数据库连接池配置
     POOL_SIZE: int = 5
     MAX_OVERFLOW: int = 10
@@ -20,14 +23,144 @@ class Settings(BaseSettings):
     @property
     def DB_ASYNC_URL(self) -> str:
         """获取异步数据库URL"""
+        if self.DATABASE_URL:
+            return self.DATABASE_URL
         # 确保密码中的特殊字符被正确编码
         encoded_password = self.DB_PASSWORD.replace('@', '%40')
         return f"mysql+aiomysql://{self.DB_USER}:{encoded_password}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}"
     
+    # 微信公众号配置
+    WECHAT_TOKEN: str = ""  # 服务器配置中填写的 Token，用于校验消息签名
+    WECHAT_APP_ID: str = ""
+    WECHAT_APP_SECRET: str = ""
+    WECHAT_API_BASE: str = "https://api.weixin.qq.com"
+    WECHAT_TOKEN_CACHE_FILE: str = str(BASE_DIR / "data" / "wechat_access_token.json")  # 多 worker 共享的 access_token 缓存
+    WECHAT_TOKEN_REFRESH_MARGIN: int = 300  # 过期前多少秒主动刷新 access_token
+    WECHAT_HTTP_POOL_SIZE: int = 50  # 调用微信接口的 keep-alive 连接池大小
+    WECHAT_SENDER_WORKERS: int = 20  # 发送消息的 worker 协程数
+    WECHAT_RATE_LIMITS: Dict[str, float] = {  # 各接口每秒最大调用次数
+        "/cgi-bin/message/custom/send": 100,
+        "/cgi-bin/message/template/send": 50,
+    }
+    WECHAT_DEFAULT_RATE: float = 20  # 未单独配置的接口每秒最大调用次数
+    WECHAT_MAX_RETRIES: int = 3  # 临时错误最大重试次数
+    WECHAT_WORKERS: int = 4  # 后台处理消息的 worker 协程数
+    WECHAT_QUEUE_SIZE: int = 10000  # 待处理消息队列长度上限
+    WECHAT_DEDUP_TTL: int = 60  # 消息去重保留时长（秒），覆盖微信 3 次重试
+    WECHAT_DEDUP_MAX_SIZE: int = 100000  # 去重集合容量上限
+    WECHAT_DEDUP_BACKEND: str = "local"  # local：仅本进程去重；redis：通过 Redis 在多个 worker 间去重
+    WECHAT_DEDUP_REDIS_URL: str = "redis://localhost:6379/0"
+    WECHAT_TICKET_CODE_TTL: int = 1800  # 问题单绑定验证码有效期（秒）
+    WECHAT_TICKET_CODE_MAX_ATTEMPTS: int = 5  # 验证码输错多少次后作废
+
+    # 微信会话配置
+    SESSION_TTL: int = 1800  # 会话空闲多少秒后过期
+    SESSION_MAX_COUNT: int = 50000  # 内存中最多保留的会话数
+    SESSION_TICK: float = 1.0  # 过期检查的时间轮精度（秒）
+    SESSION_HISTORY_SIZE: int = 20  # 每个会话保留的最近消息数
+    SESSION_SNAPSHOT_FILE: str = str(BASE_DIR / "data" / "wechat_sessions.json")  # 会话快照，每个 worker 写 wechat_sessions.<pid>.json
+    SESSION_SNAPSHOT_INTERVAL: int = 60  # 会话快照间隔（秒）
+
+    # 关键词自动回复配置
+    KEYWORD_RULES_FILE: str = str(BASE_DIR / "data" / "keyword_rules.json")  # 规则文件，修改后自动重新加载
+    KEYWORD_RULES_RELOAD_INTERVAL: int = 10  # 检查规则文件变化的间隔（秒）
+
+    # 附件存储配置
+    ATTACHMENT_DIR: str = str(BASE_DIR / "data" / "attachments")  # 按内容哈希存储的附件目录
+    ATTACHMENT_CHUNK_SIZE: int = 64 * 1024  # 流式读写块大小（字节）
+    ATTACHMENT_MAX_SIZE: int = 200 * 1024 * 1024  # 上传附件大小上限（字节）
+    ATTACHMENT_GC_GRACE: int = 3600  # 不再被引用的附件文件至少闲置多少秒后才删除，避免删掉并发上传正要引用的文件
+    ATTACHMENT_ACCEL_REDIRECT_PREFIX: str = ""  # 设置后下载由 nginx 通过 X-Accel-Redirect 发送文件（sendfile 零拷贝），如 /protected-attachments/
+    THUMBNAIL_SIZES: Dict[str, int] = {  # 图片附件缩略图尺寸名称 -> 长边像素，通过下载接口的 size 参数获取
+        "small": 160,
+        "medium": 480,
+        "large": 1080,
+    }
+    THUMBNAIL_WORKERS: int = 2  # 生成缩略图的进程数
+    THUMBNAIL_QUALITY: int = 80  # 缩略图 JPEG 质量
+    MEDIA_DOWNLOAD_CONCURRENCY: int = 8  # 同时下载的微信媒体文件数
+
+    # 大模型配置
+    LLM_BACKEND: str = "fake"  # fake：本地假后端；openai：兼容 OpenAI 接口的后端
+    LLM_API_BASE: str = ""
+    LLM_API_KEY: str = ""
+    LLM_MODEL: str = ""
+    LLM_FAKE_FIRST_TOKEN_DELAY: float = 0.2  # 假后端首 token 延迟（秒）
+    LLM_FAKE_TOKEN_INTERVAL: float = 0.02  # 假后端 token 间隔（秒）
+    LLM_MAX_CONCURRENCY: int = 4  # 同时进行的生成数上限
+    LLM_QUEUE_TIMEOUT: float = 30  # 排队超过该时间（秒）未开始生成则丢弃
+    LLM_USER_MAX_QUEUED: int = 8  # 单个用户最多排队的请求数
+    LLM_BATCH_MAX_SIZE: int = 1  # 批量生成的最大批次，1 表示不合并（仅对支持批量的后端生效）
+    LLM_BATCH_WINDOW: float = 0.02  # 合并批次的等待窗口（秒）
+    LLM_CACHE_ENABLED: bool = True
+    LLM_CACHE_MAX_ENTRIES: int = 2000  # 内存缓存条数上限
+    LLM_CACHE_TTL: int = 86400  # 缓存有效期（秒）
+    LLM_CACHE_SQLITE_PATH: str = ""  # 磁盘缓存 SQLite 文件路径，为空则只使用内存缓存
+
+    # 问题单变更推送配置
+    TICKET_EVENTS_QUEUE_SIZE: int = 100  # 每个订阅者最多积压的事件数，超过则断开
+    TICKET_EVENTS_HEARTBEAT: float = 15  # 心跳间隔（秒），防止代理断开空闲连接
+    TICKET_EVENTS_CHANNEL: str = "local"  # local：仅本进程；redis：通过 Redis 在多个 worker 间广播
+    TICKET_EVENTS_REDIS_URL: str = "redis://localhost:6379/0"
+    TICKET_EVENTS_REDIS_CHANNEL: str = "ticket_events"
+
+    # 问题单增量同步配置
+    TICKET_SYNC_PAGE_SIZE: int = 500  # 每次最多返回的变更数
+    TICKET_SYNC_SAFETY_WINDOW: float = 5  # 最近该时间（秒）内的变更下次同步时重复返回，避免漏掉提交较晚的事务
+
+    # 批量操作配置
+    BATCH_GET_MAX_IDS: int = 200  # batch-get 接口每次最多查询的ID数
+    TICKET_BULK_CHUNK_SIZE: int = 500  # 批量更新 / 删除问题单时每个事务处理的行数
+
+    # 幂等键配置（创建接口的 Idempotency-Key 请求头）
+    IDEMPOTENCY_TTL: int = 86400  # 首次响应保存时长（秒）
+    IDEMPOTENCY_MEMORY_SIZE: int = 10000  # 内存中最多保留的响应数
+    IDEMPOTENCY_PENDING_TIMEOUT: float = 60  # 首次请求处理超过该时间（秒）仍未完成，视为已失效，可被重新执行
+    IDEMPOTENCY_WAIT_TIMEOUT: float = 30  # 重复请求等待首次请求完成的最长时间（秒），超时返回 409
+    IDEMPOTENCY_CLEANUP_INTERVAL: int = 3600  # 清理过期记录的间隔（秒）
+
+    # 后台任务配置
+    JOB_RUNNER_ENABLED: bool = True
+    JOB_WORKERS: int = 4  # 执行任务的 worker 协程数
+    JOB_POLL_INTERVAL: float = 1.0  # 没有任务时的轮询间隔（秒）
+    JOB_VISIBILITY_TIMEOUT: int = 300  # 任务领取后的锁定时间（秒），执行中定期续期，worker 失效后超时可被重新领取
+    JOB_MAX_ATTEMPTS: int = 5  # 默认最大执行次数
+    JOB_RETRY_BASE_DELAY: float = 5  # 重试退避的基础间隔（秒），按 2 的指数增长
+    JOB_RETRY_MAX_DELAY: float = 600  # 重试退避的最大间隔（秒）
+
+    # 响应压缩配置
+    COMPRESSION_MIN_SIZE: int = 1024  # 小于该字节数的响应不压缩
+    COMPRESSION_OFFLOAD_SIZE: int = 256 * 1024  # 超过该字节数的响应在线程池中压缩
+    COMPRESSION_BUFFER_MAX: int = 8 * 1024 * 1024  # 分块响应最多缓冲的字节数，超过则不压缩
+    COMPRESSION_CACHE_BYTES: int = 32 * 1024 * 1024  # 压缩结果缓存上限（字节）
+    COMPRESSION_GZIP_LEVEL: int = 6
+    COMPRESSION_BROTLI_QUALITY: int = 5
+
+    # 生产环境服务配置
+    SERVER_HOST: str = "0.0.0.0"
+    SERVER_PORT: int = 8001
+    SERVER_WORKERS: int = 0  # 0 表示使用 CPU 核数
+    SERVER_MAX_REQUESTS: int = 10000  # 单个 worker 处理请求数上限，达到后回收
+    SERVER_MAX_REQUESTS_JITTER: int = 1000  # 每个 worker 的上限再加 0 ~ 该值的随机数，避免所有 worker 同时回收
+    SERVER_GRACEFUL_TIMEOUT: int = 30  # 关闭 worker 时等待在途请求的秒数
+
     # JWT配置
     JWT_SECRET_KEY: str
     JWT_ALGORITHM: str = "HS256"
     JWT_ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+
+    # 管理员用户ID列表（JSON格式，如 [1, 2]）
+    ADMIN_USER_IDS: List[int] = []
+
+    # 请求剖析配置
+    PROFILE_HEADER_TOKEN: str = ""  # 请求头 X-Profile-Token 与之相同时剖析该请求，为空则不按请求头触发
+    PROFILE_SAMPLE_RATE: float = 0.0  # 随机剖析的请求比例（0~1），0 表示关闭
+    PROFILE_INTERVAL: float = 0.005  # 调用栈采样间隔（秒）
+
+    # 事件循环延迟监控配置
+    LOOP_LAG_ENABLED: bool = True
+    LOOP_LAG_INTERVAL: float = 0.1  # 探测间隔（秒）
+    LOOP_LAG_THRESHOLD: float = 0.1  # 超过该延迟（秒）时告警并抓取调用栈
     
     class Config:
         env_file = str(BASE_DIR / ".env")
@@ -6,14 +6,19 @@ from typing import AsyncGenerator
 from app.config import settings
 
 
+# 连接池参数（SQLite 使用驱动自带的连接池，不支持这些参数）
+pool_options = {} if settings.DB_ASYNC_URL.startswith("sqlite") else {
+    "pool_size": settings.POOL_SIZE,
+    "max_overflow": settings.MAX_OVERFLOW,
+    "pool_recycle": 3600,
+}
+
 # 异步引擎
 engine = create_async_engine(
     settings.DB_ASYNC_URL,
-    pool_size=settings.POOL_SIZE,
-    max_overflow=settings.MAX_OVERFLOW,
-    pool_recycle=3600,
     pool_pre_ping=True,
-    echo=False  # 设置为 True 则会在控制台输出执行的 SQL 语句，方便调试
+    echo=False,  # 设置为 True 则会在控制台输出执行的 SQL 语句，方便调试
+    **pool_options
 )
 
 # 异步会话工厂
@@ -0,0 +1,26 @@
+# 按模型直接建表，用于本地 SQLite 开发；MySQL 等正式环境使用 alembic 迁移
+#
+# 用法：DATABASE_URL=sqlite+aiosqlite:///./data/dev.db python -m app.db_services.init_db
+import os
+import asyncio
+
+from sqlmodel import SQLModel
+
+import app.models  # noqa: F401  导入所有模型，注册到 SQLModel.metadata
+from app.config import settings
+from app.db_services.database import engine
+
+
+async def init_db():
+    if settings.DATABASE_URL.startswith("sqlite"):
+        # SQLite 不会自动创建数据库文件所在的目录
+        path = settings.DATABASE_URL.split(":///", 1)[-1]
+        if path and path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(init_db())
@@ -1,8 +1,9 @@
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Query, WebSocketException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.utils.jwt import verify_token
-from app.db_services.database import get_db
+from app.config import settings
+from app.db_services.database import get_db, async_session_factory
 from app.models.user import User
 from sqlalchemy import select
 
@@ -37,4 +38,30 @@ async def get_current_user(
             }
         )
     
-    return user 
\ No newline at end of file
+    return user
+
+
+async def get_websocket_user(
+    token: str = Query(..., description="访问令牌，浏览器 WebSocket 无法设置请求头，通过查询参数传递")
+) -> User:
+    """获取 WebSocket 连接的当前用户，认证失败时以 1008 关闭连接"""
+    try:
+        # 不使用 get_db：WebSocket 的依赖在整个连接期间不会释放，会一直占用数据库连接
+        async with async_session_factory() as db:
+            return await get_current_user(token, db)
+    except HTTPException as e:
+        detail = e.detail.get("message") if isinstance(e.detail, dict) else str(e.detail)
+        raise WebSocketException(code=status.WS_1008_POLICY_VIOLATION, reason=detail)
+
+
+async def get_admin_user(current_user: User = Depends(get_current_user)) -> User:
+    """获取当前管理员用户"""
+    if current_user.id not in settings.ADMIN_USER_IDS:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail={
+                "message": "无权限访问",
+                "errors": ["需要管理员权限"]
+            }
+        )
+    return current_user
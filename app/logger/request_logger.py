@@ -6,6 +6,21 @@ from .logger import get_logger
 
 logger = get_logger('request')
 
+# 只记录这些类型且不超过该大小的请求体；文件上传等请求体需要流式读取，不能在这里读入内存
+LOG_BODY_CONTENT_TYPES = ("application/json", "application/x-www-form-urlencoded", "text/")
+LOG_BODY_MAX_SIZE = 64 * 1024
+
+
+def _should_log_body(request: Request) -> bool:
+    content_type = request.headers.get("content-type", "")
+    content_length = request.headers.get("content-length")
+    return (
+        content_type.startswith(LOG_BODY_CONTENT_TYPES)
+        and content_length is not None
+        and content_length.isdigit()
+        and int(content_length) <= LOG_BODY_MAX_SIZE
+    )
+
 class RequestLoggerMiddleware(BaseHTTPMiddleware):
     async def dispatch(self, request: Request, call_next):
         # 记录请求开始时间
@@ -23,12 +38,13 @@ class RequestLoggerMiddleware(BaseHTTPMiddleware):
         }
         
         # 尝试获取请求体
-        try:
-            body = await request.body()
-            if body:
-                request_info["body"] = body.decode()
-        except Exception as e:
-            request_info["body"] = f"无法读取请求体: {str(e)}"
+        if _should_log_body(request):
+            try:
+                body = await request.body()
+                if body:
+                    request_info["body"] = body.decode()
+            except Exception as e:
+                request_info["body"] = f"无法读取请求体: {str(e)}"
         
         # 记录请求信息
         logger.info(f"收到请求: {json.dumps(request_info, ensure_ascii=False, indent=2)}")
@@ -0,0 +1,206 @@
+import gzip
+import hashlib
+from collections import OrderedDict
+from typing import Dict
+
+import anyio
+from starlette.datastructures import Headers, MutableHeaders
+
+from app.config import settings
+from app.logger import get_logger
+from app.utils.conditional import encoded_etag
+
+try:
+    import brotli
+except ImportError:  # 未安装 brotli 时只使用 gzip
+    brotli = None
+
+logger = get_logger('compression')
+
+# 本身已压缩或不适合压缩的内容类型
+SKIP_CONTENT_TYPES = (
+    "image/", "video/", "audio/",
+    "application/zip", "application/gzip", "application/x-gzip",
+    "application/octet-stream", "text/event-stream",
+)
+
+
+def _compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=settings.COMPRESSION_BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=settings.COMPRESSION_GZIP_LEVEL, mtime=0)
+
+
+class CompressedCache:
+    """按响应体摘要缓存压缩结果，热点响应只压缩一次，按总字节数做 LRU 淘汰"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    @staticmethod
+    def make_key(body: bytes, encoding: str):
+        return encoding, hashlib.blake2b(body, digest_size=16).digest()
+
+    def get(self, key):
+        value = self._entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value: bytes):
+        if len(value) > self.max_bytes or key in self._entries:
+            return
+        self._entries[key] = value
+        self.size += len(value)
+        while self.size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= len(evicted)
+
+
+compressed_cache = CompressedCache(settings.COMPRESSION_CACHE_BYTES)
+
+
+def _parse_accept_encoding(header: str) -> Dict[str, float]:
+    """解析 Accept-Encoding，返回 编码 -> q 值；q 值无法解析的项忽略"""
+    weights = {}
+    for item in header.split(","):
+        coding, _, params = item.partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value.strip())
+                except ValueError:
+                    q = -1.0
+        if 0 <= q <= 1:
+            weights[coding] = q
+    return weights
+
+
+def _select_encoding(scope) -> str:
+    """根据 Accept-Encoding 选择 q 值最高的压缩算法，q 值相同时优先 brotli，q=0 表示不接受"""
+    weights = _parse_accept_encoding(Headers(scope=scope).get("accept-encoding", ""))
+    candidates = ("br", "gzip") if brotli is not None else ("gzip",)
+    best, best_q = "", 0.0
+    for encoding in candidates:
+        q = weights.get(encoding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+class CompressionMiddleware:
+    """
+    响应压缩中间件（gzip，已安装 brotli 时优先 br）
+
+    - 小于 COMPRESSION_MIN_SIZE 的响应、已压缩的附件/媒体、SSE 等流式响应不压缩
+    - 超过 COMPRESSION_OFFLOAD_SIZE 的响应在线程池中压缩，避免阻塞事件循环
+    - 压缩结果按响应体摘要缓存，相同内容的热点响应只压缩一次
+    - 强 ETag 加上编码后缀（如 "5-gzip"），与未压缩的表示区分，见 app.utils.conditional
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = _select_encoding(scope)
+        if not encoding:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        passthrough = False
+        chunks = []
+        buffered = 0
+
+        async def flush_uncompressed(message):
+            # 放弃压缩，原样发送已缓冲的内容
+            nonlocal passthrough
+            passthrough = True
+            await send(start_message)
+            for chunk in chunks:
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            chunks.clear()
+            await send(message)
+
+        async def send_wrapper(message):
+            nonlocal start_message, passthrough, buffered
+            if passthrough:
+                await send(message)
+                return
+
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                content_type = headers.get("content-type", "")
+                if (
+                    "content-encoding" in headers
+                    or "accept-ranges" in headers  # 支持断点续传的文件下载，压缩后 Range 偏移不再对应原文件
+                    or content_type.startswith(SKIP_CONTENT_TYPES)
+                    or headers.get("content-disposition", "").startswith("attachment")
+                ):
+                    passthrough = True
+                    await send(message)
+                else:
+                    start_message = message
+                return
+
+            if message["type"] != "http.response.body":
+                await flush_uncompressed(message)
+                return
+
+            body = message.get("body", b"")
+            if message.get("more_body", False):
+                # 分块到达的响应先缓冲，超过上限则视为真正的流式响应，不再压缩
+                if buffered + len(body) > settings.COMPRESSION_BUFFER_MAX:
+                    await flush_uncompressed(message)
+                else:
+                    chunks.append(body)
+                    buffered += len(body)
+                return
+            if chunks:
+                chunks.append(body)
+                body = b"".join(chunks)
+                chunks.clear()
+
+            if len(body) < settings.COMPRESSION_MIN_SIZE:
+                await flush_uncompressed({"type": "http.response.body", "body": body})
+                return
+
+            compressed = await self._compress_cached(body, encoding)
+            headers = MutableHeaders(raw=start_message["headers"])
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(compressed))
+            if "etag" in headers:
+                headers["ETag"] = encoded_etag(headers["etag"], encoding)
+            headers.add_vary_header("Accept-Encoding")
+            await send(start_message)
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_wrapper)
+
+    @staticmethod
+    async def _compress_cached(body: bytes, encoding: str) -> bytes:
+        key = compressed_cache.make_key(body, encoding)
+        compressed = compressed_cache.get(key)
+        if compressed is not None:
+            return compressed
+        if len(body) >= settings.COMPRESSION_OFFLOAD_SIZE:
+            compressed = await anyio.to_thread.run_sync(_compress, body, encoding)
+        else:
+            compressed = _compress(body, encoding)
+        compressed_cache.put(key, compressed)
+        return compressed
@@ -1,6 +1,9 @@
 # app/models/__init__.py
 from .user import User
 from .ticket import Ticket
+from .job import Job
+from .idempotency import IdempotencyRecord
+from .wechat import WechatTicketCode, WechatTicketBinding
 
 
-__all__ = ["User", "Ticket"]
+__all__ = ["User", "Ticket", "Job", "IdempotencyRecord", "WechatTicketCode", "WechatTicketBinding"]
@@ -0,0 +1,21 @@
+from datetime import datetime, timezone
+from typing import Optional
+from sqlmodel import SQLModel, Field
+from sqlalchemy import Index, Text, UniqueConstraint
+
+
+class IdempotencyRecord(SQLModel, table=True):
+    """幂等键记录表，保存创建接口的首次响应，重试时直接返回"""
+    __table_args__ = (
+        UniqueConstraint("scope", "key", name="uq_idempotencyrecord_scope_key"),  # 插入成功即占用该幂等键
+        Index("ix_idempotencyrecord_expires_at", "expires_at"),  # 清理过期记录
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    scope: str = Field(max_length=100)  # 接口及用户，不同接口或用户的相同幂等键互不影响
+    key: str = Field(max_length=200)  # 客户端传入的 Idempotency-Key
+    request_hash: str = Field(max_length=64)  # 请求内容 sha256，同一幂等键对应不同请求内容时拒绝
+    status_code: Optional[int] = Field(default=None)  # 为空表示首次请求仍在处理中
+    body: Optional[str] = Field(default=None, sa_type=Text)  # 首次响应的 JSON
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    expires_at: datetime
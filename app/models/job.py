@@ -0,0 +1,34 @@
+from datetime import datetime, timezone
+from enum import Enum
+from typing import Optional
+from sqlmodel import SQLModel, Field
+from sqlalchemy import Index, Text
+
+
+class JobStatus(str, Enum):
+    PENDING = "pending"  # 等待执行（含等待重试）
+    RUNNING = "running"  # 已被 worker 领取
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"  # 重试次数用尽
+
+
+class Job(SQLModel, table=True):
+    """后台任务表"""
+    __table_args__ = (
+        Index("ix_job_status_run_at", "status", "run_at"),  # 领取任务时按状态和可执行时间查找
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    name: str = Field(max_length=100, index=True)  # 任务类型，对应注册的处理函数
+    payload: str = Field(sa_type=Text, default="{}")  # 任务参数（JSON）
+    user_id: Optional[int] = Field(default=None, index=True)  # 创建任务的用户，系统任务为空；不设外键，用户删除后任务记录保留
+    status: JobStatus = Field(default=JobStatus.PENDING)
+    attempts: int = Field(default=0)  # 已执行次数
+    max_attempts: int = Field(default=5)
+    run_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))  # 最早可执行时间
+    locked_by: Optional[str] = Field(default=None, max_length=100)  # 领取任务的 worker
+    locked_until: Optional[datetime] = Field(default=None)  # 超过该时间未续期视为 worker 已失效，任务可被重新领取
+    last_error: Optional[str] = Field(default=None, sa_type=Text)
+    result: Optional[str] = Field(default=None, sa_type=Text)  # 执行结果（JSON）
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    finished_at: Optional[datetime] = Field(default=None)
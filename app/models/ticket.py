@@ -1,7 +1,8 @@
 from datetime import datetime, timezone
+from enum import Enum
 from typing import Optional, List
 from sqlmodel import SQLModel, Field, Relationship
-from sqlalchemy import Text, Enum
+from sqlalchemy import Column, Index, Integer, Text
 
 class TicketAttachmentLink(SQLModel, table=True):
     ticket_id: int = Field(foreign_key="ticket.id", primary_key=True)
@@ -20,6 +21,9 @@ class Attachment(SQLModel, table=True):
     ticket_id: int = Field(foreign_key="ticket.id")
     file_path: str = Field(max_length=200)
     file_type: str = Field(max_length=50)
+    content_type: Optional[str] = Field(default=None, max_length=100)  # 文件 MIME 类型，下载时使用
+    content_hash: Optional[str] = Field(default=None, max_length=64, index=True)  # 文件内容 sha256
+    file_size: Optional[int] = Field(default=None)  # 文件大小（字节）
     upload_time: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
     tickets: List["Ticket"] = Relationship(
@@ -37,10 +41,25 @@ class TicketBase(SQLModel):
     handling_method: Optional[str] = Field(sa_type=Text, nullable=True)  # 处理方法，可选
 
 
+# 问题单版本号列，乐观锁：每次更新加 1，更新时校验版本号未变
+_ticket_version_column = Column("version", Integer, nullable=False, server_default="1")
+
+
 class Ticket(TicketBase, table=True):
+    __table_args__ = (
+        Index("ix_ticket_updated_at_id", "updated_at", "id"),  # 增量同步按 (updated_at, id) 顺序读取
+    )
+    # ORM 刷新修改时自动递增版本号，并在 UPDATE 条件中带上原版本号，版本不符时抛出 StaleDataError
+    __mapper_args__ = {"version_id_col": _ticket_version_column}
+
     id: Optional[int] = Field(default=None, primary_key=True)
     user_id: int = Field(foreign_key="user.id")
     create_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    updated_at: datetime = Field(
+        default_factory=lambda: datetime.now(timezone.utc),
+        sa_column_kwargs={"onupdate": lambda: datetime.now(timezone.utc)}
+    )  # 最后修改时间，创建时等于创建时间
+    version: int = Field(default=1, sa_column=_ticket_version_column)  # 版本号，客户端修改时通过 If-Match 带上
 
     # 关联关系
     histories: List["TicketHistory"] = Relationship(back_populates="ticket")
@@ -52,6 +71,17 @@ class Ticket(TicketBase, table=True):
     )
 
 
+class TicketTombstone(SQLModel, table=True):
+    """已删除问题单记录，供客户端增量同步删除"""
+    __table_args__ = (
+        Index("ix_tickettombstone_deleted_at_id", "deleted_at", "id"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    ticket_id: int  # 不设外键，问题单已删除
+    deleted_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+
 class TicketHistory(TicketBase, table=True):
     """问题单修改记录表"""
     id: Optional[int] = Field(default=None, primary_key=True)
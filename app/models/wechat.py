@@ -0,0 +1,20 @@
+from datetime import datetime, timezone
+from typing import Optional
+from sqlmodel import SQLModel, Field
+
+
+class WechatTicketCode(SQLModel, table=True):
+    """问题单绑定验证码表，由问题单创建人或坐席生成，客户在微信中发送后才能把媒体文件保存到该问题单"""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    ticket_id: int = Field(foreign_key="ticket.id", index=True)  # 每个问题单同一时间只有一个有效验证码
+    code_hash: str = Field(max_length=64)  # 验证码 sha256，不保存明文
+    created_by: int = Field(foreign_key="user.id")  # 生成验证码的用户
+    attempts: int = Field(default=0)  # 输错次数，达到上限后验证码作废
+    expires_at: datetime
+
+
+class WechatTicketBinding(SQLModel, table=True):
+    """微信用户当前选择的问题单，保存在数据库中，多个 worker 共享"""
+    openid: str = Field(max_length=64, primary_key=True)
+    ticket_id: int = Field(foreign_key="ticket.id", index=True)
+    bound_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
@@ -0,0 +1,4 @@
+from .profiler import ProfilerMiddleware, profiler_state
+from .loop_monitor import loop_monitor
+
+__all__ = ['ProfilerMiddleware', 'profiler_state', 'loop_monitor']
@@ -0,0 +1,129 @@
+import sys
+import time
+import asyncio
+import threading
+from collections import Counter
+
+from app.config import settings
+from app.logger import get_logger
+from .profiler import format_stack
+
+logger = get_logger('loop_monitor')
+
+# 延迟直方图分桶上限（秒）
+LAG_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class LoopLagMonitor:
+    """
+    事件循环延迟监控
+
+    协程按固定间隔 sleep，实际唤醒时间与预期时间之差即为事件循环延迟；
+    看门狗线程检查协程心跳，一旦心跳停滞超过阈值，说明事件循环正被同步代码阻塞，
+    此时从看门狗线程抓取事件循环线程的调用栈，每次阻塞只抓取一次。
+    """
+
+    def __init__(self, interval: float, threshold: float, max_stacks: int = 200):
+        self.interval = interval
+        self.threshold = threshold
+        self.max_stacks = max_stacks
+        self._task = None
+        self._watchdog = None
+        self._stop_event = threading.Event()
+        self._loop_thread_id = None
+        self._heartbeat = time.monotonic()
+        self._captured_heartbeat = None
+        self._stacks_lock = threading.Lock()  # stacks 由看门狗线程写入、事件循环读取
+        self.reset()
+
+    def reset(self):
+        """清空统计数据"""
+        self.histogram = [0] * (len(LAG_BUCKETS) + 1)
+        self.samples = 0
+        self.total_lag = 0.0
+        self.max_lag = 0.0
+        with self._stacks_lock:
+            self.stacks = Counter()
+
+    async def start(self):
+        """在事件循环中启动监控"""
+        if self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stop_event.clear()
+        self._task = asyncio.create_task(self._probe())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-lag-watchdog", daemon=True)
+        self._watchdog.start()
+        logger.info(f"事件循环延迟监控已启动，采样间隔 {self.interval}s，告警阈值 {self.threshold}s")
+
+    async def stop(self):
+        """停止监控"""
+        if self._task is None:
+            return
+        self._stop_event.set()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        await asyncio.to_thread(self._watchdog.join)
+        self._task = None
+        self._watchdog = None
+
+    async def _probe(self):
+        while True:
+            start = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self._heartbeat = now
+            self._record(max(now - start - self.interval, 0.0))
+
+    def _record(self, lag: float):
+        index = 0
+        while index < len(LAG_BUCKETS) and lag > LAG_BUCKETS[index]:
+            index += 1
+        self.histogram[index] += 1
+        self.samples += 1
+        self.total_lag += lag
+        self.max_lag = max(self.max_lag, lag)
+        if lag > self.threshold:
+            logger.warning(f"事件循环阻塞 {lag * 1000:.1f}ms，超过阈值 {self.threshold * 1000:.0f}ms")
+
+    def _watch(self):
+        check_interval = min(self.interval, self.threshold) / 2
+        while not self._stop_event.wait(check_interval):
+            heartbeat = self._heartbeat
+            stalled = time.monotonic() - heartbeat - self.interval
+            if stalled <= self.threshold or heartbeat == self._captured_heartbeat:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            stack = format_stack(frame)
+            self._captured_heartbeat = heartbeat
+            with self._stacks_lock:
+                if stack in self.stacks or len(self.stacks) < self.max_stacks:
+                    self.stacks[stack] += 1
+            logger.warning(f"事件循环已阻塞 {stalled * 1000:.1f}ms，当前调用栈: {stack.rsplit(';', 5)[-5:]}")
+
+    def snapshot(self, top: int = 10) -> dict:
+        """当前延迟直方图及最常见的阻塞调用栈"""
+        buckets = [f"<={bound}s" for bound in LAG_BUCKETS] + [f">{LAG_BUCKETS[-1]}s"]
+        with self._stacks_lock:
+            top_stacks = self.stacks.most_common(top)
+        return {
+            "interval": self.interval,
+            "threshold": self.threshold,
+            "samples": self.samples,
+            "avg_lag": self.total_lag / self.samples if self.samples else 0.0,
+            "max_lag": self.max_lag,
+            "histogram": dict(zip(buckets, self.histogram)),
+            "top_stacks": [
+                {"count": count, "stack": stack.split(";")}
+                for stack, count in top_stacks
+            ]
+        }
+
+
+loop_monitor = LoopLagMonitor(settings.LOOP_LAG_INTERVAL, settings.LOOP_LAG_THRESHOLD)
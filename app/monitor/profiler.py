@@ -0,0 +1,137 @@
+import os
+import sys
+import hmac
+import time
+import random
+import asyncio
+import threading
+from collections import Counter
+from datetime import datetime
+
+from app.config import settings
+from app.logger.logger import LOG_DIR
+from app.logger import get_logger
+
+logger = get_logger('profiler')
+
+# 剖析结果输出目录
+PROFILE_DIR = os.path.join(LOG_DIR, 'profiles')
+
+# 触发剖析的请求头
+PROFILE_HEADER = b"x-profile-token"
+
+
+def format_stack(frame) -> str:
+    """将调用栈转换为 collapsed 格式（根帧在前，以分号分隔）"""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    names.reverse()
+    return ";".join(names)
+
+
+class StackSampler:
+    """在后台线程中按固定间隔采样目标线程的调用栈"""
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self) -> Counter:
+        self._stop_event.set()
+        self._thread.join()
+        return self.stacks
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[format_stack(frame)] += 1
+
+
+class ProfilerState:
+    """剖析器运行时配置，可通过管理接口在线调整"""
+
+    def __init__(self):
+        self.header_token = settings.PROFILE_HEADER_TOKEN
+        self.sample_rate = settings.PROFILE_SAMPLE_RATE
+        self.interval = settings.PROFILE_INTERVAL
+        self.active = False  # 同一时间只剖析一个请求
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.header_token) or self.sample_rate > 0
+
+    def should_profile(self, scope) -> bool:
+        """判断当前请求是否需要剖析"""
+        if not self.enabled or self.active:
+            return False
+        if self.header_token:
+            for name, value in scope["headers"]:
+                if name == PROFILE_HEADER:
+                    # 常量时间比较，避免通过响应耗时逐字节猜出令牌
+                    return hmac.compare_digest(value, self.header_token.encode("utf-8"))
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+
+profiler_state = ProfilerState()
+
+
+def write_collapsed(file_path: str, stacks: Counter):
+    """写出 collapsed stacks 文件，可直接导入 speedscope 或 flamegraph.pl"""
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    with open(file_path, "w", encoding="utf-8") as f:
+        for stack, count in stacks.most_common():
+            f.write(f"{stack} {count}\n")
+
+
+class ProfilerMiddleware:
+    """
+    按请求剖析的 ASGI 中间件
+
+    请求头 X-Profile-Token 与配置一致，或命中采样比例时，在后台线程中采样事件循环线程的调用栈，
+    请求结束后将结果写入 logs/profiles 目录。未开启时只做一次判断，不产生额外开销。
+    注意：采样的是整个事件循环线程，同一时间并发执行的其他协程也会出现在结果中。
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not profiler_state.should_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        profiler_state.active = True
+        path = scope["path"].strip("/").replace("/", "_") or "root"
+        file_name = f"{datetime.now():%Y%m%d-%H%M%S}-{scope['method']}-{path}.collapsed"
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-file", file_name.encode("latin-1"))]
+            await send(message)
+
+        sampler = StackSampler(threading.get_ident(), profiler_state.interval)
+        start_time = time.perf_counter()
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            stacks = sampler.stop()
+            profiler_state.active = False
+            elapsed = time.perf_counter() - start_time
+            file_path = os.path.join(PROFILE_DIR, file_name)
+            try:
+                await asyncio.to_thread(write_collapsed, file_path, stacks)
+                logger.info(f"请求剖析完成: {scope['method']} {scope['path']}，耗时 {elapsed:.3f}s，"
+                            f"采样 {sum(stacks.values())} 次，结果文件: {file_path}")
+            except Exception as e:
+                logger.error(f"写入剖析结果失败: {str(e)}", exc_info=True)
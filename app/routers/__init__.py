@@ -2,6 +2,10 @@
 from fastapi import APIRouter
 from app.routers.user_router import router as user_router
 from app.routers.ticket_router import router as ticket_router
+from app.routers.admin_router import router as admin_router
+from app.routers.wechat_router import router as wechat_router
+from app.routers.llm import router as llm_router
+from app.routers.job_router import router as job_router
 
 # 创建父路由实例，配置公共属性
 router = APIRouter(
@@ -11,4 +15,8 @@ router = APIRouter(
 
 # 注册子路由
 router.include_router(user_router, prefix="/users", tags=["用户管理"])
-router.include_router(ticket_router, prefix="/tickets", tags=["工单管理"])
\ No newline at end of file
+router.include_router(ticket_router, prefix="/tickets", tags=["工单管理"])
+router.include_router(admin_router, prefix="/admin", tags=["系统管理"])
+router.include_router(wechat_router, prefix="/wechat", tags=["微信消息"])
+router.include_router(llm_router)
+router.include_router(job_router, prefix="/jobs", tags=["后台任务"])
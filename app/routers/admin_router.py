@@ -0,0 +1,104 @@
+import os
+from fastapi import APIRouter, Depends
+from app.dependencies.auth import get_admin_user
+from app.models.user import User
+from app.monitor import profiler_state, loop_monitor
+from app.monitor.profiler import PROFILE_DIR
+from app.schemas.admin_schema import ProfilerUpdate
+from app.services.wechat_service import wechat_dispatcher, wechat_sender
+from app.services.session_store import session_store
+from app.services.keyword_rules import keyword_engine
+from app.services.job_service import job_runner
+from app.services.ticket_events import ticket_broadcaster
+from app.services.thumbnail_service import thumbnail_service
+from app.services.idempotency_service import idempotency_store
+from app.logger import get_logger
+
+router = APIRouter()
+logger = get_logger('admin_router')
+
+
+def _profiler_info() -> dict:
+    """当前剖析配置及最近的剖析结果文件"""
+    files = sorted(os.listdir(PROFILE_DIR), reverse=True)[:20] if os.path.isdir(PROFILE_DIR) else []
+    return {
+        "enabled": profiler_state.enabled,
+        "sample_rate": profiler_state.sample_rate,
+        "header_token_set": bool(profiler_state.header_token),
+        "interval": profiler_state.interval,
+        "recent_files": files
+    }
+
+
+# 查询请求剖析配置
+@router.get("/profiler")
+async def get_profiler(current_user: User = Depends(get_admin_user)):
+    """查询请求剖析配置"""
+    return _profiler_info()
+
+
+# 在线调整请求剖析配置
+@router.put("/profiler")
+async def update_profiler(
+    profiler_data: ProfilerUpdate,
+    current_user: User = Depends(get_admin_user)
+):
+    """在线调整请求剖析配置"""
+    update_dict = profiler_data.model_dump(exclude_unset=True)
+    for field, value in update_dict.items():
+        setattr(profiler_state, field, value)
+    logger.info(f"管理员 {current_user.id} 调整请求剖析配置: {update_dict}")
+    return _profiler_info()
+
+
+# 查询事件循环延迟统计
+@router.get("/loop-lag")
+async def get_loop_lag(
+    top: int = 10,
+    reset: bool = False,
+    current_user: User = Depends(get_admin_user)
+):
+    """查询事件循环延迟直方图及最常见的阻塞调用栈"""
+    result = loop_monitor.snapshot(top)
+    if reset:
+        loop_monitor.reset()
+        logger.info(f"管理员 {current_user.id} 重置事件循环延迟统计")
+    return result
+
+
+# 查询微信消息处理统计
+@router.get("/wechat-stats")
+async def get_wechat_stats(current_user: User = Depends(get_admin_user)):
+    """查询微信消息处理统计"""
+    return {
+        "dispatcher": wechat_dispatcher.stats(),
+        "sender": wechat_sender.stats(),
+        "sessions": session_store.stats(),
+        "keyword_rules": keyword_engine.stats()
+    }
+
+
+# 查询后台任务统计
+@router.get("/jobs")
+async def get_job_stats(current_user: User = Depends(get_admin_user)):
+    """查询后台任务执行器状态及各状态的任务数"""
+    return await job_runner.stats()
+
+
+# 查询问题单变更推送统计
+@router.get("/ticket-events")
+async def get_ticket_event_stats(current_user: User = Depends(get_admin_user)):
+    """查询问题单变更推送的订阅者数量及投递统计"""
+    return ticket_broadcaster.stats()
+
+
+@router.get("/thumbnails")
+async def get_thumbnail_stats(current_user: User = Depends(get_admin_user)):
+    """查询缩略图生成、缓存命中及合并请求的统计"""
+    return thumbnail_service.stats()
+
+
+@router.get("/idempotency")
+async def get_idempotency_stats(current_user: User = Depends(get_admin_user)):
+    """查询幂等键的执行、重放及合并请求统计"""
+    return idempotency_store.stats()
@@ -0,0 +1,38 @@
+import orjson
+from fastapi import APIRouter, HTTPException, Depends, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.db_services.database import get_db
+from app.dependencies.auth import get_current_user
+from app.models.user import User
+from app.schemas.job_schema import JobResponse
+from app.services.job_service import get_job_service
+from app.logger import get_logger
+
+router = APIRouter()
+logger = get_logger('job_router')
+
+
+# 查询后台任务状态
+@router.get("/{job_id}", response_model=JobResponse)
+async def get_job(
+    job_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """查询后台任务状态及执行结果，只有任务的创建者和管理员可以查询"""
+    job = await get_job_service(db, job_id)
+    if job and job.user_id != current_user.id and current_user.id not in settings.ADMIN_USER_IDS:
+        # 按不存在处理，不暴露其他用户的任务
+        logger.warning(f"获取任务状态失败 - 无权限，任务ID: {job_id}，当前用户: {current_user.id}")
+        job = None
+    if not job:
+        logger.warning(f"获取任务状态失败 - 任务不存在，任务ID: {job_id}")
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="任务不存在"
+        )
+    response = JobResponse.model_validate(job)
+    response.result = orjson.loads(job.result) if job.result else None
+    return response
@@ -1,11 +1,21 @@
 # 其他业务路由
 
 # 导入APIRouter
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends
+from fastapi.responses import StreamingResponse
+
+from app.dependencies.auth import get_current_user
+from app.models.user import User
+from app.schemas.llm_schema import ChatRequest
+from app.services.llm_service import stream_reply, llm_metrics, backend_stats
+from app.services.llm_scheduler import LLMSchedulerError
+from app.utils.response import sse_event
+from app.logger import get_logger
 
 
 # 实例化APIRouter实例
 router = APIRouter(prefix="/llm", tags=["业务接口"])
+logger = get_logger('llm_router')
 
 
 # 注册具体方法
@@ -17,4 +27,43 @@ async def index():
     return {
         "code": 200,
         "msg": "Hello llm!"
-    }
\ No newline at end of file
+    }
+
+
+# 流式生成回复
+@router.post("/chat")
+async def chat(chat_data: ChatRequest, current_user: User = Depends(get_current_user)):
+    """
+    以 Server-Sent Events 流式返回大模型生成的回复
+
+    每个 token 一条 data 事件，结束时发送 done 事件，出错时发送 error 事件。
+    客户端断开时停止生成。
+    """
+    logger.info(f"收到生成回复请求，当前用户: {current_user.id}，问题单ID: {chat_data.ticket_id}")
+    params = {"temperature": chat_data.temperature, "max_tokens": chat_data.max_tokens}
+
+    async def event_stream():
+        try:
+            async for token in stream_reply(chat_data.prompt, params, user_id=current_user.id):
+                yield sse_event({"token": token})
+            yield sse_event({}, event="done")
+        except LLMSchedulerError as e:
+            yield sse_event({"message": "服务繁忙", "errors": [str(e)]}, event="error")
+        except Exception as e:
+            logger.error(f"生成回复失败: {str(e)}", exc_info=True)
+            yield sse_event({"message": "生成回复失败", "errors": [str(e)]}, event="error")
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+# 查询生成统计
+@router.get("/metrics")
+async def get_metrics(current_user: User = Depends(get_current_user)):
+    """查询生成请求统计（含首 token 延迟分位数，单位秒）、缓存命中率和排队情况"""
+    result = llm_metrics.summary()
+    result.update(backend_stats())
+    return result
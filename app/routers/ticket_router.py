@@ -1,15 +1,41 @@
-from fastapi import APIRouter, HTTPException, Depends, status
+import asyncio
+import os
+from fastapi import (
+    APIRouter, HTTPException, Depends, Header, Query, Request, Response, WebSocket, WebSocketDisconnect, status
+)
+from fastapi.responses import FileResponse, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
+from app.config import settings
 from app.db_services.database import get_db
 from app.services.ticket_service import (
     create_ticket_service, get_tickets_service, get_ticket_service,
-    update_ticket_service, delete_ticket_service
+    update_ticket_service, delete_ticket_service, get_ticket_changes_service, get_tickets_version_service,
+    get_tickets_by_ids_service, bulk_update_tickets_service, bulk_delete_tickets_service
+)
+from app.schemas.ticket_schema import (
+    TicketCreate, TicketResponse, TicketUpdate, TicketChanges, TicketBatchItem, AttachmentResponse,
+    TicketBulkUpdate, TicketBulkDelete, TicketBulkResult, WechatTicketCodeResponse
 )
-from app.schemas.ticket_schema import TicketCreate, TicketResponse, TicketUpdate
-from app.dependencies.auth import get_current_user
+from app.schemas.common_schema import BatchGetRequest
+from app.services.attachment_service import (
+    upload_attachment_service, get_attachments_service, get_attachment_service,
+    get_ticket_with_attachments_service
+)
+from app.services.attachment_archive import build_entries, iter_zip
+from app.services.attachment_storage import absolute_path
+from app.models.ticket import AttachmentType
+from app.services.ticket_events import ticket_broadcaster
+from app.services.thumbnail_service import thumbnail_service
+from app.services.idempotency_service import idempotency_store, request_fingerprint
+from app.services.wechat_ticket_service import issue_ticket_code
+from app.dependencies.auth import get_current_user, get_admin_user, get_websocket_user
 from app.models.user import User
-from typing import List
+from typing import List, Optional
 from app.logger import get_logger
+from app.utils.response import FastJSONResponse, sse_event
+from app.utils.conditional import (
+    weak_etag, version_etag, if_match_version, cache_headers, is_not_modified, not_modified
+)
 
 router = APIRouter()
 logger = get_logger('ticket_router')
@@ -20,22 +46,30 @@ logger = get_logger('ticket_router')
 async def create_ticket(
     ticket_data: TicketCreate,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key",
+                                            description="客户端生成的唯一键，重试时带上同一个值，不会重复创建")
 ):
-    """创建问题单"""
+    """
+    创建问题单
+
+    带 Idempotency-Key 时，首次请求的响应会被保存，重试直接返回该响应（响应头 Idempotency-Replayed: true）。
+    """
+    if idempotency_key is None:
+        return await _create_ticket(ticket_data, db, current_user)
+    return await idempotency_store.run(
+        f"tickets/submit:{current_user.id}", idempotency_key, request_fingerprint(ticket_data),
+        lambda: _create_ticket(ticket_data, db, current_user)
+    )
+
+
+async def _create_ticket(ticket_data: TicketCreate, db: AsyncSession, current_user: User):
     logger.info(f"收到创建问题单请求，当前用户: {current_user.id}")
     try:
-        # 创建新的工单数据，包含用户ID
-        ticket_dict = ticket_data.model_dump()
-        ticket_dict["user_id"] = current_user.id
-        
-        # 创建新的工单对象
-        new_ticket_data = TicketCreate(**ticket_dict)
-        
-        # 调用服务层创建工单
-        result = await create_ticket_service(db, new_ticket_data)
-        logger.info(f"成功创建问题单: {result.model_dump()}")
-        return result
+        # 调用服务层创建工单，创建用户为当前用户（TicketCreate 不含 user_id，不能通过它传递）
+        result = await create_ticket_service(db, ticket_data, current_user.id)
+        logger.info(f"成功创建问题单，问题单ID: {result.id}")
+        return FastJSONResponse(result)
     except HTTPException as e:
         logger.error(f"创建问题单失败 - HTTP异常: {str(e)}")
         raise e
@@ -56,15 +90,25 @@ async def create_ticket(
 # 查询所有问题单
 @router.get("/", response_model=List[TicketResponse])
 async def get_tickets(
+    request: Request,
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """查询所有问题单"""
+    """
+    查询所有问题单
+
+    ETag 由数量、最大ID和最后修改时间聚合得出，客户端缓存有效时只做一次聚合查询，返回 304。
+    版本信息先于数据读取，期间发生的修改只会让客户端下次多拉取一次，不会缓存过期数据。
+    """
     logger.info(f"收到获取问题单列表请求，当前用户: {current_user.id}")
     try:
+        count, max_id, last_modified = await get_tickets_version_service(db)
+        etag = weak_etag("tickets", count, max_id, last_modified)
+        if is_not_modified(request, etag, last_modified):
+            return not_modified(etag, last_modified)
         tickets = await get_tickets_service(db)
         logger.info(f"成功获取问题单列表，共 {len(tickets)} 条记录")
-        return [{"ticket": ticket.model_dump()} for ticket in tickets]
+        return FastJSONResponse(tickets, headers=cache_headers(etag, last_modified))
     except HTTPException as e:
         logger.error(f"获取问题单列表失败 - HTTP异常: {str(e)}")
         raise e
@@ -76,24 +120,175 @@ async def get_tickets(
         )
 
 
+# 增量同步问题单
+@router.get("/changes", response_model=TicketChanges)
+async def get_ticket_changes(
+    since: Optional[str] = Query(None, description="上次同步返回的 cursor，不传则返回全部问题单"),
+    limit: int = Query(settings.TICKET_SYNC_PAGE_SIZE, ge=1, le=1000, description="每次最多返回的变更数"),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    返回游标之后新建、修改和删除的问题单
+
+    客户端按问题单ID覆盖本地数据、删除 deleted 中的问题单，保存 cursor 用于下次同步；
+    has_more 为 true 时继续用新的 cursor 请求。同一变更可能在相邻两次同步中重复返回。
+    """
+    logger.info(f"收到问题单增量同步请求，当前用户: {current_user.id}")
+    try:
+        result = await get_ticket_changes_service(db, since, limit)
+    except ValueError as e:
+        logger.warning(f"问题单增量同步失败 - {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={"message": "无效的同步游标", "errors": [str(e)]}
+        )
+    logger.info(f"成功获取问题单变更，修改 {len(result['changed'])} 条，删除 {len(result['deleted'])} 条")
+    return FastJSONResponse(result)
+
+
+# 按ID批量查询问题单
+@router.post("/batch-get", response_model=List[TicketBatchItem])
+async def batch_get_tickets(
+    request_data: BatchGetRequest,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """按ID批量查询问题单，结果与请求中的ID顺序一致，不存在的问题单 found 为 false"""
+    logger.info(f"收到批量获取问题单请求，ID数: {len(request_data.ids)}，当前用户: {current_user.id}")
+    tickets = await get_tickets_by_ids_service(db, request_data.ids)
+    return FastJSONResponse([
+        {"id": ticket_id, "found": ticket is not None, "ticket": ticket}
+        for ticket_id, ticket in zip(request_data.ids, tickets)
+    ])
+
+
+# 按条件批量更新问题单
+@router.post("/bulk-update", response_model=TicketBulkResult)
+async def bulk_update_tickets(
+    request_data: TicketBulkUpdate,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_admin_user)
+):
+    """按条件批量更新问题单（如批量转派），dry_run 为 true 时只返回匹配数量"""
+    logger.info(f"收到批量更新问题单请求，当前用户: {current_user.id}，条件: "
+                f"{request_data.filter.model_dump(exclude_none=True)}，dry_run: {request_data.dry_run}")
+    result = await bulk_update_tickets_service(db, request_data.filter, request_data.values, request_data.dry_run)
+    logger.info(f"批量更新问题单完成: {result}")
+    return FastJSONResponse(result)
+
+
+# 按条件批量删除问题单
+@router.post("/bulk-delete", response_model=TicketBulkResult)
+async def bulk_delete_tickets(
+    request_data: TicketBulkDelete,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_admin_user)
+):
+    """按条件批量删除问题单及其附件记录、修改记录，dry_run 为 true 时只返回匹配数量"""
+    logger.info(f"收到批量删除问题单请求，当前用户: {current_user.id}，条件: "
+                f"{request_data.filter.model_dump(exclude_none=True)}，dry_run: {request_data.dry_run}")
+    result = await bulk_delete_tickets_service(db, request_data.filter, request_data.dry_run)
+    logger.info(f"批量删除问题单完成: {result}")
+    return FastJSONResponse(result)
+
+
+# 订阅问题单变更（SSE）
+@router.get("/events")
+async def subscribe_ticket_events(
+    ticket_ids: Optional[List[int]] = Query(None, description="只订阅这些问题单，不传则订阅所有问题单"),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    以 Server-Sent Events 推送问题单的创建、修改、删除事件，代替轮询问题单列表
+
+    每个变更一条 ticket 事件；空闲时定期发送注释行作为心跳；
+    消费过慢被断开或服务关闭时发送 close 事件，客户端应重新订阅并刷新数据。
+    """
+    logger.info(f"收到订阅问题单变更请求，当前用户: {current_user.id}，问题单ID: {ticket_ids or '全部'}")
+
+    async def event_stream():
+        # 在生成器内订阅，保证连接结束时一定会取消订阅
+        subscriber = ticket_broadcaster.subscribe(ticket_ids)
+        try:
+            yield sse_event({"ticket_ids": ticket_ids}, event="subscribed")
+            while True:
+                try:
+                    message = await subscriber.get(settings.TICKET_EVENTS_HEARTBEAT)
+                except ConnectionError as e:
+                    yield sse_event({"message": str(e)}, event="close")
+                    return
+                yield sse_event(message, event="ticket") if message is not None else b": ping\n\n"
+        finally:
+            ticket_broadcaster.unsubscribe(subscriber)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+# 订阅问题单变更（WebSocket）
+@router.websocket("/ws")
+async def subscribe_ticket_events_ws(
+    websocket: WebSocket,
+    ticket_ids: Optional[List[int]] = Query(None, description="只订阅这些问题单，不传则订阅所有问题单"),
+    current_user: User = Depends(get_websocket_user)
+):
+    """通过 WebSocket 推送问题单变更事件，消息格式与 SSE 的 ticket 事件相同，空闲时发送 ping"""
+    await websocket.accept()
+    logger.info(f"问题单变更 WebSocket 已连接，当前用户: {current_user.id}，问题单ID: {ticket_ids or '全部'}")
+    subscriber = ticket_broadcaster.subscribe(ticket_ids)
+
+    async def wait_disconnect():
+        # 读取客户端消息（忽略内容），以便客户端断开时立即取消订阅
+        try:
+            while True:
+                await websocket.receive_text()
+        except WebSocketDisconnect:
+            subscriber.close("客户端已断开")
+
+    reader = asyncio.create_task(wait_disconnect())
+    try:
+        while True:
+            try:
+                message = await subscriber.get(settings.TICKET_EVENTS_HEARTBEAT)
+            except ConnectionError as e:
+                if not reader.done():
+                    await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER, reason=str(e))
+                return
+            await websocket.send_text(message.decode() if message is not None else '{"type":"ping"}')
+    except WebSocketDisconnect:
+        pass
+    finally:
+        reader.cancel()
+        ticket_broadcaster.unsubscribe(subscriber)
+        logger.info(f"问题单变更 WebSocket 已断开，当前用户: {current_user.id}")
+
+
 # 根据问题单 id 查询问题单信息
 @router.get("/{ticket_id}", response_model=TicketResponse)
 async def get_ticket(
     ticket_id: int,
+    request: Request,
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """根据ID获取问题单信息"""
+    """根据ID获取问题单信息，ETag 取自版本号（修改时作为 If-Match 带上），未修改时返回 304"""
     logger.info(f"收到获取问题单信息请求，问题单ID: {ticket_id}，当前用户: {current_user.id}")
     try:
         ticket = await get_ticket_service(db, ticket_id)
-        logger.info(f"成功获取问题单信息: {ticket.model_dump()}")
         if not ticket:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="未找到该问题单"
             )
-        return {"ticket": ticket.model_dump()}
+        etag = version_etag(ticket.version)
+        if is_not_modified(request, etag, ticket.updated_at):
+            return not_modified(etag, ticket.updated_at)
+        logger.info(f"成功获取问题单信息，问题单ID: {ticket_id}")
+        return FastJSONResponse(ticket, headers=cache_headers(etag, ticket.updated_at))
     except HTTPException as e:
         logger.error(f"获取问题单信息失败 - HTTP异常: {str(e)}")
         raise e
@@ -110,12 +305,20 @@ async def get_ticket(
 async def update_ticket(
     ticket_id: int,
     ticket_data: TicketUpdate,
+    request: Request,
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """更新问题单信息"""
+    """
+    更新问题单信息
+
+    必须通过 If-Match 带上获取问题单时的 ETag：缺少时返回 428，问题单已被他人修改时返回 412，
+    客户端应重新获取后再修改，避免覆盖他人的修改。
+    """
     logger.info(f"收到更新问题单信息请求，问题单ID: {ticket_id}，当前用户: {current_user.id}")
     try:
+        expected_version = if_match_version(request)
+
         # 将当前用户ID添加到更新数据中
         update_dict = ticket_data.model_dump(exclude_unset=True)
         update_dict["user_id"] = current_user.id
@@ -123,14 +326,14 @@ async def update_ticket(
         # 创建新的更新数据对象
         ticket_data_with_user = TicketUpdate(**update_dict)
         
-        result = await update_ticket_service(db, ticket_id, ticket_data_with_user)
-        logger.info(f"成功更新问题单信息: {result.model_dump()}")
+        result = await update_ticket_service(db, ticket_id, ticket_data_with_user, expected_version)
         if not result:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="未找到该问题单"
             )
-        return {"ticket": result.model_dump()}
+        logger.info(f"成功更新问题单信息，问题单ID: {ticket_id}，版本: {result.version}")
+        return FastJSONResponse(result, headers={"ETag": version_etag(result.version)})
     except HTTPException as e:
         logger.error(f"更新问题单信息失败 - HTTP异常: {str(e)}")
         raise e
@@ -169,3 +372,207 @@ async def delete_ticket(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"删除问题单时发生错误: {str(e)}"
         )
+
+
+# 生成微信绑定验证码
+@router.post("/{ticket_id}/wechat-code", response_model=WechatTicketCodeResponse)
+async def create_wechat_code(
+    ticket_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    生成问题单的微信绑定验证码，只有问题单创建人和管理员（坐席）可以生成
+
+    客户在公众号中发送“问题单 {ID} {验证码}”后，之后发送的图片、视频和文件保存为该问题单的附件。
+    验证码只能使用一次，重新生成后之前的验证码作废。
+    """
+    logger.info(f"收到生成微信绑定验证码请求，问题单ID: {ticket_id}，当前用户: {current_user.id}")
+    try:
+        ticket = await get_ticket_service(db, ticket_id)
+        if not ticket:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="未找到该问题单"
+            )
+        if ticket.user_id != current_user.id and current_user.id not in settings.ADMIN_USER_IDS:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail={"message": "无权限访问", "errors": ["只有问题单创建人和管理员可以生成验证码"]}
+            )
+        code, expires_at = await issue_ticket_code(db, ticket_id, current_user.id)
+        logger.info(f"成功生成微信绑定验证码，问题单ID: {ticket_id}")
+        return FastJSONResponse(WechatTicketCodeResponse(
+            ticket_id=ticket_id, code=code, expires_at=expires_at, instruction=f"问题单 {ticket_id} {code}"
+        ))
+    except HTTPException as e:
+        logger.error(f"生成微信绑定验证码失败 - HTTP异常: {str(e)}")
+        raise e
+    except Exception as e:
+        logger.error(f"生成微信绑定验证码失败 - 系统异常: {str(e)}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"生成微信绑定验证码时发生错误: {str(e)}"
+        )
+
+
+# 上传问题单附件
+@router.post("/{ticket_id}/attachments", response_model=AttachmentResponse, status_code=status.HTTP_201_CREATED)
+async def upload_attachment(
+    ticket_id: int,
+    request: Request,
+    file_type: Optional[AttachmentType] = Query(None, description="附件类型，不传则根据 Content-Type 判断"),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    上传问题单附件，请求体为文件原始内容，Content-Type 为文件类型（如 image/jpeg）
+
+    请求体边接收边写入磁盘并计算 sha256，不在内存中缓存整个文件；
+    内容相同的文件只存储一份，同一问题单重复上传时返回已有附件。
+    """
+    logger.info(f"收到上传附件请求，问题单ID: {ticket_id}，当前用户: {current_user.id}")
+    try:
+        content_type = request.headers.get("content-type")
+        attachment, stored = await upload_attachment_service(db, ticket_id, request.stream(), content_type, file_type)
+        logger.info(f"成功上传附件，问题单ID: {ticket_id}，附件ID: {attachment.id}，大小 {stored.size} 字节"
+                    f"{'（内容重复，复用已有文件）' if stored.deduplicated else ''}")
+        return FastJSONResponse(AttachmentResponse.model_validate(attachment), status_code=status.HTTP_201_CREATED)
+    except HTTPException as e:
+        logger.error(f"上传附件失败 - HTTP异常: {str(e)}")
+        raise e
+    except Exception as e:
+        logger.error(f"上传附件失败 - 系统异常: {str(e)}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"上传附件时发生错误: {str(e)}"
+        )
+
+
+# 打包下载问题单附件
+@router.get("/{ticket_id}/attachments.zip")
+async def download_attachments_zip(
+    ticket_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    打包下载问题单的全部附件
+
+    ZIP 边生成边发送，内存占用与附件总大小无关；图片、视频等已压缩的文件以 STORED 方式存入，不再压缩。
+    """
+    ticket = await get_ticket_with_attachments_service(db, ticket_id)
+    if not ticket:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="未找到该问题单"
+        )
+    entries = await asyncio.to_thread(build_entries, ticket.attachments)
+    logger.info(f"打包下载附件，问题单ID: {ticket_id}，文件数: {len(entries)}")
+    return StreamingResponse(
+        iter_zip(entries),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="ticket-{ticket_id}-attachments.zip"'}
+    )
+
+
+# 查询问题单附件列表
+@router.get("/{ticket_id}/attachments", response_model=List[AttachmentResponse])
+async def get_attachments(
+    ticket_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """查询问题单的所有附件"""
+    logger.info(f"收到获取附件列表请求，问题单ID: {ticket_id}，当前用户: {current_user.id}")
+    try:
+        attachments = await get_attachments_service(db, ticket_id)
+        logger.info(f"成功获取附件列表，问题单ID: {ticket_id}，共 {len(attachments)} 个附件")
+        return FastJSONResponse([AttachmentResponse.model_validate(attachment) for attachment in attachments])
+    except HTTPException as e:
+        logger.error(f"获取附件列表失败 - HTTP异常: {str(e)}")
+        raise e
+    except Exception as e:
+        logger.error(f"获取附件列表失败 - 系统异常: {str(e)}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"查询附件列表时发生错误: {str(e)}"
+        )
+
+
+# 下载问题单附件
+@router.get("/{ticket_id}/attachments/{attachment_id}")
+async def download_attachment(
+    ticket_id: int,
+    attachment_id: int,
+    request: Request,
+    size: Optional[str] = Query(None, description="图片缩略图尺寸，如 small / medium / large，不传返回原图"),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    下载附件，支持 Range 断点续传
+
+    按内容寻址存储的附件内容不会变化，ETag 取内容哈希并允许客户端长期缓存；
+    配置 ATTACHMENT_ACCEL_REDIRECT_PREFIX 后由 nginx 直接发送文件。
+    图片附件可通过 size 参数获取缩略图，首次请求时生成。
+    """
+    logger.info(f"收到下载附件请求，问题单ID: {ticket_id}，附件ID: {attachment_id}，当前用户: {current_user.id}")
+    try:
+        attachment = await get_attachment_service(db, ticket_id, attachment_id)
+        file_path = absolute_path(attachment.file_path) if attachment else None
+        if not attachment or not os.path.isfile(file_path):
+            logger.warning(f"下载附件失败 - 附件不存在，问题单ID: {ticket_id}，附件ID: {attachment_id}")
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="未找到该附件"
+            )
+
+        if size is not None:
+            if not thumbnail_service.supports(attachment):
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail={"message": "参数错误", "errors": ["只有图片附件支持缩略图"]}
+                )
+            if size not in thumbnail_service.sizes:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail={"message": "参数错误", "errors": [f"size 可选值: {', '.join(thumbnail_service.sizes)}"]}
+                )
+            if not thumbnail_service.available:
+                logger.warning("未安装 Pillow，无法生成缩略图，返回原图")
+                size = None
+
+        headers = {}
+        if attachment.content_hash:
+            etag = f'"{attachment.content_hash}-{size}"' if size else f'"{attachment.content_hash}"'
+            headers = {"ETag": etag, "Cache-Control": "private, max-age=31536000, immutable"}
+            if etag in request.headers.get("if-none-match", ""):
+                return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        if size:
+            try:
+                file_path = await thumbnail_service.get_thumbnail(attachment, size)
+            except Exception:
+                raise HTTPException(
+                    status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                    detail={"message": "生成缩略图失败", "errors": ["图片无法解析"]}
+                )
+            media_type = "image/jpeg"
+            relative_path = thumbnail_service.thumbnail_file(attachment.file_path, size)
+        else:
+            media_type = attachment.content_type or "application/octet-stream"
+            relative_path = attachment.file_path
+        if settings.ATTACHMENT_ACCEL_REDIRECT_PREFIX:
+            headers["X-Accel-Redirect"] = settings.ATTACHMENT_ACCEL_REDIRECT_PREFIX + relative_path
+            return Response(headers=headers, media_type=media_type)
+        return FileResponse(file_path, media_type=media_type, headers=headers)
+    except HTTPException as e:
+        logger.error(f"下载附件失败 - HTTP异常: {str(e)}")
+        raise e
+    except Exception as e:
+        logger.error(f"下载附件失败 - 系统异常: {str(e)}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"下载附件时发生错误: {str(e)}"
+        )
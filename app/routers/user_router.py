@@ -1,35 +1,68 @@
-from fastapi import APIRouter, Depends, HTTPException
+from app.config import settings
+from fastapi import APIRouter, Depends, Header, HTTPException, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.db_services.database import get_db
 from app.services.user_service import (
     create_user_service,
     get_users_service,
     get_user_service,
+    get_users_version_service,
+    get_users_by_ids_service,
     update_user_service,
     delete_user_service,
     verify_user_login
 )
-from app.schemas.user_schema import UserCreate, UserResponse, UserUpdate, UserLogin
+from app.schemas.user_schema import UserCreate, UserPublic, UserResponse, UserUpdate, UserLogin, UserBatchItem
+from app.schemas.common_schema import BatchGetRequest
 from app.dependencies.auth import get_current_user
 from app.models.user import User
-from typing import List
+from typing import List, Optional
 from app.logger import get_logger
+from app.utils.response import FastJSONResponse
+from app.services.idempotency_service import idempotency_store, request_fingerprint
+from app.utils.conditional import weak_etag, cache_headers, is_not_modified, not_modified
 
 router = APIRouter()
 logger = get_logger('user_router')
 
+
+def _public(user: User) -> UserPublic:
+    """路由直接返回 FastJSONResponse，不经过 response_model 过滤，需手动去掉密码哈希"""
+    return UserPublic.model_validate(user)
+
+
 # 注册用户
 @router.post("/register", response_model=UserResponse)
-async def register_user(user_data: UserCreate, db: AsyncSession = Depends(get_db)):
-    """用户注册"""
+async def register_user(
+    user_data: UserCreate,
+    db: AsyncSession = Depends(get_db),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key",
+                                            description="客户端生成的唯一键，重试时带上同一个值，不会重复注册")
+):
+    """
+    用户注册
+
+    带 Idempotency-Key 时，首次请求的响应会被保存，重试直接返回该响应（响应头 Idempotency-Replayed: true）。
+    """
+    if idempotency_key is None:
+        return await _register_user(user_data, db)
+    return await idempotency_store.run(
+        "users/register", idempotency_key, request_fingerprint(user_data),
+        lambda: _register_user(user_data, db),
+        # 响应中含访问令牌，保存时间不超过令牌有效期，避免重放返回已过期的令牌
+        ttl=min(settings.IDEMPOTENCY_TTL, settings.JWT_ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+    )
+
+
+async def _register_user(user_data: UserCreate, db: AsyncSession):
     logger.info(f"收到用户注册请求: {user_data.model_dump()}")
     try:
         user, token = await create_user_service(db, user_data)
-        logger.info(f"用户注册成功: {user.model_dump()}")
-        return {
-            "user": user.model_dump(),
+        logger.info(f"用户注册成功，用户ID: {user.id}")
+        return FastJSONResponse({
+            "user": _public(user),
             "token": token
-        }
+        })
     except HTTPException as e:
         logger.error(f"用户注册失败 - HTTP异常: {str(e)}")
         raise e
@@ -50,11 +83,11 @@ async def login_user(login_data: UserLogin, db: AsyncSession = Depends(get_db)):
     logger.info(f"收到用户登录请求: {login_data.model_dump()}")
     try:
         user, token = await verify_user_login(db, login_data)
-        logger.info(f"用户登录成功: {user.model_dump()}")
-        return {
-            "user": user.model_dump(),
+        logger.info(f"用户登录成功，用户ID: {user.id}")
+        return FastJSONResponse({
+            "user": _public(user),
             "token": token
-        }
+        })
     except HTTPException as e:
         logger.error(f"用户登录失败 - HTTP异常: {str(e)}")
         raise e
@@ -71,15 +104,20 @@ async def login_user(login_data: UserLogin, db: AsyncSession = Depends(get_db)):
 # 获取所有用户列表
 @router.get("/", response_model=List[UserResponse])
 async def get_users(
+    request: Request,
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """获取所有用户列表"""
+    """获取所有用户列表，ETag 由聚合查询得出，未变化时不加载用户数据，直接返回 304"""
     logger.info(f"收到获取用户列表请求，当前用户: {current_user.id}")
     try:
+        count, max_id, last_modified = await get_users_version_service(db)
+        etag = weak_etag("users", count, max_id, last_modified)
+        if is_not_modified(request, etag, last_modified):
+            return not_modified(etag, last_modified)
         users = await get_users_service(db)
         logger.info(f"成功获取用户列表，共 {len(users)} 条记录")
-        return [{"user": user.model_dump()} for user in users]
+        return FastJSONResponse([{"user": _public(user)} for user in users], headers=cache_headers(etag, last_modified))
     except HTTPException as e:
         logger.error(f"获取用户列表失败 - HTTP异常: {str(e)}")
         raise e
@@ -93,19 +131,39 @@ async def get_users(
             }
         )
 
+# 按ID批量获取用户信息
+@router.post("/batch-get", response_model=List[UserBatchItem])
+async def batch_get_users(
+    request_data: BatchGetRequest,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """按ID批量获取用户信息，结果与请求中的ID顺序一致，不存在的用户 found 为 false"""
+    logger.info(f"收到批量获取用户信息请求，ID数: {len(request_data.ids)}，当前用户: {current_user.id}")
+    users = await get_users_by_ids_service(db, request_data.ids)
+    return FastJSONResponse([
+        {"id": user_id, "found": user is not None, "user": user and _public(user)}
+        for user_id, user in zip(request_data.ids, users)
+    ])
+
 # 根据ID获取用户信息
 @router.get("/{user_id}", response_model=UserResponse)
 async def get_user(
     user_id: int,
+    request: Request,
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """根据ID获取用户信息"""
+    """根据ID获取用户信息，ETag 取自修改时间，未修改时返回 304"""
     logger.info(f"收到获取用户信息请求，用户ID: {user_id}，当前用户: {current_user.id}")
     try:
         user = await get_user_service(db, user_id)
-        logger.info(f"成功获取用户信息: {user.model_dump()}")
-        return {"user": user.model_dump()}
+        last_modified = user.updated_at or user.created_at
+        etag = weak_etag("user", user.id, last_modified)
+        if is_not_modified(request, etag, last_modified):
+            return not_modified(etag, last_modified)
+        logger.info(f"成功获取用户信息，用户ID: {user_id}")
+        return FastJSONResponse({"user": _public(user)}, headers=cache_headers(etag, last_modified))
     except HTTPException as e:
         logger.error(f"获取用户信息失败 - HTTP异常: {str(e)}")
         raise e
@@ -131,8 +189,8 @@ async def update_user(
     logger.info(f"收到更新用户信息请求，用户ID: {user_id}，当前用户: {current_user.id}")
     try:
         user = await update_user_service(db, user_id, user_data)
-        logger.info(f"成功更新用户信息: {user.model_dump()}")
-        return {"user": user.model_dump()}
+        logger.info(f"成功更新用户信息，用户ID: {user_id}")
+        return FastJSONResponse({"user": _public(user)})
     except HTTPException as e:
         logger.error(f"更新用户信息失败 - HTTP异常: {str(e)}")
         raise e
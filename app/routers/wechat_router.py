@@ -0,0 +1,40 @@
+from xml.etree.ElementTree import ParseError
+
+from fastapi import APIRouter, HTTPException, Request, status
+from fastapi.responses import PlainTextResponse
+
+from app.services.wechat_service import check_signature, parse_message, wechat_dispatcher
+from app.logger import get_logger
+
+router = APIRouter()
+logger = get_logger('wechat_router')
+
+
+# 微信服务器配置校验
+@router.get("/callback", response_class=PlainTextResponse)
+async def verify_callback(signature: str, timestamp: str, nonce: str, echostr: str):
+    """微信服务器配置校验，签名正确时原样返回 echostr"""
+    if not check_signature(signature, timestamp, nonce):
+        logger.warning("微信服务器配置校验失败 - 签名错误")
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="签名校验失败")
+    return PlainTextResponse(echostr)
+
+
+# 接收微信推送的消息
+@router.post("/callback", response_class=PlainTextResponse)
+async def receive_message(request: Request, signature: str, timestamp: str, nonce: str):
+    """接收微信消息，校验去重后交给后台队列处理，立即回复 success"""
+    if not check_signature(signature, timestamp, nonce):
+        logger.warning("接收微信消息失败 - 签名错误")
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="签名校验失败")
+    try:
+        message = parse_message(await request.body())
+    except ParseError as e:
+        logger.error(f"接收微信消息失败 - XML解析失败: {str(e)}")
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="消息格式错误")
+
+    if not wechat_dispatcher.submit(message):
+        # 队列已满，不回复 success，由微信稍后重试
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="服务繁忙")
+    return PlainTextResponse("success")
+
@@ -0,0 +1,9 @@
+from typing import Optional
+from sqlmodel import SQLModel, Field
+
+
+class ProfilerUpdate(SQLModel):
+    """更新请求剖析配置"""
+    sample_rate: Optional[float] = Field(None, ge=0, le=1, description="随机剖析的请求比例（0~1）")
+    header_token: Optional[str] = Field(None, description="触发剖析的请求头令牌，空字符串表示关闭")
+    interval: Optional[float] = Field(None, gt=0, description="调用栈采样间隔（秒）")
@@ -0,0 +1,14 @@
+from typing import List
+from sqlmodel import SQLModel, Field
+
+
+class BatchGetRequest(SQLModel):
+    """按ID批量查询请求模型"""
+    ids: List[int] = Field(..., description="要查询的ID列表，最多 BATCH_GET_MAX_IDS 个，结果按该顺序返回")
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "ids": [3, 1, 42]
+            }
+        }
@@ -0,0 +1,22 @@
+from typing import Any, Optional
+from datetime import datetime
+from sqlmodel import SQLModel, Field
+
+from app.models.job import JobStatus
+
+
+class JobResponse(SQLModel):
+    """后台任务状态响应模型"""
+    id: int = Field(..., description="任务ID")
+    name: str = Field(..., description="任务类型")
+    status: JobStatus = Field(..., description="任务状态")
+    attempts: int = Field(..., description="已执行次数")
+    max_attempts: int = Field(..., description="最大执行次数")
+    run_at: datetime = Field(..., description="下次可执行时间")
+    last_error: Optional[str] = Field(None, description="最近一次失败原因")
+    result: Optional[Any] = Field(None, description="执行结果")
+    created_at: datetime = Field(..., description="创建时间")
+    finished_at: Optional[datetime] = Field(None, description="完成时间")
+
+    class Config:
+        from_attributes = True
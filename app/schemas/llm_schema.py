@@ -0,0 +1,19 @@
+from typing import Optional
+from sqlmodel import SQLModel, Field
+
+
+class ChatRequest(SQLModel):
+    """生成回复请求模型"""
+    prompt: str = Field(..., min_length=1, description="提示词")
+    temperature: float = Field(0.7, ge=0, le=2, description="采样温度")
+    max_tokens: int = Field(512, ge=1, le=4096, description="最大生成 token 数")
+    ticket_id: Optional[int] = Field(None, description="关联的问题单ID")
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "prompt": "客户反馈设备不开机，请起草一段回复",
+                "temperature": 0.7,
+                "max_tokens": 256
+            }
+        }
@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 from sqlmodel import SQLModel, Field
 
@@ -33,6 +33,75 @@ class TicketResponse(TicketBase):
     id: int = Field(..., description="工单ID")
     user_id: int = Field(..., description="创建用户ID")
     create_at: datetime = Field(..., description="创建时间")
+    updated_at: Optional[datetime] = Field(None, description="最后修改时间")
+    version: int = Field(1, description="版本号，修改时通过 If-Match 请求头带上")
 
     class Config:
         from_attributes = True
+
+
+class TicketChanges(SQLModel):
+    """问题单增量同步响应模型"""
+    changed: List[TicketResponse] = Field(..., description="新建或修改过的问题单")
+    deleted: List[int] = Field(..., description="已删除的问题单ID")
+    cursor: str = Field(..., description="下次同步时作为 since 传入")
+    has_more: bool = Field(..., description="是否还有未返回的变更，为 true 时应立即用新的 cursor 继续请求")
+
+
+class TicketBatchItem(SQLModel):
+    """批量查询中的一项，与请求中的ID一一对应"""
+    id: int = Field(..., description="请求的问题单ID")
+    found: bool = Field(..., description="问题单是否存在")
+    ticket: Optional[TicketResponse] = Field(None, description="问题单信息，不存在时为 null")
+
+
+class TicketBulkFilter(SQLModel):
+    """批量操作的筛选条件，各条件同时满足，至少指定一个"""
+    ids: Optional[List[int]] = Field(None, description="问题单ID列表")
+    user_id: Optional[int] = Field(None, description="创建用户ID")
+    device_model: Optional[str] = Field(None, description="设备型号")
+    customer: Optional[str] = Field(None, description="客户名称")
+    created_before: Optional[datetime] = Field(None, description="创建时间早于")
+    updated_before: Optional[datetime] = Field(None, description="最后修改时间早于")
+
+
+class TicketBulkUpdate(SQLModel):
+    """批量更新问题单请求模型"""
+    filter: TicketBulkFilter = Field(..., description="筛选条件")
+    values: TicketUpdate = Field(..., description="要更新的字段")
+    dry_run: bool = Field(False, description="为 true 时只统计匹配的问题单数，不修改")
+
+
+class TicketBulkDelete(SQLModel):
+    """批量删除问题单请求模型"""
+    filter: TicketBulkFilter = Field(..., description="筛选条件")
+    dry_run: bool = Field(False, description="为 true 时只统计匹配的问题单数，不删除")
+
+
+class TicketBulkResult(SQLModel):
+    """批量操作结果"""
+    matched: int = Field(..., description="匹配筛选条件的问题单数")
+    affected: int = Field(..., description="实际更新或删除的问题单数，dry_run 时为 0")
+    dry_run: bool = Field(..., description="是否为试运行")
+
+
+class AttachmentResponse(SQLModel):
+    """附件响应模型"""
+    id: int = Field(..., description="附件ID")
+    ticket_id: int = Field(..., description="所属问题单ID")
+    file_type: str = Field(..., description="附件类型")
+    content_type: Optional[str] = Field(None, description="文件 MIME 类型")
+    content_hash: Optional[str] = Field(None, description="文件内容 sha256")
+    file_size: Optional[int] = Field(None, description="文件大小（字节）")
+    upload_time: datetime = Field(..., description="上传时间")
+
+    class Config:
+        from_attributes = True
+
+
+class WechatTicketCodeResponse(SQLModel):
+    """问题单绑定验证码"""
+    ticket_id: int = Field(..., description="问题单ID")
+    code: str = Field(..., description="6 位数字验证码，只能使用一次")
+    expires_at: datetime = Field(..., description="过期时间（UTC）")
+    instruction: str = Field(..., description="告知客户在微信中发送的内容")
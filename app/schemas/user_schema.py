@@ -1,4 +1,5 @@
 from sqlmodel import SQLModel, Field
+from datetime import datetime
 from typing import Optional
 from pydantic import EmailStr
 
@@ -44,10 +45,29 @@ class UserLogin(SQLModel):
             }
         }
 
+# 对外返回的用户信息，不含密码哈希
+class UserPublic(SQLModel):
+    id: int = Field(..., description="用户ID")
+    name: str = Field(..., description="用户名")
+    phone: str = Field(..., description="手机号")
+    email: str = Field(..., description="邮箱")
+    is_active: bool = Field(..., description="是否激活")
+    created_at: datetime = Field(..., description="创建时间")
+    updated_at: Optional[datetime] = Field(None, description="修改时间")
+
+    class Config:
+        from_attributes = True
+
 # 用户响应模型
 class UserResponse(SQLModel):
-    user: dict
+    user: UserPublic
     token: Optional[str] = Field(None, description="访问令牌")
 
     class Config:
         from_attributes = True
+
+# 批量查询中的一项，与请求中的ID一一对应
+class UserBatchItem(SQLModel):
+    id: int = Field(..., description="请求的用户ID")
+    found: bool = Field(..., description="用户是否存在")
+    user: Optional[UserPublic] = Field(None, description="用户信息，不存在时为 null")
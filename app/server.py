@@ -0,0 +1,114 @@
+# 生产环境启动入口
+#
+# 用法：python -m app.server --workers 4 --port 8001
+#
+# 多个 worker 进程共享同一监听端口，由 uvicorn 主进程负责监督：
+# - 向主进程发送 SIGHUP 可逐个重启 worker（滚动重启），旧 worker 处理完在途请求后才退出
+# - worker 处理请求数达到 --max-requests（每个 worker 再加 0 ~ --max-requests-jitter 的随机数）后自动退出
+#   并由主进程拉起新进程，限制内存增长；随机数使各 worker 错开回收，不会同时重启
+# - 安装了 uvloop / httptools 时自动使用
+import os
+import random
+import argparse
+import importlib.util
+from typing import Optional
+
+import uvicorn
+from uvicorn.supervisors import Multiprocess
+
+from app.config import settings
+from app.logger import setup_logger
+
+logger = setup_logger()
+
+
+def _pick_loop() -> str:
+    """有 uvloop 时使用 uvloop，否则使用标准 asyncio"""
+    return "uvloop" if importlib.util.find_spec("uvloop") else "asyncio"
+
+
+def _pick_http() -> str:
+    """有 httptools 时使用 httptools，否则使用 h11"""
+    return "httptools" if importlib.util.find_spec("httptools") else "h11"
+
+
+class JitteredConfig(uvicorn.Config):
+    """
+    按 worker 进程随机化 limit_max_requests 的 uvicorn 配置
+
+    配置随 Server.run 序列化到每个 worker 子进程，子进程第一次读取 limit_max_requests 时
+    加上 0 ~ max_requests_jitter 的随机数，重新拉起的 worker 会重新取值。
+    """
+
+    def __init__(self, *args, max_requests_jitter: int = 0, **kwargs):
+        self.max_requests_jitter = max_requests_jitter
+        self._jittered = None  # (进程ID, 加上随机数后的上限)
+        super().__init__(*args, **kwargs)
+
+    @property
+    def limit_max_requests(self) -> Optional[int]:
+        if self._limit_max_requests is None or self.max_requests_jitter <= 0:
+            return self._limit_max_requests
+        pid = os.getpid()
+        if self._jittered is None or self._jittered[0] != pid:
+            self._jittered = (pid, self._limit_max_requests + random.randint(0, self.max_requests_jitter))
+        return self._jittered[1]
+
+    @limit_max_requests.setter
+    def limit_max_requests(self, value: Optional[int]):
+        self._limit_max_requests = value
+        self._jittered = None
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="微信客服后端生产环境启动入口")
+    parser.add_argument("--host", default=settings.SERVER_HOST, help="监听地址")
+    parser.add_argument("--port", type=int, default=settings.SERVER_PORT, help="监听端口")
+    parser.add_argument("--workers", type=int, default=settings.SERVER_WORKERS,
+                        help="worker 进程数，0 表示使用 CPU 核数")
+    parser.add_argument("--max-requests", type=int, default=settings.SERVER_MAX_REQUESTS,
+                        help="单个 worker 处理多少请求后回收，0 表示不回收")
+    parser.add_argument("--max-requests-jitter", type=int, default=settings.SERVER_MAX_REQUESTS_JITTER,
+                        help="每个 worker 的回收请求数再加 0 ~ 该值的随机数，0 表示不加")
+    parser.add_argument("--graceful-timeout", type=int, default=settings.SERVER_GRACEFUL_TIMEOUT,
+                        help="关闭 worker 时等待在途请求完成的最长秒数")
+    parser.add_argument("--keep-alive", type=int, default=5, help="HTTP keep-alive 超时秒数")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    workers = args.workers or os.cpu_count() or 1
+    loop = _pick_loop()
+    http = _pick_http()
+    max_requests = f"{args.max_requests} + 0~{args.max_requests_jitter}" if args.max_requests_jitter else args.max_requests
+    logger.info(f"以生产模式启动服务器: {args.host}:{args.port}，worker 数 {workers}，"
+                f"事件循环 {loop}，HTTP 解析 {http}，最大请求数 {max_requests if args.max_requests else '不限'}")
+    config = JitteredConfig(
+        "main:app",
+        host=args.host,
+        port=args.port,
+        workers=workers,
+        loop=loop,
+        http=http,
+        limit_max_requests=args.max_requests or None,
+        timeout_graceful_shutdown=args.graceful_timeout,
+        timeout_keep_alive=args.keep_alive,
+        proxy_headers=True,
+        access_log=False,
+        max_requests_jitter=args.max_requests_jitter
+    )
+    # 与 uvicorn.run 相同的启动流程，只是使用自定义配置
+    server = uvicorn.Server(config)
+    try:
+        if config.workers > 1:
+            sock = config.bind_socket()
+            Multiprocess(config, target=server.run, sockets=[sock]).run()
+        else:
+            server.run()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
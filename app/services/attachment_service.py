@@ -0,0 +1,203 @@
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import joinedload
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import HTTPException, status
+
+from app.config import settings
+from app.logger import get_logger
+from app.models.ticket import Attachment, AttachmentType, Ticket, TicketAttachmentLink
+from app.db_services.database import async_session_factory
+from app.services.attachment_storage import EmptyFileError, StoredFile, hash_to_path, remove_if_stale, store_stream
+from app.services.job_service import enqueue_job, job_handler
+from app.services.thumbnail_service import thumbnail_service
+
+logger = get_logger('attachment_service')
+
+
+def guess_file_type(content_type: Optional[str]) -> AttachmentType:
+    """根据 Content-Type 判断附件类型"""
+    content_type = (content_type or "").lower()
+    if content_type.startswith("image/"):
+        return AttachmentType.IMAGE
+    if content_type.startswith("video/"):
+        return AttachmentType.VIDEO
+    return AttachmentType.DOCUMENT
+
+
+async def record_attachment(session: AsyncSession, ticket_id: int, stored: StoredFile, file_type: AttachmentType,
+                            content_type: Optional[str] = None) -> Attachment:
+    """
+    将已落盘的文件记录为问题单附件（不提交事务）
+
+    同一问题单中内容相同的文件只记录一次，返回已有的附件。
+    """
+    result = await session.execute(
+        select(Attachment).where(
+            Attachment.ticket_id == ticket_id,
+            Attachment.content_hash == stored.content_hash
+        )
+    )
+    attachment = result.scalars().first()
+    if attachment is None:
+        attachment = Attachment(
+            ticket_id=ticket_id,
+            file_path=stored.file_path,
+            file_type=file_type.value,
+            content_type=content_type or None,
+            content_hash=stored.content_hash,
+            file_size=stored.size
+        )
+        session.add(attachment)
+        await session.flush()
+        session.add(TicketAttachmentLink(ticket_id=ticket_id, attachment_id=attachment.id))
+        await session.flush()
+    return attachment
+
+
+async def schedule_blob_gc(content_hashes: Iterable[str], *, session: Optional[AsyncSession] = None,
+                           delay: float = 0):
+    """
+    新建清理附件文件的后台任务，删除不再被任何附件记录引用的文件及其缩略图
+
+    传入 session 时任务与调用方的删除在同一事务中写入，提交后才会执行。
+    """
+    hashes = sorted({content_hash for content_hash in content_hashes if content_hash})
+    if hashes:
+        await enqueue_job("attachment_gc", {"hashes": hashes}, session=session, delay=delay)
+
+
+async def discard_unreferenced(stored_files: Iterable[StoredFile]):
+    """
+    记录附件失败或请求被拒绝时调用，稍后清理本次写入的文件
+
+    不立即删除：相同内容的并发上传可能正要引用同一文件。清理任务在 ATTACHMENT_GC_GRACE 秒后执行，
+    届时文件仍未被引用才删除。
+    """
+    try:
+        await schedule_blob_gc((stored.content_hash for stored in stored_files), delay=settings.ATTACHMENT_GC_GRACE)
+    except Exception as e:
+        logger.error(f"新建附件文件清理任务失败: {str(e)}")
+
+
+@job_handler("attachment_gc")
+async def collect_unreferenced_blobs(payload: Dict[str, Any]) -> Dict[str, int]:
+    """
+    后台任务：删除不再被引用的附件文件及其缩略图，参数 hashes 为内容哈希列表
+
+    仍被引用的跳过；最近被写入或复用的文件（不足 ATTACHMENT_GC_GRACE 秒）可能正被并发上传引用，
+    本次不删除，等到闲置满 ATTACHMENT_GC_GRACE 秒后再检查一次。
+    """
+    hashes = payload["hashes"]
+    async with async_session_factory() as session:
+        result = await session.execute(
+            select(Attachment.content_hash).where(Attachment.content_hash.in_(hashes)).distinct()
+        )
+        referenced = set(result.scalars().all())
+
+    removed, waits = 0, {}
+    for content_hash in hashes:
+        if content_hash in referenced:
+            continue
+        file_path = hash_to_path(content_hash)
+        thumbnails = [thumbnail_service.thumbnail_file(file_path, size) for size in thumbnail_service.sizes]
+        wait = await remove_if_stale(file_path, settings.ATTACHMENT_GC_GRACE, thumbnails)
+        if wait is None:
+            removed += 1
+        else:
+            waits[content_hash] = wait
+    if waits:
+        await schedule_blob_gc(waits, delay=max(waits.values()))
+    if removed:
+        logger.info(f"已删除 {removed} 个不再被引用的附件文件")
+    return {"removed": removed, "deferred": len(waits)}
+
+
+async def upload_attachment_service(session: AsyncSession, ticket_id: int, chunks: AsyncIterator[bytes],
+                                    content_type: Optional[str],
+                                    file_type: Optional[AttachmentType] = None) -> Tuple[Attachment, StoredFile]:
+    """
+    流式保存上传的附件
+
+    Args:
+        session: 数据库会话
+        ticket_id: 问题单ID
+        chunks: 请求体字节流
+        content_type: 文件的 Content-Type
+        file_type: 附件类型，为空时根据 content_type 判断
+
+    Returns:
+        Tuple[Attachment, StoredFile]: 附件记录及落盘结果，问题单不存在时抛出 404，请求体为空时抛出 400，
+        超过大小上限时抛出 413
+    """
+    # 先接收文件再查询问题单：会话在第一次查询时才占用数据库连接，上传期间不占用连接
+    try:
+        stored = await store_stream(chunks, max_size=settings.ATTACHMENT_MAX_SIZE, allow_empty=False)
+    except EmptyFileError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={"message": "附件内容为空", "errors": ["请求体为空"]}
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail={"message": "附件过大", "errors": [str(e)]}
+        )
+    try:
+        if await session.get(Ticket, ticket_id) is None:
+            await discard_unreferenced([stored])
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="未找到该问题单"
+            )
+        attachment = await record_attachment(session, ticket_id, stored, file_type or guess_file_type(content_type),
+                                             content_type)
+        await session.commit()
+        await session.refresh(attachment)
+        return attachment, stored
+    except HTTPException:
+        raise
+    except Exception as e:
+        await session.rollback()
+        await discard_unreferenced([stored])
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"保存附件失败: {str(e)}"
+        )
+
+
+async def get_attachments_service(session: AsyncSession, ticket_id: int) -> List[Attachment]:
+    """获取问题单的所有附件"""
+    try:
+        result = await session.execute(
+            select(Attachment).where(Attachment.ticket_id == ticket_id).order_by(Attachment.id)
+        )
+        return result.scalars().all()
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"获取附件列表失败: {str(e)}"
+        )
+
+
+async def get_attachment_service(session: AsyncSession, ticket_id: int, attachment_id: int) -> Optional[Attachment]:
+    """获取问题单的某个附件，不存在或不属于该问题单时返回 None"""
+    attachment = await session.get(Attachment, attachment_id)
+    if attachment is None or attachment.ticket_id != ticket_id:
+        return None
+    return attachment
+
+
+async def get_ticket_with_attachments_service(session: AsyncSession, ticket_id: int) -> Optional[Ticket]:
+    """获取问题单及其全部附件（通过 Ticket.attachments 关系在同一条查询中加载），不存在时返回 None"""
+    try:
+        result = await session.execute(
+            select(Ticket).options(joinedload(Ticket.attachments)).where(Ticket.id == ticket_id)
+        )
+        return result.unique().scalars().first()
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"获取附件列表失败: {str(e)}"
+        )
@@ -0,0 +1,135 @@
+# 附件内容寻址存储
+
+import os
+import time
+import uuid
+import asyncio
+import hashlib
+from typing import AsyncIterator, Iterable, NamedTuple, Optional, Tuple
+
+from app.config import settings
+
+# 附件存储根目录
+STORAGE_DIR = settings.ATTACHMENT_DIR
+
+# 流式读写的块大小
+CHUNK_SIZE = settings.ATTACHMENT_CHUNK_SIZE
+
+
+class StoredFile(NamedTuple):
+    """已落盘的文件"""
+    content_hash: str  # sha256 十六进制
+    file_path: str  # 相对 STORAGE_DIR 的路径
+    size: int
+    deduplicated: bool  # 相同内容的文件已存在，未重复存储
+
+
+class EmptyFileError(ValueError):
+    """字节流为空"""
+
+
+def hash_to_path(content_hash: str) -> str:
+    """按内容哈希生成相对路径，前两级目录用于分散文件"""
+    return os.path.join(content_hash[:2], content_hash[2:4], content_hash)
+
+
+def absolute_path(file_path: str) -> str:
+    return os.path.join(STORAGE_DIR, file_path)
+
+
+def _open_temp_file():
+    tmp_dir = os.path.join(STORAGE_DIR, "tmp")
+    os.makedirs(tmp_dir, exist_ok=True)
+    tmp_path = os.path.join(tmp_dir, uuid.uuid4().hex)
+    return tmp_path, open(tmp_path, "wb")
+
+
+def _commit_file(tmp_path: str, content_hash: str) -> Tuple[str, bool]:
+    file_path = hash_to_path(content_hash)
+    target = absolute_path(file_path)
+    try:
+        # 复用已有文件时刷新修改时间，清理任务据此跳过正被并发上传引用的文件（见 remove_if_stale）
+        os.utime(target)
+        os.remove(tmp_path)
+        return file_path, True
+    except FileNotFoundError:
+        pass
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    os.replace(tmp_path, target)
+    return file_path, False
+
+
+async def store_stream(chunks: AsyncIterator[bytes], max_size: int = 0, allow_empty: bool = True) -> StoredFile:
+    """
+    将字节流分块写入磁盘，边写边计算 sha256，内存中只保留当前块
+
+    写完后按内容哈希移动到最终位置，相同内容的文件只存一份。
+    max_size 大于 0 时，超过该大小抛出 ValueError；allow_empty 为 False 时，字节流为空抛出 EmptyFileError，
+    两种情况都不会留下文件。
+    """
+    tmp_path, f = await asyncio.to_thread(_open_temp_file)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        async for chunk in chunks:
+            if not chunk:
+                continue
+            size += len(chunk)
+            if max_size and size > max_size:
+                raise ValueError(f"文件大小超过上限 {max_size} 字节")
+            digest.update(chunk)
+            await asyncio.to_thread(f.write, chunk)
+        await asyncio.to_thread(f.close)
+        if size == 0 and not allow_empty:
+            raise EmptyFileError("文件内容为空")
+        content_hash = digest.hexdigest()
+        file_path, deduplicated = await asyncio.to_thread(_commit_file, tmp_path, content_hash)
+        return StoredFile(content_hash, file_path, size, deduplicated)
+    except BaseException:
+        f.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _remove_file(file_path: str):
+    try:
+        os.remove(absolute_path(file_path))
+    except FileNotFoundError:
+        pass
+
+
+def _remove_if_stale(file_path: str, grace: float, related: Iterable[str]) -> Optional[float]:
+    target = absolute_path(file_path)
+    try:
+        age = time.time() - os.stat(target).st_mtime
+    except FileNotFoundError:
+        age = None
+    if age is not None:
+        if age < grace:
+            return grace - age
+        # 先移走再检查修改时间：移走之后的上传找不到文件，会重新写入一份；
+        # 移走之前复用了该文件的上传已刷新修改时间，放回原处
+        trash = f"{target}.{uuid.uuid4().hex}.gc"
+        try:
+            os.rename(target, trash)
+        except FileNotFoundError:
+            return None
+        age = time.time() - os.stat(trash).st_mtime
+        if age < grace:
+            os.replace(trash, target)
+            return grace - age
+        os.remove(trash)
+    for path in related:
+        _remove_file(path)
+    return None
+
+
+async def remove_if_stale(file_path: str, grace: float, related: Iterable[str] = ()) -> Optional[float]:
+    """
+    删除闲置超过 grace 秒的文件及相关文件（如缩略图），调用方需先确认没有附件记录引用它
+
+    Returns:
+        Optional[float]: 已删除（或不存在）时返回 None；文件最近被写入或复用时不删除，返回还需等待的秒数
+    """
+    return await asyncio.to_thread(_remove_if_stale, file_path, grace, list(related))
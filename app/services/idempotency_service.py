@@ -0,0 +1,287 @@
+# 幂等键服务
+
+import time
+import asyncio
+import hashlib
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, NamedTuple, Optional, Tuple
+
+from fastapi import HTTPException, Response, status
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import IntegrityError
+
+from app.config import settings
+from app.db_services.database import async_session_factory
+from app.logger import get_logger
+from app.models.idempotency import IdempotencyRecord
+from app.utils.response import dumps
+
+logger = get_logger('idempotency_service')
+
+# 请求重放时带上的响应头，客户端据此知道请求没有重复执行
+REPLAYED_HEADER = "Idempotency-Replayed"
+
+
+class StoredResponse(NamedTuple):
+    """已保存的首次响应"""
+    request_hash: str
+    status_code: int
+    body: bytes
+    expires_at: datetime  # 不带时区的 UTC 时间
+
+
+def _utcnow() -> datetime:
+    # 数据库中的时间均为不带时区的 UTC 时间
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def request_fingerprint(payload) -> str:
+    """请求内容摘要，用于识别同一幂等键被用于不同的请求"""
+    return hashlib.sha256(dumps(payload)).hexdigest()
+
+
+class IdempotencyStore:
+    """
+    创建接口的幂等键存储
+
+    - 首次请求的成功响应保存 IDEMPOTENCY_TTL 秒：内存 LRU 保存最近的响应，数据库表保存全部并在多个 worker 间共享
+    - 重试的请求直接返回保存的响应，不经过服务层
+    - 同一进程内并发的重复请求等待首次请求完成；其他 worker 上的重复请求因唯一约束无法占用幂等键，
+      轮询数据库等待首次请求完成
+    - 同一幂等键对应不同的请求内容时返回 422
+    """
+
+    def __init__(self, ttl: int, max_entries: int, pending_timeout: float, wait_timeout: float,
+                 cleanup_interval: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.pending_timeout = pending_timeout
+        self.wait_timeout = wait_timeout
+        self.cleanup_interval = cleanup_interval
+        self._memory: "OrderedDict[Tuple[str, str], StoredResponse]" = OrderedDict()
+        self._inflight: Dict[Tuple[str, str], asyncio.Future] = {}
+        self._cleanup_task: Optional[asyncio.Task] = None
+        self.executed = 0
+        self.replayed = 0
+        self.coalesced = 0
+        self.conflicts = 0
+
+    async def run(self, scope: str, key: str, request_hash: str,
+                  call: Callable[[], Awaitable[Response]], ttl: Optional[int] = None) -> Response:
+        """
+        按幂等键执行创建请求
+
+        Args:
+            scope: 接口及用户，如 tickets/submit:1
+            key: 客户端传入的 Idempotency-Key
+            request_hash: 请求内容摘要
+            call: 实际处理请求的函数
+            ttl: 响应保存时长（秒），默认 IDEMPOTENCY_TTL；响应中含有有效期更短的内容（如令牌）时应传入更短的时长
+
+        Returns:
+            Response: 首次请求为 call 的响应，重复请求为保存的响应
+        """
+        if not key or len(key) > 200:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail={"message": "参数错误", "errors": ["Idempotency-Key 长度应为 1 到 200 个字符"]}
+            )
+        ident = (scope, key)
+        while True:
+            stored = self._get_memory(ident)
+            if stored is not None:
+                return self._replay(stored, request_hash)
+            future = self._inflight.get(ident)
+            if future is None:
+                break
+            # 同一进程内的并发重复请求：等待首次请求完成；首次请求失败时异常同样抛给重复请求
+            self.coalesced += 1
+            stored = await asyncio.shield(future)
+            if stored is not None:
+                return self._replay(stored, request_hash)
+            # 首次请求没有保存响应，重新按首次请求处理
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[ident] = future
+        try:
+            response, stored, replayed = await self._execute(scope, key, request_hash, call, ttl or self.ttl)
+        except BaseException as e:
+            if isinstance(e, Exception):
+                future.set_exception(e)
+                future.exception()  # 没有重复请求等待时避免 "exception was never retrieved" 警告
+            else:
+                future.cancel()
+            raise
+        else:
+            future.set_result(stored)
+        finally:
+            self._inflight.pop(ident, None)
+        return self._replay(stored, request_hash) if replayed else response
+
+    async def _execute(self, scope: str, key: str, request_hash: str, call: Callable[[], Awaitable[Response]],
+                       ttl: int) -> Tuple[Response, Optional[StoredResponse], bool]:
+        stored = await self._claim(scope, key, request_hash)
+        if stored is not None:
+            # 其他 worker 已完成首次请求
+            self._put_memory((scope, key), stored)
+            return None, stored, True
+
+        try:
+            response = await call()
+        except BaseException:
+            await asyncio.shield(self._release(scope, key))
+            raise
+        if not 200 <= response.status_code < 300:
+            await self._release(scope, key)
+            return response, None, False
+
+        self.executed += 1
+        stored = StoredResponse(request_hash, response.status_code, bytes(response.body),
+                                _utcnow() + timedelta(seconds=ttl))
+        self._put_memory((scope, key), stored)
+        try:
+            async with async_session_factory() as session:
+                await session.execute(
+                    update(IdempotencyRecord)
+                    .where(IdempotencyRecord.scope == scope, IdempotencyRecord.key == key)
+                    .values(status_code=stored.status_code, body=stored.body.decode(), expires_at=stored.expires_at)
+                )
+                await session.commit()
+        except Exception as e:
+            # 请求已经成功，保存失败只影响其他 worker 上的重试
+            logger.error(f"保存幂等响应失败 {scope} {key}: {str(e)}")
+        return response, stored, False
+
+    async def _claim(self, scope: str, key: str, request_hash: str) -> Optional[StoredResponse]:
+        """
+        在数据库中占用幂等键
+
+        插入处理中记录成功即占用；幂等键已被占用时，已完成则返回保存的响应，仍在处理中则轮询等待，
+        超过 IDEMPOTENCY_WAIT_TIMEOUT 返回 409。处理中记录超过 IDEMPOTENCY_PENDING_TIMEOUT 视为已失效，可重新占用。
+        """
+        deadline = time.monotonic() + self.wait_timeout
+        waited = False
+        while True:
+            async with async_session_factory() as session:
+                record = (await session.execute(
+                    select(IdempotencyRecord).where(IdempotencyRecord.scope == scope, IdempotencyRecord.key == key)
+                )).scalars().first()
+                if record is not None and record.expires_at.replace(tzinfo=None) <= _utcnow():
+                    await session.delete(record)
+                    await session.commit()
+                    record = None
+                if record is None:
+                    session.add(IdempotencyRecord(
+                        scope=scope, key=key, request_hash=request_hash,
+                        expires_at=_utcnow() + timedelta(seconds=self.pending_timeout)
+                    ))
+                    try:
+                        await session.commit()
+                        return None
+                    except IntegrityError:
+                        # 其他 worker 同时插入了同一幂等键
+                        await session.rollback()
+                        continue
+                if record.status_code is not None:
+                    return StoredResponse(record.request_hash, record.status_code, record.body.encode(),
+                                          record.expires_at.replace(tzinfo=None))
+                if record.request_hash != request_hash:
+                    self._reject_mismatch()
+            if time.monotonic() >= deadline:
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail={"message": "请求处理中", "errors": ["相同 Idempotency-Key 的请求仍在处理，请稍后重试"]}
+                )
+            if not waited:
+                waited = True
+                self.coalesced += 1
+            await asyncio.sleep(0.2)
+
+    async def _release(self, scope: str, key: str):
+        """首次请求失败，删除处理中记录，客户端可以用同一幂等键重试"""
+        try:
+            async with async_session_factory() as session:
+                await session.execute(
+                    delete(IdempotencyRecord).where(
+                        IdempotencyRecord.scope == scope, IdempotencyRecord.key == key,
+                        IdempotencyRecord.status_code.is_(None)
+                    )
+                )
+                await session.commit()
+        except Exception as e:
+            logger.error(f"释放幂等键失败 {scope} {key}: {str(e)}")
+
+    def _reject_mismatch(self):
+        self.conflicts += 1
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail={"message": "幂等键冲突", "errors": ["同一 Idempotency-Key 不能用于不同的请求内容"]}
+        )
+
+    def _replay(self, stored: StoredResponse, request_hash: str) -> Response:
+        if stored.request_hash != request_hash:
+            self._reject_mismatch()
+        self.replayed += 1
+        return Response(content=stored.body, status_code=stored.status_code, media_type="application/json",
+                        headers={REPLAYED_HEADER: "true"})
+
+    def _get_memory(self, ident: Tuple[str, str]) -> Optional[StoredResponse]:
+        stored = self._memory.get(ident)
+        if stored is None:
+            return None
+        if stored.expires_at <= _utcnow():
+            del self._memory[ident]
+            return None
+        self._memory.move_to_end(ident)
+        return stored
+
+    def _put_memory(self, ident: Tuple[str, str], stored: StoredResponse):
+        self._memory[ident] = stored
+        self._memory.move_to_end(ident)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    async def start(self):
+        if self._cleanup_task is None:
+            self._cleanup_task = asyncio.create_task(self._cleanup_loop())
+
+    async def stop(self):
+        if self._cleanup_task is not None:
+            self._cleanup_task.cancel()
+            await asyncio.gather(self._cleanup_task, return_exceptions=True)
+            self._cleanup_task = None
+
+    async def _cleanup_loop(self):
+        """定期删除过期的幂等记录"""
+        while True:
+            await asyncio.sleep(self.cleanup_interval)
+            try:
+                async with async_session_factory() as session:
+                    result = await session.execute(
+                        delete(IdempotencyRecord).where(IdempotencyRecord.expires_at < _utcnow())
+                    )
+                    await session.commit()
+                if result.rowcount:
+                    logger.info(f"已清理 {result.rowcount} 条过期幂等记录")
+            except Exception as e:
+                logger.error(f"清理过期幂等记录失败: {str(e)}")
+
+    def stats(self) -> dict:
+        return {
+            "memory_entries": len(self._memory),
+            "inflight": len(self._inflight),
+            "executed": self.executed,
+            "replayed": self.replayed,
+            "coalesced": self.coalesced,
+            "conflicts": self.conflicts
+        }
+
+
+idempotency_store = IdempotencyStore(
+    ttl=settings.IDEMPOTENCY_TTL,
+    max_entries=settings.IDEMPOTENCY_MEMORY_SIZE,
+    pending_timeout=settings.IDEMPOTENCY_PENDING_TIMEOUT,
+    wait_timeout=settings.IDEMPOTENCY_WAIT_TIMEOUT,
+    cleanup_interval=settings.IDEMPOTENCY_CLEANUP_INTERVAL
+)
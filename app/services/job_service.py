@@ -0,0 +1,294 @@
+# 后台任务服务
+
+import os
+import random
+import socket
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import orjson
+from sqlalchemy import and_, func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.db_services.database import async_session_factory
+from app.logger import get_logger
+from app.models.job import Job, JobStatus
+
+logger = get_logger('job_service')
+
+# 任务处理函数：接收任务参数，返回值（可 JSON 序列化）保存为任务结果
+JobHandler = Callable[[Dict[str, Any]], Awaitable[Any]]
+
+# 已注册的任务处理函数
+JOB_HANDLERS: Dict[str, JobHandler] = {}
+
+
+def job_handler(name: str):
+    """注册任务处理函数的装饰器"""
+    def decorator(handler: JobHandler) -> JobHandler:
+        JOB_HANDLERS[name] = handler
+        return handler
+    return decorator
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+async def enqueue_job(name: str, payload: Optional[Dict[str, Any]] = None, *, session: Optional[AsyncSession] = None,
+                      delay: float = 0, max_attempts: Optional[int] = None, user_id: Optional[int] = None) -> Job:
+    """
+    新建后台任务
+
+    Args:
+        name: 任务类型
+        payload: 任务参数
+        session: 传入时任务与调用方的业务数据在同一事务中写入，由调用方提交；否则立即提交
+        delay: 延迟多少秒后执行
+        max_attempts: 最大执行次数，默认 JOB_MAX_ATTEMPTS
+        user_id: 创建任务的用户，该用户和管理员可以查询任务状态
+
+    Returns:
+        Job: 新建的任务
+    """
+    job = Job(
+        name=name,
+        payload=orjson.dumps(payload or {}).decode(),
+        user_id=user_id,
+        max_attempts=max_attempts or settings.JOB_MAX_ATTEMPTS,
+        run_at=_utcnow() + timedelta(seconds=delay)
+    )
+    if session is not None:
+        session.add(job)
+        await session.flush()
+    else:
+        async with async_session_factory() as session:
+            session.add(job)
+            await session.commit()
+    job_runner.notify()
+    return job
+
+
+async def get_job_service(session: AsyncSession, job_id: int) -> Optional[Job]:
+    """根据ID获取任务"""
+    return await session.get(Job, job_id)
+
+
+class JobRunner:
+    """
+    后台任务执行器
+
+    - 多个 worker 协程从任务表领取任务：SELECT ... FOR UPDATE SKIP LOCKED 跳过其他进程正在领取的行，
+      再用带条件的 UPDATE 确认领取（SQLite 不支持行锁，靠条件 UPDATE 避免重复领取）
+    - 执行中定期延长 locked_until；进程崩溃后任务在锁定超时后被其他 worker 重新领取
+    - 失败按指数退避（带随机抖动）重试，次数用尽后标记为失败
+    """
+
+    def __init__(self, worker_count: int, poll_interval: float, visibility_timeout: int,
+                 retry_base_delay: float, retry_max_delay: float):
+        self.worker_count = worker_count
+        self.poll_interval = poll_interval
+        self.visibility_timeout = visibility_timeout
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self.worker_prefix = f"{socket.gethostname()}-{os.getpid()}"
+        self._workers: List[asyncio.Task] = []
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self.running: Dict[int, str] = {}  # 正在执行的任务ID -> 任务类型
+        self.succeeded = 0
+        self.failed = 0
+        self.retried = 0
+        self.lost = 0  # 执行中锁被其他 worker 接管而中止的次数
+
+    def notify(self):
+        """有新任务时唤醒空闲的 worker"""
+        self._wakeup.set()
+
+    async def start(self):
+        if self._workers:
+            return
+        self._stopping = False
+        self._workers = [
+            asyncio.create_task(self._worker(f"{self.worker_prefix}-{i}"), name=f"job-worker-{i}")
+            for i in range(self.worker_count)
+        ]
+        logger.info(f"后台任务执行器已启动，worker 数 {self.worker_count}")
+
+    async def stop(self, timeout: float = 10.0):
+        """等待正在执行的任务完成，超时后取消（被取消的任务放回队列）"""
+        if not self._workers:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        _, pending = await asyncio.wait(self._workers, timeout=timeout)
+        for worker in pending:
+            worker.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        self._workers = []
+
+    async def _worker(self, worker_id: str):
+        while not self._stopping:
+            try:
+                job = await self.claim(worker_id)
+            except Exception as e:
+                logger.error(f"领取后台任务失败: {str(e)}")
+                job = None
+            if job is not None:
+                try:
+                    await self._execute(job, worker_id)
+                except Exception as e:
+                    # 写回执行结果失败，任务在锁定超时后会被重新领取
+                    logger.error(f"更新后台任务 {job.id} 状态失败: {str(e)}")
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def claim(self, worker_id: str) -> Optional[Job]:
+        """领取一个可执行的任务，没有时返回 None"""
+        now = _utcnow()
+        async with async_session_factory() as session:
+            async with session.begin():
+                result = await session.execute(
+                    select(Job)
+                    .where(or_(
+                        and_(Job.status == JobStatus.PENDING, Job.run_at <= now),
+                        and_(Job.status == JobStatus.RUNNING, Job.locked_until < now)  # worker 失效，锁已超时
+                    ))
+                    .order_by(Job.run_at)
+                    .limit(1)
+                    .with_for_update(skip_locked=True)
+                )
+                job = result.scalars().first()
+                if job is None:
+                    return None
+                locked_until = now + timedelta(seconds=self.visibility_timeout)
+                result = await session.execute(
+                    update(Job)
+                    .where(Job.id == job.id, Job.status == job.status, Job.attempts == job.attempts)
+                    .values(status=JobStatus.RUNNING, attempts=Job.attempts + 1,
+                            locked_by=worker_id, locked_until=locked_until)
+                    .execution_options(synchronize_session=False)
+                )
+                if result.rowcount != 1:  # 被其他 worker 抢先领取
+                    return None
+        if job.status == JobStatus.RUNNING:
+            logger.warning(f"后台任务 {job.id} 的 worker {job.locked_by} 已超时，重新领取")
+        job.status = JobStatus.RUNNING
+        job.attempts += 1
+        job.locked_by = worker_id
+        job.locked_until = locked_until
+        return job
+
+    async def _update(self, job: Job, worker_id: str, **values) -> bool:
+        """更新仍由该 worker 持有的任务，锁已被其他 worker 接管时返回 False"""
+        async with async_session_factory() as session:
+            result = await session.execute(
+                update(Job)
+                .where(Job.id == job.id, Job.locked_by == worker_id, Job.status == JobStatus.RUNNING)
+                .values(**values)
+                .execution_options(synchronize_session=False)
+            )
+            await session.commit()
+        if result.rowcount != 1:
+            logger.warning(f"后台任务 {job.id} 的锁已失效，忽略本次执行结果")
+            return False
+        return True
+
+    async def _heartbeat(self, job: Job, worker_id: str, handler_task: asyncio.Task):
+        """
+        执行期间定期延长锁定时间
+
+        锁已被其他 worker 接管（本 worker 续期太慢，任务已被重新领取）时取消处理函数并结束，避免同一任务同时执行两次。
+        """
+        while True:
+            await asyncio.sleep(self.visibility_timeout / 3)
+            try:
+                renewed = await self._update(job, worker_id,
+                                             locked_until=_utcnow() + timedelta(seconds=self.visibility_timeout))
+            except Exception as e:
+                logger.error(f"后台任务 {job.id} 续期失败: {str(e)}")
+                continue
+            if not renewed:
+                logger.warning(f"后台任务 {job.id}（{job.name}）已被其他 worker 接管，停止本次执行")
+                handler_task.cancel()
+                return
+
+    def _retry_delay(self, attempts: int) -> float:
+        delay = min(self.retry_base_delay * (2 ** (attempts - 1)), self.retry_max_delay)
+        return delay * random.uniform(0.8, 1.2)
+
+    async def _execute(self, job: Job, worker_id: str):
+        handler = JOB_HANDLERS.get(job.name)
+        if handler is None or job.attempts > job.max_attempts:
+            error = f"未注册的任务类型: {job.name}" if handler is None else "超过最大执行次数"
+            logger.error(f"后台任务 {job.id} 失败: {error}")
+            self.failed += 1
+            await self._update(job, worker_id, status=JobStatus.FAILED, last_error=error,
+                               locked_by=None, locked_until=None, finished_at=_utcnow())
+            return
+
+        self.running[job.id] = job.name
+        handler_task = asyncio.create_task(handler(orjson.loads(job.payload)))
+        heartbeat = asyncio.create_task(self._heartbeat(job, worker_id, handler_task))
+        try:
+            result = await handler_task
+        except asyncio.CancelledError:
+            if heartbeat.done() and not heartbeat.cancelled() and not asyncio.current_task().cancelling():
+                # 锁已被其他 worker 接管，处理函数被心跳取消；任务状态由接管的 worker 负责
+                self.lost += 1
+                return
+            # 执行器关闭，放回队列等待下次执行
+            await asyncio.shield(self._update(job, worker_id, status=JobStatus.PENDING, run_at=_utcnow(),
+                                              attempts=job.attempts - 1, locked_by=None, locked_until=None))
+            raise
+        except Exception as e:
+            error = f"{type(e).__name__}: {str(e)}"
+            if job.attempts >= job.max_attempts:
+                logger.error(f"后台任务 {job.id}（{job.name}）第 {job.attempts} 次执行失败，不再重试: {error}",
+                             exc_info=True)
+                self.failed += 1
+                await self._update(job, worker_id, status=JobStatus.FAILED, last_error=error,
+                                   locked_by=None, locked_until=None, finished_at=_utcnow())
+            else:
+                delay = self._retry_delay(job.attempts)
+                logger.warning(f"后台任务 {job.id}（{job.name}）第 {job.attempts} 次执行失败，{delay:.1f}s 后重试: {error}")
+                self.retried += 1
+                await self._update(job, worker_id, status=JobStatus.PENDING, last_error=error,
+                                   run_at=_utcnow() + timedelta(seconds=delay), locked_by=None, locked_until=None)
+        else:
+            self.succeeded += 1
+            await self._update(job, worker_id, status=JobStatus.SUCCEEDED,
+                               result=orjson.dumps(result, default=str).decode(),
+                               locked_by=None, locked_until=None, finished_at=_utcnow())
+        finally:
+            heartbeat.cancel()
+            self.running.pop(job.id, None)
+
+    async def stats(self) -> dict:
+        async with async_session_factory() as session:
+            rows = await session.execute(select(Job.status, func.count()).group_by(Job.status))
+            by_status = {status.value: count for status, count in rows}
+        return {
+            "workers": len(self._workers),
+            "running": dict(self.running),
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "retried": self.retried,
+            "lost": self.lost,
+            "by_status": by_status
+        }
+
+
+job_runner = JobRunner(
+    worker_count=settings.JOB_WORKERS,
+    poll_interval=settings.JOB_POLL_INTERVAL,
+    visibility_timeout=settings.JOB_VISIBILITY_TIMEOUT,
+    retry_base_delay=settings.JOB_RETRY_BASE_DELAY,
+    retry_max_delay=settings.JOB_RETRY_MAX_DELAY
+)
@@ -0,0 +1,196 @@
+# 关键词自动回复规则引擎
+
+import os
+import json
+import asyncio
+import unicodedata
+from typing import Dict, List, Optional, Tuple
+
+from app.config import settings
+from app.logger import get_logger
+
+logger = get_logger('keyword_rules')
+
+
+def normalize_text(text: str) -> str:
+    """统一全角/半角和大小写，关键词与消息使用同样的归一化"""
+    return unicodedata.normalize("NFKC", text).lower()
+
+
+class KeywordRule:
+    """一条自动回复规则"""
+
+    __slots__ = ("rule_id", "keywords", "reply", "priority")
+
+    def __init__(self, rule_id: int, keywords: List[str], reply: str, priority: int = 0):
+        self.rule_id = rule_id
+        self.keywords = keywords
+        self.reply = reply
+        self.priority = priority  # 数值越大越优先
+
+    def to_dict(self) -> dict:
+        return {"id": self.rule_id, "keywords": self.keywords, "reply": self.reply, "priority": self.priority}
+
+
+class AhoCorasick:
+    """
+    Aho-Corasick 多模式匹配自动机
+
+    所有关键词编译进同一个自动机，匹配耗时只与消息长度有关，与规则数量无关
+    """
+
+    def __init__(self, patterns: List[Tuple[str, int]]):
+        # 每个节点：转移表、失败指针、命中的 (规则ID, 关键词长度)
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[Tuple[Tuple[int, int], ...]] = [()]
+        outputs: List[List[Tuple[int, int]]] = [[]]
+
+        for pattern, value in patterns:
+            node = 0
+            for char in pattern:
+                next_node = self._goto[node].get(char)
+                if next_node is None:
+                    next_node = len(self._goto)
+                    self._goto[node][char] = next_node
+                    self._goto.append({})
+                    self._fail.append(0)
+                    outputs.append([])
+                node = next_node
+            outputs[node].append((value, len(pattern)))
+
+        # 广度优先计算失败指针，并把失败链上的输出合并到当前节点
+        queue = list(self._goto[0].values())
+        head = 0
+        while head < len(queue):
+            node = queue[head]
+            head += 1
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                fail_child = self._goto[fail].get(char, 0)
+                self._fail[child] = fail_child if fail_child != child else 0
+                outputs[child].extend(outputs[self._fail[child]])
+        self._output = [tuple(output) for output in outputs]
+
+    def search(self, text: str) -> List[Tuple[int, int, int]]:
+        """返回所有命中的 (规则ID, 结束位置, 关键词长度)"""
+        goto, fail, output = self._goto, self._fail, self._output
+        node = 0
+        matches = []
+        for index, char in enumerate(text):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if output[node]:
+                for value, length in output[node]:
+                    matches.append((value, index, length))
+        return matches
+
+
+class KeywordRuleEngine:
+    """
+    关键词规则引擎
+
+    规则文件变更后在线程中重新编译自动机，编译完成后整体替换引用，
+    匹配过程始终使用一份完整的自动机，不会被重新加载阻塞。
+    """
+
+    def __init__(self, rules_file: str, reload_interval: float):
+        self.rules_file = rules_file
+        self.reload_interval = reload_interval
+        self._rules: Dict[int, KeywordRule] = {}
+        self._automaton = AhoCorasick([])
+        self._mtime = None
+        self._task: Optional[asyncio.Task] = None
+        self.matched = 0
+
+    @staticmethod
+    def compile(rule_dicts: List[dict]) -> Tuple[Dict[int, KeywordRule], AhoCorasick]:
+        """编译规则列表为自动机，格式不正确时抛出 ValueError"""
+        if not isinstance(rule_dicts, list):
+            raise ValueError("规则文件顶层应为列表")
+        rules = {}
+        patterns = []
+        for index, item in enumerate(rule_dicts):
+            if not isinstance(item, dict):
+                raise ValueError(f"第 {index + 1} 条规则应为对象")
+            if not isinstance(item.get("keywords"), list) or not isinstance(item.get("reply"), str):
+                raise ValueError(f"第 {index + 1} 条规则缺少 keywords 列表或 reply 文本")
+            rule = KeywordRule(item.get("id", index), list(item["keywords"]), item["reply"], item.get("priority", 0))
+            rules[rule.rule_id] = rule
+            for keyword in rule.keywords:
+                keyword = normalize_text(keyword).strip()
+                if keyword:
+                    patterns.append((keyword, rule.rule_id))
+        return rules, AhoCorasick(patterns)
+
+    def load(self, rule_dicts: List[dict]):
+        """直接加载规则列表"""
+        self._rules, self._automaton = self.compile(rule_dicts)
+
+    def match(self, text: str) -> Optional[KeywordRule]:
+        """匹配消息，命中多条规则时取优先级最高、关键词最长、位置最靠前的一条"""
+        rules, automaton = self._rules, self._automaton
+        best = None
+        best_key = None
+        for rule_id, end, length in automaton.search(normalize_text(text)):
+            rule = rules[rule_id]
+            key = (rule.priority, length, -end)
+            if best_key is None or key > best_key:
+                best, best_key = rule, key
+        if best is not None:
+            self.matched += 1
+        return best
+
+    def _read_rules_file(self):
+        with open(self.rules_file, "r", encoding="utf-8") as f:
+            return self.compile(json.load(f))
+
+    async def reload_if_changed(self):
+        """规则文件有变化时重新加载"""
+        try:
+            mtime = (await asyncio.to_thread(os.stat, self.rules_file)).st_mtime
+        except FileNotFoundError:
+            return
+        except OSError as e:
+            logger.error(f"读取关键词规则文件失败，继续使用旧规则: {str(e)}")
+            return
+        if mtime == self._mtime:
+            return
+        try:
+            rules, automaton = await asyncio.to_thread(self._read_rules_file)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.error(f"加载关键词规则失败，继续使用旧规则: {str(e)}")
+            self._mtime = mtime
+            return
+        self._rules, self._automaton, self._mtime = rules, automaton, mtime
+        logger.info(f"已加载关键词规则 {len(rules)} 条")
+
+    async def start(self):
+        if self._task is None:
+            await self.reload_if_changed()
+            self._task = asyncio.create_task(self._reload_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _reload_loop(self):
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            try:
+                await self.reload_if_changed()
+            except Exception as e:
+                # 不让意外错误结束重新加载任务
+                logger.error(f"重新加载关键词规则失败: {str(e)}", exc_info=True)
+
+    def stats(self) -> dict:
+        return {"rules": len(self._rules), "matched": self.matched}
+
+
+keyword_engine = KeywordRuleEngine(settings.KEYWORD_RULES_FILE, settings.KEYWORD_RULES_RELOAD_INTERVAL)
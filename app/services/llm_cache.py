@@ -0,0 +1,254 @@
+# 大模型回复缓存
+
+import os
+import copy
+import time
+import sqlite3
+import asyncio
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import orjson
+
+from app.logger import get_logger
+from app.services.llm_service import LLMBackend
+
+logger = get_logger('llm_cache')
+
+
+class LLMGenerationCancelled(Exception):
+    """共享的生成被取消（如服务关闭），等待该生成的请求收到此异常"""
+
+
+def _fresh_error(error: BaseException) -> Exception:
+    """
+    为每个等待的请求生成新的异常实例
+
+    同一个异常实例在多个协程中抛出会互相追加 traceback；CancelledError 不是 Exception 的子类，
+    调用方按 Exception 处理错误时捕获不到，转换为 LLMGenerationCancelled。
+    """
+    if isinstance(error, asyncio.CancelledError):
+        return LLMGenerationCancelled("生成已取消")
+    try:
+        return copy.copy(error)
+    except Exception:
+        return RuntimeError(str(error))
+
+
+def normalize_prompt(prompt: str) -> str:
+    """
+    归一化提示词：全角转半角、大小写统一，去掉空白和标点
+
+    数字之间的标点和空白保留，"1.5" 与 "15"、"1 5" 是不同的提示词。
+    """
+    text = unicodedata.normalize("NFKC", prompt).lower()
+    chars = []
+    for index, char in enumerate(text):
+        if unicodedata.category(char).startswith(("P", "Z", "C")):
+            if not (0 < index < len(text) - 1 and text[index - 1].isdigit() and text[index + 1].isdigit()):
+                continue
+        chars.append(char)
+    return "".join(chars)
+
+
+def make_cache_key(prompt: str, params: Dict[str, Any], namespace: str = "") -> str:
+    """缓存键：后端及模型 + 归一化后的提示词 + 模型参数"""
+    raw = (namespace.encode("utf-8") + b"\x00" + normalize_prompt(prompt).encode("utf-8") + b"\x00"
+           + orjson.dumps(params, option=orjson.OPT_SORT_KEYS))
+    return hashlib.sha256(raw).hexdigest()
+
+
+class SQLiteCacheTier:
+    """磁盘缓存层，使用 SQLite 存储，所有读写在线程中执行"""
+
+    def __init__(self, path: str, ttl: float):
+        self.ttl = ttl
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache (key TEXT PRIMARY KEY, tokens BLOB NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._lock = threading.Lock()
+
+    def _get(self, key: str) -> Optional[List[str]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT tokens FROM llm_cache WHERE key = ? AND created_at > ?", (key, time.time() - self.ttl)
+            ).fetchone()
+        return orjson.loads(row[0]) if row else None
+
+    def _put(self, key: str, tokens: List[str]):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, tokens, created_at) VALUES (?, ?, ?)",
+                (key, orjson.dumps(tokens), time.time())
+            )
+
+    async def get(self, key: str) -> Optional[List[str]]:
+        return await asyncio.to_thread(self._get, key)
+
+    async def put(self, key: str, tokens: List[str]):
+        await asyncio.to_thread(self._put, key, tokens)
+
+    def close(self):
+        self._conn.close()
+
+
+class _SharedGeneration:
+    """一次正在进行的生成，多个相同请求共享其输出"""
+
+    __slots__ = ("tokens", "done", "error", "condition", "subscribers", "task")
+
+    def __init__(self):
+        self.tokens: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.condition = asyncio.Condition()
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+
+
+class CachedLLMBackend(LLMBackend):
+    """
+    带缓存的大模型后端
+
+    - 按归一化提示词 + 模型参数缓存完整回复：内存 LRU，可选 SQLite 磁盘层
+    - namespace 标识后端和模型（如 openai:gpt-4o-mini），切换后端或模型后不会命中之前的缓存
+    - 相同请求并发到达时只调用一次后端，生成的 token 同时推送给所有等待的请求
+    - 所有请求都断开后取消后端生成
+    """
+
+    name = "cache"
+
+    def __init__(self, backend: LLMBackend, max_entries: int, ttl: float, sqlite_path: str = "", namespace: str = ""):
+        self.backend = backend
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.disk = SQLiteCacheTier(sqlite_path, ttl) if sqlite_path else None
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._inflight: Dict[str, _SharedGeneration] = {}
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.coalesced = 0
+        self.misses = 0
+
+    def _memory_get(self, key: str) -> Optional[List[str]]:
+        entry = self._memory.get(key)
+        if entry is None:
+            return None
+        tokens, expire_at = entry
+        if expire_at < time.monotonic():
+            del self._memory[key]
+            return None
+        self._memory.move_to_end(key)
+        return tokens
+
+    def _memory_put(self, key: str, tokens: List[str]):
+        self._memory[key] = (tokens, time.monotonic() + self.ttl)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    async def stream(self, prompt: str, params: Dict[str, Any]) -> AsyncIterator[str]:
+        key = make_cache_key(prompt, params, self.namespace)
+        tokens = self._memory_get(key)
+        if tokens is not None:
+            self.memory_hits += 1
+            for token in tokens:
+                yield token
+            return
+
+        generation = self._inflight.get(key)
+        if generation is None and self.disk is not None:
+            tokens = await self.disk.get(key)
+            if tokens is not None:
+                self.disk_hits += 1
+                self._memory_put(key, tokens)
+                for token in tokens:
+                    yield token
+                return
+            generation = self._inflight.get(key)
+
+        if generation is None:
+            self.misses += 1
+            generation = _SharedGeneration()
+            self._inflight[key] = generation
+            generation.task = asyncio.create_task(self._generate(key, generation, prompt, params))
+        else:
+            self.coalesced += 1
+
+        generation.subscribers += 1
+        try:
+            index = 0
+            while True:
+                async with generation.condition:
+                    await generation.condition.wait_for(lambda: len(generation.tokens) > index or generation.done)
+                    new_tokens = generation.tokens[index:]
+                    done = generation.done
+                # 在锁外 yield，避免慢客户端阻塞其他请求
+                for token in new_tokens:
+                    yield token
+                index += len(new_tokens)
+                if done and index >= len(generation.tokens):
+                    if generation.error is not None:
+                        raise _fresh_error(generation.error) from generation.error
+                    return
+        finally:
+            generation.subscribers -= 1
+            if generation.subscribers == 0 and not generation.done:
+                # 先移出 _inflight，之后到达的相同请求开始新的生成，而不是加入即将被取消的生成
+                if self._inflight.get(key) is generation:
+                    del self._inflight[key]
+                generation.task.cancel()
+
+    async def _generate(self, key: str, generation: _SharedGeneration, prompt: str, params: Dict[str, Any]):
+        try:
+            async for token in self.backend.stream(prompt, params):
+                async with generation.condition:
+                    generation.tokens.append(token)
+                    generation.condition.notify_all()
+        except asyncio.CancelledError:
+            generation.error = asyncio.CancelledError()
+        except Exception as e:
+            generation.error = e
+        finally:
+            if self._inflight.get(key) is generation:
+                del self._inflight[key]
+            async with generation.condition:
+                generation.done = True
+                generation.condition.notify_all()
+
+        if generation.error is None:
+            self._memory_put(key, generation.tokens)
+            if self.disk is not None:
+                try:
+                    await self.disk.put(key, generation.tokens)
+                except sqlite3.Error as e:
+                    logger.error(f"写入大模型磁盘缓存失败: {str(e)}")
+
+    async def close(self):
+        generations = list(self._inflight.values())
+        self._inflight.clear()
+        for generation in generations:
+            generation.task.cancel()
+        if self.disk is not None:
+            self.disk.close()
+        await self.backend.close()
+
+    def stats(self) -> dict:
+        hits = self.memory_hits + self.disk_hits + self.coalesced
+        total = hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "coalesced": self.coalesced,
+            "misses": self.misses,
+            "hit_rate": hits / total if total else 0.0,
+            "memory_entries": len(self._memory),
+            "inflight": len(self._inflight)
+        }
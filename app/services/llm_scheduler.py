@@ -0,0 +1,273 @@
+# 大模型请求调度：全局并发上限 + 按用户公平排队
+
+import time
+import asyncio
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Sequence, Set
+
+import orjson
+
+from app.logger import get_logger
+from app.services.llm_service import LLMBackend, current_llm_user
+
+logger = get_logger('llm_scheduler')
+
+
+class LLMSchedulerError(Exception):
+    """调度器拒绝或丢弃请求"""
+
+
+class LLMQueueFull(LLMSchedulerError):
+    """用户排队的请求数已达上限"""
+
+
+class LLMQueueTimeout(LLMSchedulerError):
+    """排队超过截止时间仍未开始生成"""
+
+
+class LLMSchedulerClosed(LLMSchedulerError):
+    """调度器已关闭，排队中的请求被丢弃"""
+
+
+class _Batch:
+    """正在收集的一批提示词（模型参数相同）"""
+
+    __slots__ = ("params", "items", "full", "task")
+
+    def __init__(self, params: Dict[str, Any]):
+        self.params = params
+        self.items: List[tuple] = []  # (提示词, 用户, Future)
+        self.full = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+
+
+class FairScheduler(LLMBackend):
+    """
+    大模型请求调度器
+
+    - 同时进行的生成数不超过 max_concurrency
+    - 超出上限的请求按用户分队列，空出名额时在有排队的用户之间轮转分配，
+      单个用户大量请求不会饿死其他用户
+    - 排队超过 queue_timeout 的请求直接丢弃；客户端断开时从队列中移除
+    - 后端支持批量生成（supports_batch）且 batch_max_size > 1 时，
+      在 batch_window 内到达的同参数请求合并成一批，只占用一个并发名额；
+      排队时这一批同时计入每个成员用户的队列，各消耗一次轮转机会
+    """
+
+    name = "scheduler"
+
+    def __init__(self, backend: LLMBackend, max_concurrency: int, queue_timeout: float,
+                 max_queued_per_user: int, batch_max_size: int = 1, batch_window: float = 0.02):
+        self.backend = backend
+        self.max_concurrency = max_concurrency
+        self.queue_timeout = queue_timeout
+        self.max_queued_per_user = max_queued_per_user
+        self.batch_max_size = batch_max_size
+        self.batch_window = batch_window
+        self.running = 0
+        self._queues: Dict[str, Deque[asyncio.Future]] = {}
+        self._rotation: Deque[str] = deque()
+        self._pending_batches: Dict[bytes, _Batch] = {}
+        self._batch_tasks: Set[asyncio.Task] = set()
+        self.waits = deque(maxlen=1000)
+        self.granted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.abandoned = 0
+        self.batches = 0
+        self.batched_requests = 0
+
+    @property
+    def batching(self) -> bool:
+        return self.batch_max_size > 1 and getattr(self.backend, "supports_batch", False)
+
+    def _enqueue(self, user: str, future: asyncio.Future):
+        queue = self._queues.get(user)
+        if queue is None:
+            queue = self._queues[user] = deque()
+            self._rotation.append(user)
+        queue.append(future)
+
+    async def acquire(self, user: str, batch_users: Sequence[str] = ()):
+        """
+        获取一个并发名额，排队超时抛出 LLMQueueTimeout
+
+        batch_users 为同一批中其他请求的用户：同一个等待项也排进这些用户的队列（队列已满的除外），
+        名额由最先轮到的用户分配，其余用户轮到时跳过该项，相当于各自消耗一次轮转机会。
+        """
+        if self.running < self.max_concurrency and not self._rotation:
+            self.running += 1
+            self.granted += 1
+            self.waits.append(0.0)
+            return
+
+        queue = self._queues.get(user)
+        if queue is not None and len(queue) >= self.max_queued_per_user:
+            self.rejected += 1
+            raise LLMQueueFull(f"用户 {user} 排队请求过多")
+        future = asyncio.get_running_loop().create_future()
+        users = [user]
+        self._enqueue(user, future)
+        for other in dict.fromkeys(batch_users):
+            if other != user and len(self._queues.get(other, ())) < self.max_queued_per_user:
+                users.append(other)
+                self._enqueue(other, future)
+
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if future.done():
+                # 分配名额与超时/取消同时发生，把名额还回去
+                if not future.cancelled() and future.exception() is None:
+                    self._release()
+            else:
+                future.cancel()
+                for queued_user in users:
+                    self._remove(queued_user, future)
+            if isinstance(e, asyncio.TimeoutError):
+                self.timed_out += 1
+                logger.warning(f"用户 {user} 的大模型请求排队超过 {self.queue_timeout} 秒，已丢弃")
+                raise LLMQueueTimeout("排队超时，请稍后重试") from None
+            self.abandoned += 1
+            raise
+        self.waits.append(time.perf_counter() - start)
+
+    def _remove(self, user: str, future: asyncio.Future):
+        queue = self._queues.get(user)
+        if queue is None:
+            return
+        try:
+            queue.remove(future)
+        except ValueError:
+            return
+        if not queue:
+            del self._queues[user]
+            self._rotation.remove(user)
+
+    def _release(self):
+        self.running -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        """把空出的名额轮流分给排队中的用户"""
+        while self.running < self.max_concurrency and self._rotation:
+            user = self._rotation.popleft()
+            queue = self._queues[user]
+            future = queue.popleft()
+            if queue:
+                self._rotation.append(user)
+            else:
+                del self._queues[user]
+            if future.done():
+                # 同一批的等待项已经从其他用户的队列获得名额，本次轮转机会视为已消耗
+                continue
+            self.running += 1
+            self.granted += 1
+            future.set_result(None)
+
+    async def stream(self, prompt: str, params: Dict[str, Any]) -> AsyncIterator[str]:
+        user = current_llm_user.get()
+        if self.batching:
+            for token in await self._submit_batch(user, prompt, params):
+                yield token
+            return
+
+        await self.acquire(user)
+        try:
+            async for token in self.backend.stream(prompt, params):
+                yield token
+        finally:
+            self._release()
+
+    async def _submit_batch(self, user: str, prompt: str, params: Dict[str, Any]) -> List[str]:
+        key = orjson.dumps(params, option=orjson.OPT_SORT_KEYS)
+        batch = self._pending_batches.get(key)
+        if batch is None:
+            batch = self._pending_batches[key] = _Batch(params)
+            batch.task = asyncio.create_task(self._run_batch(key, batch))
+            self._batch_tasks.add(batch.task)
+            batch.task.add_done_callback(self._batch_tasks.discard)
+        future = asyncio.get_running_loop().create_future()
+        batch.items.append((prompt, user, future))
+        if len(batch.items) >= self.batch_max_size:
+            del self._pending_batches[key]
+            batch.full.set()
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+
+    async def _run_batch(self, key: bytes, batch: _Batch):
+        try:
+            try:
+                await asyncio.wait_for(batch.full.wait(), self.batch_window)
+            except asyncio.TimeoutError:
+                pass
+            if self._pending_batches.get(key) is batch:
+                del self._pending_batches[key]
+
+            users = [user for _, user, _ in batch.items]
+            await self.acquire(users[0], users[1:])
+            try:
+                # 排队期间已断开的请求不再生成
+                items = [(prompt, future) for prompt, _, future in batch.items if not future.done()]
+                if not items:
+                    return
+                self.batches += 1
+                self.batched_requests += len(items)
+                results = await self.backend.generate_batch([prompt for prompt, _ in items], batch.params)
+            finally:
+                self._release()
+            for (_, future), tokens in zip(items, results):
+                if not future.done():
+                    future.set_result(tokens)
+        except Exception as e:
+            for _, _, future in batch.items:
+                if not future.done():
+                    future.set_exception(e)
+        except asyncio.CancelledError:
+            # 调度器关闭，通知这一批中仍在等待的请求
+            for _, _, future in batch.items:
+                if not future.done():
+                    future.set_exception(LLMSchedulerClosed("服务正在关闭，请稍后重试"))
+            raise
+
+    async def close(self):
+        """关闭调度器：排队中的请求和未完成的批次收到 LLMSchedulerClosed"""
+        tasks = list(self._batch_tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for queue in self._queues.values():
+            for future in queue:
+                if not future.done():
+                    future.set_exception(LLMSchedulerClosed("服务正在关闭，请稍后重试"))
+        self._queues.clear()
+        self._rotation.clear()
+        self._pending_batches.clear()
+        await self.backend.close()
+
+    def stats(self) -> dict:
+        waits = sorted(self.waits)
+
+        def percentile(p):
+            return waits[min(int(len(waits) * p / 100), len(waits) - 1)] if waits else None
+
+        return {
+            "max_concurrency": self.max_concurrency,
+            "running": self.running,
+            "queued": sum(len(queue) for queue in self._queues.values()),
+            "queued_users": len(self._queues),
+            "queue_by_user": {user: len(queue) for user, queue in self._queues.items()},
+            "granted": self.granted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "abandoned": self.abandoned,
+            "batches": self.batches,
+            "batched_requests": self.batched_requests,
+            "wait_p50": percentile(50),
+            "wait_p95": percentile(95),
+            "wait_max": waits[-1] if waits else None
+        }
@@ -0,0 +1,232 @@
+# 大模型回复生成服务
+
+import time
+import random
+import asyncio
+import hashlib
+from collections import deque
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Dict, List, Type
+
+import httpx
+import orjson
+
+from app.config import settings
+from app.logger import get_logger
+
+logger = get_logger('llm_service')
+
+# 当前请求所属用户，调度器据此做公平排队
+current_llm_user: ContextVar[str] = ContextVar("current_llm_user", default="anonymous")
+
+
+class LLMBackend:
+    """
+    大模型后端接口
+
+    stream() 以异步生成器的形式逐个返回生成的 token。调用方关闭生成器（aclose）
+    或取消所在任务时，后端应停止生成并释放上游连接。
+
+    supports_batch 为 True 的后端还需实现 generate_batch()，一次生成多个提示词的完整回复。
+    """
+
+    supports_batch = False
+
+    async def stream(self, prompt: str, params: Dict[str, Any]) -> AsyncIterator[str]:
+        raise NotImplementedError
+        yield  # pragma: no cover
+
+    async def generate_batch(self, prompts: List[str], params: Dict[str, Any]) -> List[List[str]]:
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+# 已注册的后端，通过 LLM_BACKEND 配置选择
+BACKENDS: Dict[str, Type[LLMBackend]] = {}
+
+
+def register_backend(name: str):
+    """注册大模型后端的装饰器"""
+    def decorator(cls: Type[LLMBackend]) -> Type[LLMBackend]:
+        BACKENDS[name] = cls
+        return cls
+    return decorator
+
+
+@register_backend("fake")
+class FakeLLMBackend(LLMBackend):
+    """
+    本地确定性假后端，用于测试和延迟压测
+
+    同一 prompt 和参数总是生成同样的回复，首 token 延迟和 token 间隔可配置。
+    批量生成时整批只花费一次生成时间。
+    """
+
+    supports_batch = True
+
+    WORDS = ["您好", "，", "请", "先", "检查", "设备", "电源", "是否", "接通", "。", "如果", "指示灯", "不亮", "，",
+             "请", "更换", "电源", "适配器", "后", "重试", "；", "仍然", "无法", "开机", "请", "联系", "售后", "工程师", "。"]
+
+    def __init__(self, first_token_delay: float = None, token_interval: float = None):
+        self.first_token_delay = settings.LLM_FAKE_FIRST_TOKEN_DELAY if first_token_delay is None else first_token_delay
+        self.token_interval = settings.LLM_FAKE_TOKEN_INTERVAL if token_interval is None else token_interval
+
+    def _tokens(self, prompt: str, params: Dict[str, Any]) -> List[str]:
+        seed = hashlib.sha256(orjson.dumps([prompt, params], option=orjson.OPT_SORT_KEYS)).digest()
+        rng = random.Random(seed)
+        return [rng.choice(self.WORDS) for _ in range(int(params.get("max_tokens", 64)))]
+
+    async def stream(self, prompt: str, params: Dict[str, Any]) -> AsyncIterator[str]:
+        await asyncio.sleep(self.first_token_delay)
+        for index, token in enumerate(self._tokens(prompt, params)):
+            if index:
+                await asyncio.sleep(self.token_interval)
+            yield token
+
+    async def generate_batch(self, prompts: List[str], params: Dict[str, Any]) -> List[List[str]]:
+        max_tokens = int(params.get("max_tokens", 64))
+        await asyncio.sleep(self.first_token_delay + self.token_interval * max(max_tokens - 1, 0))
+        return [self._tokens(prompt, params) for prompt in prompts]
+
+
+@register_backend("openai")
+class OpenAICompatibleBackend(LLMBackend):
+    """兼容 OpenAI Chat Completions 流式接口的后端"""
+
+    def __init__(self):
+        self.model = settings.LLM_MODEL
+        self._client = httpx.AsyncClient(
+            base_url=settings.LLM_API_BASE,
+            headers={"Authorization": f"Bearer {settings.LLM_API_KEY}"},
+            timeout=httpx.Timeout(10, read=60)
+        )
+
+    async def stream(self, prompt: str, params: Dict[str, Any]) -> AsyncIterator[str]:
+        payload = {"model": self.model, "messages": [{"role": "user", "content": prompt}], "stream": True, **params}
+        # 退出 async with 时关闭上游连接，上游随之停止生成
+        async with self._client.stream("POST", "/chat/completions", json=payload) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+                choices = orjson.loads(data).get("choices") or [{}]
+                content = choices[0].get("delta", {}).get("content")
+                if content:
+                    yield content
+
+    async def close(self):
+        await self._client.aclose()
+
+
+class LLMMetrics:
+    """生成请求统计，保留最近的首 token 延迟用于计算分位数"""
+
+    def __init__(self, window: int = 1000):
+        self.requests = 0
+        self.completed = 0
+        self.cancelled = 0
+        self.failed = 0
+        self.tokens = 0
+        self.ttft = deque(maxlen=window)
+
+    def summary(self) -> dict:
+        ttft = sorted(self.ttft)
+
+        def percentile(p):
+            return ttft[min(int(len(ttft) * p / 100), len(ttft) - 1)] if ttft else None
+
+        return {
+            "requests": self.requests,
+            "completed": self.completed,
+            "cancelled": self.cancelled,
+            "failed": self.failed,
+            "tokens": self.tokens,
+            "ttft_p50": percentile(50),
+            "ttft_p95": percentile(95),
+            "ttft_p99": percentile(99)
+        }
+
+
+llm_metrics = LLMMetrics()
+
+
+def create_backend(name: str) -> LLMBackend:
+    if name not in BACKENDS:
+        raise ValueError(f"未知的大模型后端: {name}")
+    return BACKENDS[name]()
+
+
+def build_backend() -> LLMBackend:
+    """按配置创建后端，外层依次套上调度器和缓存（缓存命中的请求不占用并发名额）"""
+    # 在函数内导入，避免与 llm_scheduler / llm_cache 循环导入
+    from app.services.llm_scheduler import FairScheduler
+    from app.services.llm_cache import CachedLLMBackend
+
+    backend = FairScheduler(
+        create_backend(settings.LLM_BACKEND),
+        max_concurrency=settings.LLM_MAX_CONCURRENCY,
+        queue_timeout=settings.LLM_QUEUE_TIMEOUT,
+        max_queued_per_user=settings.LLM_USER_MAX_QUEUED,
+        batch_max_size=settings.LLM_BATCH_MAX_SIZE,
+        batch_window=settings.LLM_BATCH_WINDOW
+    )
+    if settings.LLM_CACHE_ENABLED:
+        backend = CachedLLMBackend(
+            backend,
+            max_entries=settings.LLM_CACHE_MAX_ENTRIES,
+            ttl=settings.LLM_CACHE_TTL,
+            sqlite_path=settings.LLM_CACHE_SQLITE_PATH,
+            namespace=f"{settings.LLM_BACKEND}:{settings.LLM_MODEL}"
+        )
+    return backend
+
+
+llm_backend: LLMBackend = build_backend()
+
+
+def backend_stats() -> dict:
+    """收集后端各层（缓存、调度器）的统计"""
+    result = {}
+    backend = llm_backend
+    while backend is not None:
+        if hasattr(backend, "stats"):
+            result[backend.name] = backend.stats()
+        backend = getattr(backend, "backend", None)
+    return result
+
+
+async def stream_reply(prompt: str, params: Dict[str, Any], user_id: Any = None) -> AsyncIterator[str]:
+    """
+    流式生成回复并记录统计
+
+    调用方每取走一个 token 才会生成下一个（背压）；调用方被取消或关闭生成器时，
+    后端生成器也随之关闭，停止上游生成。user_id 用于调度器按用户公平排队。
+    """
+    if user_id is not None:
+        current_llm_user.set(str(user_id))
+    llm_metrics.requests += 1
+    start = time.perf_counter()
+    first = True
+    generator = llm_backend.stream(prompt, params)
+    try:
+        async for token in generator:
+            if first:
+                first = False
+                llm_metrics.ttft.append(time.perf_counter() - start)
+            llm_metrics.tokens += 1
+            yield token
+        llm_metrics.completed += 1
+    except (asyncio.CancelledError, GeneratorExit):
+        llm_metrics.cancelled += 1
+        logger.info("客户端已断开，取消大模型生成")
+        raise
+    except Exception:
+        llm_metrics.failed += 1
+        raise
+    finally:
+        await generator.aclose()
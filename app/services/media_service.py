@@ -0,0 +1,125 @@
+# 微信媒体文件下载服务
+
+import json
+import asyncio
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.logger import get_logger
+from app.models.ticket import Attachment, AttachmentType
+from app.services.attachment_storage import CHUNK_SIZE, StoredFile, store_stream
+from app.services.attachment_service import discard_unreferenced, record_attachment
+from app.services.wechat_service import (
+    AccessTokenManager, TOKEN_INVALID_ERRCODES, WechatAPIError, get_http_client, token_manager
+)
+
+logger = get_logger('media_service')
+
+# 微信消息类型对应的附件类型
+MEDIA_MSG_TYPES = {
+    "image": AttachmentType.IMAGE,
+    "video": AttachmentType.VIDEO,
+    "shortvideo": AttachmentType.VIDEO,
+    "voice": AttachmentType.DOCUMENT,
+    "file": AttachmentType.DOCUMENT,
+}
+
+
+class MediaDownloader:
+    """
+    微信临时素材下载
+
+    - 信号量限制同时下载的文件数
+    - 响应按块流式写入磁盘，边下载边计算内容哈希，不在内存中缓存整个文件
+    - 相同内容的文件共用同一份存储
+    """
+
+    def __init__(self, tokens: AccessTokenManager, concurrency: int, client: Optional[httpx.AsyncClient] = None):
+        self.tokens = tokens
+        self._client = client
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self.downloaded = 0
+        self.deduplicated = 0
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        return self._client or get_http_client()
+
+    async def download(self, media_id: str) -> Tuple[StoredFile, str]:
+        """下载媒体文件到本地存储，返回存储结果和 Content-Type"""
+        async with self._semaphore:
+            token = await self.tokens.get_token()
+            for attempt in range(2):
+                async with self.client.stream(
+                    "GET", "/cgi-bin/media/get", params={"access_token": token, "media_id": media_id}
+                ) as response:
+                    response.raise_for_status()
+                    content_type = response.headers.get("content-type", "")
+                    if not content_type.startswith(("application/json", "text/plain")):
+                        stored = await store_stream(response.aiter_bytes(CHUNK_SIZE))
+                        break
+                    data = json.loads(await response.aread())
+                if "video_url" in data:
+                    # 视频素材不直接返回内容，而是返回下载地址，再流式下载一次
+                    stored, content_type = await self._download_url(data["video_url"])
+                    break
+                # 出错时微信返回 JSON 错误信息
+                errcode = data.get("errcode", -1)
+                if errcode in TOKEN_INVALID_ERRCODES and attempt == 0:
+                    token = await self.tokens.invalidate(token)
+                    continue
+                raise WechatAPIError(errcode, data.get("errmsg", "下载媒体文件失败"))
+
+        self.downloaded += 1
+        if stored.deduplicated:
+            self.deduplicated += 1
+        logger.info(f"已下载微信媒体文件 {media_id}，大小 {stored.size} 字节，哈希 {stored.content_hash}"
+                    f"{'（内容重复，复用已有文件）' if stored.deduplicated else ''}")
+        return stored, content_type
+
+    async def _download_url(self, url: str) -> Tuple[StoredFile, str]:
+        async with self.client.stream("GET", url) as response:
+            response.raise_for_status()
+            return await store_stream(response.aiter_bytes(CHUNK_SIZE)), response.headers.get("content-type", "")
+
+    async def download_to_ticket(self, session: AsyncSession, ticket_id: int, media_id: str,
+                                 file_type: AttachmentType) -> Attachment:
+        """下载单个媒体文件并记录为问题单附件"""
+        attachments = await self.download_many(session, ticket_id, [(media_id, file_type)])
+        return attachments[0]
+
+    async def download_many(self, session: AsyncSession, ticket_id: int,
+                            media: List[Tuple[str, AttachmentType]]) -> List[Attachment]:
+        """
+        并发下载多个媒体文件并记录为附件，同一问题单内容相同的文件只记录一次
+
+        任一文件下载失败或记录附件失败时不记录任何附件，本次写入的文件稍后由清理任务删除。
+        """
+        # return_exceptions=True：一个下载失败时等待其他下载结束，拿到它们已写入的文件以便清理
+        results = await asyncio.gather(*(self.download(media_id) for media_id, _ in media), return_exceptions=True)
+        stored_files = [result[0] for result in results if not isinstance(result, BaseException)]
+        errors = [result for result in results if isinstance(result, BaseException)]
+        if errors:
+            await discard_unreferenced(stored_files)
+            raise errors[0]
+        try:
+            attachments = []
+            for (stored, content_type), (_, file_type) in zip(results, media):
+                attachments.append(await record_attachment(session, ticket_id, stored, file_type, content_type))
+            await session.commit()
+            for attachment in attachments:
+                await session.refresh(attachment)
+            return attachments
+        except Exception:
+            await session.rollback()
+            await discard_unreferenced(stored_files)
+            raise
+
+    def stats(self) -> Dict[str, int]:
+        return {"downloaded": self.downloaded, "deduplicated": self.deduplicated}
+
+
+media_downloader = MediaDownloader(token_manager, settings.MEDIA_DOWNLOAD_CONCURRENCY)
@@ -0,0 +1,265 @@
+# 微信会话状态存储
+
+import os
+import glob
+import json
+import math
+import time
+import asyncio
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional, Set
+
+from app.config import settings
+from app.logger import get_logger
+
+logger = get_logger('session_store')
+
+
+class ConversationSession:
+    """单个客户（openid）的会话状态，使用 __slots__ 减少内存占用"""
+
+    __slots__ = ("openid", "ticket_id", "agent_id", "messages", "updated_at", "slot")
+
+    def __init__(self, openid: str, history_size: int):
+        self.openid = openid
+        self.ticket_id: Optional[int] = None  # 正在填写的问题单
+        self.agent_id: Optional[int] = None  # 分配的坐席
+        self.messages = deque(maxlen=history_size)  # 最近的消息 (时间戳, 内容)
+        self.updated_at = time.time()
+        self.slot = -1  # 所在的时间轮槽位
+
+    def add_message(self, content: str):
+        self.messages.append((time.time(), content))
+
+    def to_dict(self) -> dict:
+        return {
+            "openid": self.openid,
+            "ticket_id": self.ticket_id,
+            "agent_id": self.agent_id,
+            "messages": list(self.messages),
+            "updated_at": self.updated_at
+        }
+
+
+class SessionStore:
+    """
+    内存会话存储
+
+    - 时间轮：每个会话按最后活跃时间挂在一个槽位上，每个 tick 只清理当前槽位，过期清理为 O(1)
+    - 容量上限：OrderedDict 维护最近访问顺序，超过 max_sessions 时淘汰最久未访问的会话
+    - 定期快照到磁盘，重启后恢复未过期的会话
+
+    多 worker 部署时每个进程各写一个快照文件（<快照文件名>.<pid>.json），互不覆盖；
+    启动时合并读取所有快照，同一客户取最后活跃的会话，超过 ttl 未更新的快照文件会被删除。
+    """
+
+    def __init__(self, ttl: float, max_sessions: int, tick: float, history_size: int,
+                 snapshot_file: str, snapshot_interval: float):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.tick = tick
+        self.history_size = history_size
+        self.snapshot_file = snapshot_file
+        self.snapshot_interval = snapshot_interval
+        self._sessions: "OrderedDict[str, ConversationSession]" = OrderedDict()
+        # 当前槽位已经走过了一部分，多挂一格保证会话至少存活 ttl 秒
+        self._ttl_ticks = max(int(math.ceil(ttl / tick)), 1) + 1
+        self._wheel: List[Set[str]] = [set() for _ in range(self._ttl_ticks + 1)]
+        self._cursor = 0
+        self._tasks: List[asyncio.Task] = []
+        self.expired = 0
+        self.evicted = 0
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def _schedule(self, session: ConversationSession, ticks: Optional[int] = None):
+        """将会话挂到 ticks 个 tick 之后到期的槽位上"""
+        if session.slot >= 0:
+            self._wheel[session.slot].discard(session.openid)
+        session.slot = (self._cursor + (self._ttl_ticks if ticks is None else ticks)) % len(self._wheel)
+        self._wheel[session.slot].add(session.openid)
+
+    def _remove(self, openid: str) -> Optional[ConversationSession]:
+        session = self._sessions.pop(openid, None)
+        if session is not None and session.slot >= 0:
+            self._wheel[session.slot].discard(openid)
+        return session
+
+    def get(self, openid: str) -> Optional[ConversationSession]:
+        """获取会话并刷新活跃时间，不存在时返回 None"""
+        session = self._sessions.get(openid)
+        if session is not None:
+            self.touch(session)
+        return session
+
+    def get_or_create(self, openid: str) -> ConversationSession:
+        """获取会话，不存在时创建"""
+        session = self.get(openid)
+        if session is None:
+            session = ConversationSession(openid, self.history_size)
+            self._sessions[openid] = session
+            self._schedule(session)
+            while len(self._sessions) > self.max_sessions:
+                oldest = next(iter(self._sessions))
+                self._remove(oldest)
+                self.evicted += 1
+        return session
+
+    def touch(self, session: ConversationSession):
+        session.updated_at = time.time()
+        self._sessions.move_to_end(session.openid)
+        self._schedule(session)
+
+    def remove(self, openid: str):
+        self._remove(openid)
+
+    def _advance(self):
+        """时间轮前进一格，清理到期槽位上的会话"""
+        self._cursor = (self._cursor + 1) % len(self._wheel)
+        expired = self._wheel[self._cursor]
+        self._wheel[self._cursor] = set()
+        for openid in expired:
+            session = self._sessions.pop(openid, None)
+            if session is not None:
+                session.slot = -1
+                self.expired += 1
+
+    def _worker_snapshot_file(self) -> str:
+        root, ext = os.path.splitext(self.snapshot_file)
+        return f"{root}.{os.getpid()}{ext}"
+
+    def _snapshot_files(self) -> List[str]:
+        """所有 worker 的快照文件，以及单文件格式的旧快照"""
+        root, ext = os.path.splitext(self.snapshot_file)
+        files = glob.glob(f"{glob.escape(root)}.*{ext}")
+        if os.path.exists(self.snapshot_file):
+            files.append(self.snapshot_file)
+        return files
+
+    def _write_snapshot(self, data: List[dict]):
+        os.makedirs(os.path.dirname(self.snapshot_file), exist_ok=True)
+        snapshot_file = self._worker_snapshot_file()
+        tmp_file = f"{snapshot_file}.tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_file, snapshot_file)
+
+    async def snapshot(self):
+        """将当前会话写入磁盘（序列化在事件循环中完成，写文件放到线程中）"""
+        data = [session.to_dict() for session in self._sessions.values()]
+        await asyncio.to_thread(self._write_snapshot, data)
+        logger.debug(f"会话快照已保存，共 {len(data)} 个会话")
+
+    def _read_snapshot(self) -> List[dict]:
+        """读取并合并所有快照文件，删除全部会话都已过期的快照文件"""
+        data = []
+        expire_before = time.time() - self.ttl
+        for snapshot_file in self._snapshot_files():
+            try:
+                with open(snapshot_file, "r", encoding="utf-8") as f:
+                    items = json.load(f)
+                if isinstance(items, list):
+                    data.extend(items)
+                else:
+                    logger.warning(f"会话快照格式错误，已忽略: {snapshot_file}")
+                if os.path.getmtime(snapshot_file) < expire_before:
+                    os.remove(snapshot_file)
+            except FileNotFoundError:
+                continue  # 其他 worker 同时删除了该文件
+            except (OSError, ValueError) as e:
+                logger.error(f"读取会话快照失败 {snapshot_file}: {str(e)}")
+        return data
+
+    def _restore_session(self, item: dict, now: float) -> Optional[ConversationSession]:
+        """根据快照中的一项创建会话，已过期时返回 None，格式错误时抛出 KeyError / TypeError / ValueError"""
+        updated_at = float(item["updated_at"])
+        if now - updated_at >= self.ttl:
+            return None
+        openid = item["openid"]
+        if not isinstance(openid, str) or not openid:
+            raise ValueError("openid 无效")
+        session = ConversationSession(openid, self.history_size)
+        session.ticket_id = item.get("ticket_id")
+        session.agent_id = item.get("agent_id")
+        session.messages.extend(tuple(message) for message in item.get("messages") or [])
+        session.updated_at = updated_at
+        return session
+
+    async def restore(self):
+        """从磁盘快照恢复未过期的会话，最多恢复 max_sessions 个最近活跃的会话，跳过格式错误的项"""
+        data = await asyncio.to_thread(self._read_snapshot)
+        now = time.time()
+        latest: Dict[str, ConversationSession] = {}
+        skipped = 0
+        for item in data:
+            try:
+                session = self._restore_session(item, now)
+            except (KeyError, TypeError, ValueError):
+                skipped += 1
+                continue
+            if session is None:
+                continue
+            existing = latest.get(session.openid)
+            if existing is None or existing.updated_at < session.updated_at:
+                latest[session.openid] = session
+
+        sessions = sorted(latest.values(), key=lambda x: x.updated_at)[-self.max_sessions:]
+        for session in sessions:
+            remaining = self.ttl - (now - session.updated_at)
+            self._sessions[session.openid] = session
+            self._schedule(session, max(int(math.ceil(remaining / self.tick)), 1) + 1)
+        if skipped:
+            logger.warning(f"会话快照中有 {skipped} 项格式错误，已跳过")
+        logger.info(f"已从快照恢复 {len(sessions)} 个会话")
+
+    async def start(self):
+        if self._tasks:
+            return
+        await self.restore()
+        self._tasks = [
+            asyncio.create_task(self._tick_loop()),
+            asyncio.create_task(self._snapshot_loop())
+        ]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        try:
+            await self.snapshot()
+        except OSError as e:
+            logger.error(f"保存会话快照失败: {str(e)}")
+
+    async def _tick_loop(self):
+        next_tick = time.monotonic()
+        while True:
+            next_tick += self.tick
+            await asyncio.sleep(max(next_tick - time.monotonic(), 0))
+            self._advance()
+
+    async def _snapshot_loop(self):
+        while True:
+            await asyncio.sleep(self.snapshot_interval)
+            try:
+                await self.snapshot()
+            except OSError as e:
+                logger.error(f"保存会话快照失败: {str(e)}")
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "sessions": len(self._sessions),
+            "expired": self.expired,
+            "evicted": self.evicted
+        }
+
+
+session_store = SessionStore(
+    ttl=settings.SESSION_TTL,
+    max_sessions=settings.SESSION_MAX_COUNT,
+    tick=settings.SESSION_TICK,
+    history_size=settings.SESSION_HISTORY_SIZE,
+    snapshot_file=settings.SESSION_SNAPSHOT_FILE,
+    snapshot_interval=settings.SESSION_SNAPSHOT_INTERVAL
+)
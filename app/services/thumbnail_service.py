@@ -0,0 +1,140 @@
+# 图片附件缩略图服务
+
+import os
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Optional
+
+from app.config import settings
+from app.logger import get_logger
+from app.models.ticket import Attachment, AttachmentType
+from app.services.attachment_storage import absolute_path
+
+try:
+    from app.utils.thumbnail import render_thumbnail
+except ImportError:  # Pillow 在 requirements.txt 中；未安装时不生成缩略图，下载接口返回原图
+    render_thumbnail = None
+
+logger = get_logger('thumbnail_service')
+
+if render_thumbnail is None:
+    logger.warning("未安装 Pillow，不生成缩略图，下载接口返回原图")
+
+
+class ThumbnailService:
+    """
+    图片附件缩略图
+
+    - 解码和缩放是 CPU 密集操作，放到进程池中执行，不占用事件循环和 GIL
+    - 缩略图保存在原文件旁（<原文件>.<尺寸>.jpg），附件按内容寻址，同一图片只生成一次
+    - 首次请求时才生成；同一图片同一尺寸的并发请求共用一次生成（single-flight）
+    """
+
+    def __init__(self, sizes: Dict[str, int], workers: int, quality: int):
+        self.sizes = sizes
+        self.workers = workers
+        self.quality = quality
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.generated = 0
+        self.cache_hits = 0
+        self.coalesced = 0
+        self.failed = 0
+
+    @property
+    def available(self) -> bool:
+        return render_thumbnail is not None
+
+    def supports(self, attachment: Attachment) -> bool:
+        return attachment.file_type == AttachmentType.IMAGE.value
+
+    @staticmethod
+    def thumbnail_file(file_path: str, size: str) -> str:
+        """缩略图相对存储目录的路径"""
+        return f"{file_path}.{size}.jpg"
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn 启动的子进程不继承事件循环、数据库连接等父进程状态
+            self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context("spawn"))
+        return self._executor
+
+    async def get_thumbnail(self, attachment: Attachment, size: str) -> str:
+        """
+        获取附件指定尺寸的缩略图路径，不存在时生成
+
+        Args:
+            attachment: 图片附件
+            size: THUMBNAIL_SIZES 中的尺寸名称
+
+        Returns:
+            str: 缩略图文件的绝对路径，生成失败时抛出异常
+        """
+        path = absolute_path(self.thumbnail_file(attachment.file_path, size))
+        if await asyncio.to_thread(os.path.isfile, path):
+            self.cache_hits += 1
+            return path
+
+        future = self._inflight.get(path)
+        if future is not None:
+            self.coalesced += 1
+        else:
+            future = asyncio.ensure_future(self._generate(absolute_path(attachment.file_path), path, size))
+            self._inflight[path] = future
+            future.add_done_callback(lambda f: self._finish(path, f))
+        # 请求方断开时不取消生成，结果留给其他请求和下次访问
+        return await asyncio.shield(future)
+
+    def _finish(self, path: str, future: asyncio.Future):
+        self._inflight.pop(path, None)
+        if not future.cancelled():
+            future.exception()  # 所有请求都已断开时避免 "exception was never retrieved" 警告
+
+    async def _generate(self, src: str, dst: str, size: str) -> str:
+        loop = asyncio.get_running_loop()
+        try:
+            try:
+                nbytes = await loop.run_in_executor(self._get_executor(), render_thumbnail,
+                                                    src, dst, self.sizes[size], self.quality)
+            except BrokenProcessPool:
+                # 子进程异常退出（如内存不足被杀）后进程池不可用，重建后重试一次
+                logger.warning("缩略图进程池已损坏，重建后重试")
+                broken, self._executor = self._executor, None
+                if broken is not None:
+                    # 不等待：损坏的进程池不会再执行任务，只需回收其管理线程和剩余子进程
+                    broken.shutdown(wait=False, cancel_futures=True)
+                nbytes = await loop.run_in_executor(self._get_executor(), render_thumbnail,
+                                                    src, dst, self.sizes[size], self.quality)
+        except Exception as e:
+            self.failed += 1
+            logger.error(f"生成缩略图失败 {src}（{size}）: {type(e).__name__}: {str(e)}")
+            raise
+        self.generated += 1
+        logger.info(f"已生成缩略图 {dst}，大小 {nbytes} 字节")
+        return dst
+
+    async def stop(self):
+        if self._executor is not None:
+            executor, self._executor = self._executor, None
+            await asyncio.to_thread(executor.shutdown, True, cancel_futures=True)
+
+    def stats(self) -> dict:
+        return {
+            "available": self.available,
+            "sizes": dict(self.sizes),
+            "generated": self.generated,
+            "cache_hits": self.cache_hits,
+            "coalesced": self.coalesced,
+            "failed": self.failed,
+            "inflight": len(self._inflight)
+        }
+
+
+thumbnail_service = ThumbnailService(
+    sizes=settings.THUMBNAIL_SIZES,
+    workers=settings.THUMBNAIL_WORKERS,
+    quality=settings.THUMBNAIL_QUALITY
+)
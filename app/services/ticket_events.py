@@ -0,0 +1,311 @@
+# 问题单变更推送服务
+
+import os
+import time
+import uuid
+import asyncio
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set, Type
+
+import orjson
+
+from app.config import settings
+from app.logger import get_logger
+from app.utils.response import dumps
+
+logger = get_logger('ticket_events')
+
+# 跨 worker 通道收到消息时的回调，参数为序列化后的事件
+MessageCallback = Callable[[bytes], Awaitable[None]]
+
+
+class Subscriber:
+    """
+    一个订阅者（一条 SSE / WebSocket 连接）
+
+    ticket_ids 为 None 表示订阅所有问题单。队列满说明客户端消费太慢，广播器会断开该订阅者，
+    避免积压的事件占用内存或拖慢其他订阅者。
+    """
+
+    __slots__ = ("ticket_ids", "queue", "closed", "close_reason")
+
+    def __init__(self, ticket_ids: Optional[Set[int]], queue_size: int):
+        self.ticket_ids = ticket_ids
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.closed = asyncio.Event()
+        self.close_reason: Optional[str] = None
+
+    def close(self, reason: str):
+        if self.close_reason is None:
+            self.close_reason = reason
+            self.closed.set()
+
+    async def get(self, timeout: float) -> Optional[bytes]:
+        """取下一条事件，超时返回 None（用于发送心跳）；订阅者被关闭时抛出 ConnectionError"""
+        if not self.queue.empty():
+            return self.queue.get_nowait()
+        if self.closed.is_set():
+            raise ConnectionError(self.close_reason)
+        get_task = asyncio.ensure_future(self.queue.get())
+        closed_task = asyncio.ensure_future(self.closed.wait())
+        try:
+            await asyncio.wait({get_task, closed_task}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            closed_task.cancel()
+            if not get_task.done():
+                get_task.cancel()
+        if get_task.done() and not get_task.cancelled():
+            return get_task.result()
+        if self.closed.is_set():
+            raise ConnectionError(self.close_reason)
+        return None
+
+
+class BroadcastChannel:
+    """
+    跨 worker 广播通道接口
+
+    publish() 把事件发给其他 worker；start() 之后，其他 worker 发布的事件通过回调交给本进程。
+    """
+
+    async def start(self, callback: MessageCallback):
+        pass
+
+    async def publish(self, message: bytes):
+        pass
+
+    async def stop(self):
+        pass
+
+
+# 已注册的广播通道，通过 TICKET_EVENTS_CHANNEL 配置选择
+CHANNELS: Dict[str, Type[BroadcastChannel]] = {}
+
+
+def register_channel(name: str):
+    """注册广播通道的装饰器"""
+    def decorator(cls: Type[BroadcastChannel]) -> Type[BroadcastChannel]:
+        CHANNELS[name] = cls
+        return cls
+    return decorator
+
+
+@register_channel("local")
+class LocalChannel(BroadcastChannel):
+    """只在本进程内广播（单 worker 部署）"""
+
+
+# 广播通道断开后重新订阅的等待时间（秒），每次失败翻倍
+RECONNECT_MIN_DELAY = 0.5
+RECONNECT_MAX_DELAY = 30.0
+
+
+@register_channel("redis")
+class RedisChannel(BroadcastChannel):
+    """通过 Redis Pub/Sub 在多个 worker 之间广播，需要安装 redis"""
+
+    def __init__(self):
+        try:
+            import redis.asyncio as aioredis
+        except ImportError:
+            raise RuntimeError("使用 redis 广播通道需要先安装 redis：pip install redis")
+        self._redis = aioredis.from_url(settings.TICKET_EVENTS_REDIS_URL)
+        self._channel = settings.TICKET_EVENTS_REDIS_CHANNEL
+        self._listener: Optional[asyncio.Task] = None
+
+    async def start(self, callback: MessageCallback):
+        # 启动时订阅失败直接抛出，由启动流程报错
+        pubsub = await self._subscribe()
+        self._listener = asyncio.create_task(self._listen(pubsub, callback))
+
+    async def _subscribe(self):
+        pubsub = self._redis.pubsub()
+        try:
+            await pubsub.subscribe(self._channel)
+        except BaseException:
+            await pubsub.aclose()
+            raise
+        return pubsub
+
+    async def _listen(self, pubsub, callback: MessageCallback):
+        """
+        接收其他 worker 发布的事件
+
+        单条消息处理失败只记录日志；连接断开时按指数退避重新订阅，断开期间其他 worker 的事件会丢失。
+        """
+        delay = RECONNECT_MIN_DELAY
+        try:
+            while True:
+                try:
+                    if pubsub is None:
+                        pubsub = await self._subscribe()
+                        logger.info("已重新订阅问题单变更广播通道")
+                    async for item in pubsub.listen():
+                        delay = RECONNECT_MIN_DELAY
+                        if item.get("type") != "message":
+                            continue
+                        try:
+                            await callback(item["data"])
+                        except Exception as e:
+                            logger.error(f"处理广播通道消息失败: {str(e)}", exc_info=True)
+                    raise ConnectionError("订阅已结束")
+                except Exception as e:
+                    logger.error(f"问题单变更广播通道连接断开，{delay:.1f}s 后重新订阅: {str(e)}")
+                if pubsub is not None:
+                    await self._close_pubsub(pubsub)
+                    pubsub = None
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, RECONNECT_MAX_DELAY)
+        finally:
+            if pubsub is not None:
+                await self._close_pubsub(pubsub)
+
+    @staticmethod
+    async def _close_pubsub(pubsub):
+        try:
+            await pubsub.aclose()
+        except Exception:
+            pass
+
+    async def publish(self, message: bytes):
+        await self._redis.publish(self._channel, message)
+
+    async def stop(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            await asyncio.gather(self._listener, return_exceptions=True)
+            self._listener = None
+        await self._redis.aclose()
+
+
+class TicketBroadcaster:
+    """
+    问题单变更广播器
+
+    - 每个事件只序列化一次，按问题单ID索引订阅者，只投递给相关的订阅者
+    - 每个订阅者一个有界队列，队列满时断开该订阅者（慢消费者）
+    - 事件同时发布到跨 worker 通道，其他 worker 收到后投递给各自的订阅者
+    """
+
+    def __init__(self, channel: BroadcastChannel, queue_size: int):
+        self.channel = channel
+        self.queue_size = queue_size
+        self.origin = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"  # 区分本进程发布的事件
+        self._all: Set[Subscriber] = set()
+        self._by_ticket: Dict[int, Set[Subscriber]] = {}
+        self.published = 0
+        self.delivered = 0
+        self.dropped_slow = 0
+
+    def subscribe(self, ticket_ids: Optional[Iterable[int]] = None) -> Subscriber:
+        """订阅问题单变更，ticket_ids 为空表示订阅所有问题单"""
+        ids = set(ticket_ids) if ticket_ids else None
+        subscriber = Subscriber(ids, self.queue_size)
+        if ids is None:
+            self._all.add(subscriber)
+        else:
+            for ticket_id in ids:
+                self._by_ticket.setdefault(ticket_id, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        if subscriber.ticket_ids is None:
+            self._all.discard(subscriber)
+            return
+        for ticket_id in subscriber.ticket_ids:
+            subscribers = self._by_ticket.get(ticket_id)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._by_ticket[ticket_id]
+
+    async def publish(self, event_type: str, ticket_id: int, ticket=None):
+        """
+        发布问题单变更事件，应在事务提交之后调用
+
+        Args:
+            event_type: created / updated / deleted
+            ticket_id: 问题单ID
+            ticket: 变更后的问题单对象，删除时为 None
+        """
+        self.published += 1
+        event = {"type": event_type, "ticket_id": ticket_id, "ticket": ticket, "ts": time.time()}
+        message = dumps(event)
+        self._deliver((ticket_id,), message)
+        try:
+            await self.channel.publish(dumps({"origin": self.origin, "ticket_id": ticket_id,
+                                              "event": orjson.Fragment(message)}))
+        except Exception as e:
+            logger.error(f"发布问题单变更事件到广播通道失败: {str(e)}")
+
+    async def publish_many(self, event_type: str, ticket_ids: List[int]):
+        """
+        发布批量变更事件，应在事务提交之后调用
+
+        一批问题单只发一条事件（ticket_ids 为全部ID，不带问题单内容），每个订阅者最多收到一次，
+        避免批量操作瞬间塞满订阅者队列。客户端按 ID 重新获取即可。
+        """
+        self.published += 1
+        event = {"type": event_type, "ticket_ids": ticket_ids, "ticket": None, "ts": time.time()}
+        message = dumps(event)
+        self._deliver(ticket_ids, message)
+        try:
+            await self.channel.publish(dumps({"origin": self.origin, "ticket_ids": ticket_ids,
+                                              "event": orjson.Fragment(message)}))
+        except Exception as e:
+            logger.error(f"发布问题单变更事件到广播通道失败: {str(e)}")
+
+    async def _on_channel_message(self, data: bytes):
+        envelope = orjson.loads(data)
+        if envelope.get("origin") == self.origin:
+            return
+        ticket_ids = envelope.get("ticket_ids") or (envelope["ticket_id"],)
+        self._deliver(ticket_ids, orjson.dumps(envelope["event"]))
+
+    def _deliver(self, ticket_ids: Iterable[int], message: bytes):
+        subscribers = set(self._all)
+        for ticket_id in ticket_ids:
+            subscribers.update(self._by_ticket.get(ticket_id, ()))
+        for subscriber in subscribers:
+            if subscriber.close_reason is not None:
+                continue
+            try:
+                subscriber.queue.put_nowait(message)
+                self.delivered += 1
+            except asyncio.QueueFull:
+                self.dropped_slow += 1
+                logger.warning("问题单变更订阅者消费过慢，断开连接")
+                subscriber.close("消费过慢，连接已断开，请重新订阅")
+                self.unsubscribe(subscriber)
+
+    async def start(self):
+        await self.channel.start(self._on_channel_message)
+
+    async def stop(self):
+        # 关闭所有订阅，让 SSE / WebSocket 连接结束
+        for subscriber in (*self._all, *(s for subs in self._by_ticket.values() for s in subs)):
+            subscriber.close("服务正在关闭")
+        self._all.clear()
+        self._by_ticket.clear()
+        await self.channel.stop()
+
+    def stats(self) -> dict:
+        return {
+            "subscribers_all": len(self._all),
+            "subscribers_by_ticket": len({s for subs in self._by_ticket.values() for s in subs}),
+            "watched_tickets": len(self._by_ticket),
+            "published": self.published,
+            "delivered": self.delivered,
+            "dropped_slow": self.dropped_slow
+        }
+
+
+def create_channel(name: str) -> BroadcastChannel:
+    if name not in CHANNELS:
+        raise ValueError(f"未知的广播通道: {name}")
+    return CHANNELS[name]()
+
+
+ticket_broadcaster = TicketBroadcaster(
+    channel=create_channel(settings.TICKET_EVENTS_CHANNEL),
+    queue_size=settings.TICKET_EVENTS_QUEUE_SIZE
+)
@@ -1,27 +1,39 @@
-from sqlalchemy import select
+import base64
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Sequence, Tuple
+
+import orjson
+from sqlalchemy import and_, delete, func, insert, or_, select, true, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import HTTPException, status
 
-from app.models.ticket import Ticket
-from app.schemas.ticket_schema import TicketCreate, TicketUpdate
+from app.config import settings
+from app.models.ticket import Attachment, Ticket, TicketAttachmentLink, TicketHistory, TicketTombstone
+from app.models.wechat import WechatTicketBinding, WechatTicketCode
+from app.schemas.ticket_schema import TicketBulkFilter, TicketCreate, TicketUpdate
+from app.services.attachment_service import schedule_blob_gc
+from app.services.ticket_events import ticket_broadcaster
+from app.utils.batch import in_request_order, unique_batch_ids
 
 
-async def create_ticket_service(session: AsyncSession, ticket_data: TicketCreate):
+async def create_ticket_service(session: AsyncSession, ticket_data: TicketCreate, user_id: int):
     """
     创建新的问题单
     
     Args:
         session: 数据库会话
         ticket_data: 问题单数据
+        user_id: 创建用户ID
         
     Returns:
         Ticket: 创建成功的问题单对象
     """
     try:
-        new_ticket = Ticket(**ticket_data.model_dump())
+        new_ticket = Ticket(**ticket_data.model_dump(), user_id=user_id)
         session.add(new_ticket)
         await session.commit()
         await session.refresh(new_ticket)
+        await ticket_broadcaster.publish("created", new_ticket.id, new_ticket)
         return new_ticket
     except Exception as e:
         print(e," ----------------")
@@ -52,6 +64,22 @@ async def get_tickets_service(session: AsyncSession):
         )
 
 
+async def get_tickets_version_service(session: AsyncSession) -> Tuple[int, Optional[int], Optional[datetime]]:
+    """
+    获取问题单列表的版本信息：数量、最大ID、最后修改时间
+
+    只做聚合查询，不加载行，用于列表的 ETag。任何新增、修改、删除都会改变其中至少一项。
+    """
+    try:
+        result = await session.execute(select(func.count(), func.max(Ticket.id), func.max(Ticket.updated_at)))
+        return tuple(result.one())
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"获取工单列表失败: {str(e)}"
+        )
+
+
 async def get_ticket_service(session: AsyncSession, ticket_id: int):
     """
     根据ID获取问题单
@@ -72,27 +100,62 @@ async def get_ticket_service(session: AsyncSession, ticket_id: int):
         )
 
 
-async def update_ticket_service(session: AsyncSession, ticket_id: int, ticket_data: TicketUpdate):
+async def get_tickets_by_ids_service(session: AsyncSession, ids: Sequence[int]) -> List[Optional[Ticket]]:
     """
-    更新问题单信息
-    
+    按ID批量获取问题单，一条 WHERE id IN (...) 查询
+
+    Args:
+        session: 数据库会话
+        ids: 问题单ID列表
+
+    Returns:
+        List[Optional[Ticket]]: 与 ids 顺序一致，不存在的问题单为 None
+    """
+    unique_ids = unique_batch_ids(ids)
+    try:
+        result = await session.execute(select(Ticket).where(Ticket.id.in_(unique_ids)))
+        return in_request_order(ids, result.scalars().all())
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"批量获取工单失败: {str(e)}"
+        )
+
+
+async def update_ticket_service(session: AsyncSession, ticket_id: int, ticket_data: TicketUpdate,
+                                expected_version: int):
+    """
+    更新问题单信息（乐观锁）
+
+    一条 UPDATE ... WHERE id = ? AND version = ? 完成校验和更新，数据库支持 RETURNING 时同时取回更新后的行，
+    不需要先查询再提交再刷新；版本号不符说明问题单已被他人修改，抛出 412。
+
     Args:
         session: 数据库会话
         ticket_id: 问题单ID
         ticket_data: 更新的问题单数据
-        
+        expected_version: 客户端修改前读取到的版本号（If-Match）
+
     Returns:
         Optional[Ticket]: 更新后的问题单对象，如果不存在则返回None
     """
+    values = ticket_data.model_dump(exclude_unset=True)
+    statement = (
+        update(Ticket)
+        .where(Ticket.id == ticket_id, Ticket.version == expected_version)
+        .values(**values, version=Ticket.version + 1, updated_at=datetime.now(timezone.utc))
+    )
     try:
-        ticket = await session.get(Ticket, ticket_id)
-        if not ticket:
-            return None
-        for field, value in ticket_data.model_dump(exclude_unset=True).items():
-            setattr(ticket, field, value)
-        await session.commit()
-        await session.refresh(ticket)
-        return ticket
+        if session.bind.dialect.update_returning:
+            ticket = (await session.execute(
+                statement.returning(Ticket).execution_options(populate_existing=True)
+            )).scalars().first()
+        else:
+            # MySQL 不支持 UPDATE ... RETURNING，更新成功后按主键取回
+            result = await session.execute(statement.execution_options(synchronize_session=False))
+            ticket = await session.get(Ticket, ticket_id, populate_existing=True) if result.rowcount == 1 else None
+        if ticket is not None:
+            await session.commit()
     except Exception as e:
         await session.rollback()
         raise HTTPException(
@@ -100,6 +163,23 @@ async def update_ticket_service(session: AsyncSession, ticket_id: int, ticket_da
             detail=f"更新工单失败: {str(e)}"
         )
 
+    if ticket is None:
+        current_version = (await session.execute(
+            select(Ticket.version).where(Ticket.id == ticket_id)
+        )).scalar_one_or_none()
+        await session.rollback()
+        if current_version is None:
+            return None
+        raise HTTPException(
+            status_code=status.HTTP_412_PRECONDITION_FAILED,
+            detail={
+                "message": "问题单已被他人修改",
+                "errors": [f"当前版本为 {current_version}，请重新获取后再修改"]
+            }
+        )
+    await ticket_broadcaster.publish("updated", ticket.id, ticket)
+    return ticket
+
 
 async def delete_ticket_service(session: AsyncSession, ticket_id: int):
     """
@@ -113,11 +193,11 @@ async def delete_ticket_service(session: AsyncSession, ticket_id: int):
         bool: 删除成功返回True，如果问题单不存在则返回None
     """
     try:
-        ticket = await session.get(Ticket, ticket_id)
-        if not ticket:
+        if not await _delete_ticket_rows(session, [ticket_id]):
+            await session.rollback()
             return None
-        await session.delete(ticket)
         await session.commit()
+        await ticket_broadcaster.publish("deleted", ticket_id)
         return True
     except Exception as e:
         await session.rollback()
@@ -125,3 +205,279 @@ async def delete_ticket_service(session: AsyncSession, ticket_id: int):
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"删除工单失败: {str(e)}"
         )
+
+
+def _naive_utc(value: datetime) -> datetime:
+    # 数据库中的时间均为不带时区的 UTC 时间
+    return value.astimezone(timezone.utc).replace(tzinfo=None) if value.tzinfo else value
+
+
+def _bulk_conditions(ticket_filter: TicketBulkFilter) -> list:
+    """把批量操作的筛选条件转换为 WHERE 条件，没有任何条件时抛出 400，避免误操作整张表"""
+    conditions = []
+    if ticket_filter.ids is not None:
+        conditions.append(Ticket.id.in_(ticket_filter.ids))
+    if ticket_filter.user_id is not None:
+        conditions.append(Ticket.user_id == ticket_filter.user_id)
+    if ticket_filter.device_model is not None:
+        conditions.append(Ticket.device_model == ticket_filter.device_model)
+    if ticket_filter.customer is not None:
+        conditions.append(Ticket.customer == ticket_filter.customer)
+    if ticket_filter.created_before is not None:
+        conditions.append(Ticket.create_at < _naive_utc(ticket_filter.created_before))
+    if ticket_filter.updated_before is not None:
+        conditions.append(Ticket.updated_at < _naive_utc(ticket_filter.updated_before))
+    if not conditions:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={"message": "参数错误", "errors": ["至少需要指定一个筛选条件"]}
+        )
+    return conditions
+
+
+async def _count_matching(session: AsyncSession, conditions: list) -> int:
+    return (await session.execute(select(func.count()).select_from(Ticket).where(*conditions))).scalar_one()
+
+
+async def _next_chunk(session: AsyncSession, conditions: list, last_id: int, chunk_size: int) -> List[int]:
+    """按ID顺序取下一批匹配的问题单ID并加行锁，按ID前进，已处理的行不会被重复处理"""
+    result = await session.execute(
+        select(Ticket.id)
+        .where(*conditions, Ticket.id > last_id)
+        .order_by(Ticket.id)
+        .limit(chunk_size)
+        .with_for_update()
+    )
+    return list(result.scalars().all())
+
+
+async def bulk_update_tickets_service(session: AsyncSession, ticket_filter: TicketBulkFilter,
+                                      ticket_data: TicketUpdate, dry_run: bool = False) -> dict:
+    """
+    按条件批量更新问题单
+
+    每批 TICKET_BULK_CHUNK_SIZE 行，用一条 UPDATE ... WHERE id IN (...) 更新并单独提交，
+    避免一个大事务长时间锁表。每批推送一条 updated 事件（只含问题单ID）。
+
+    Args:
+        session: 数据库会话
+        ticket_filter: 筛选条件
+        ticket_data: 要更新的字段
+        dry_run: 只统计匹配的问题单数
+
+    Returns:
+        dict: matched、affected、dry_run
+    """
+    conditions = _bulk_conditions(ticket_filter)
+    values = ticket_data.model_dump(exclude_unset=True)
+    if not values:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={"message": "参数错误", "errors": ["没有要更新的字段"]}
+        )
+    try:
+        matched = await _count_matching(session, conditions)
+        if dry_run:
+            return {"matched": matched, "affected": 0, "dry_run": True}
+
+        affected, last_id = 0, 0
+        while True:
+            ids = await _next_chunk(session, conditions, last_id, settings.TICKET_BULK_CHUNK_SIZE)
+            if not ids:
+                break
+            result = await session.execute(
+                update(Ticket)
+                .where(Ticket.id.in_(ids))
+                .values(**values, version=Ticket.version + 1, updated_at=datetime.now(timezone.utc))
+                .execution_options(synchronize_session=False)
+            )
+            await session.commit()
+            affected += result.rowcount
+            last_id = ids[-1]
+            await ticket_broadcaster.publish_many("updated", ids)
+        return {"matched": matched, "affected": affected, "dry_run": False}
+    except Exception as e:
+        await session.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"批量更新工单失败: {str(e)}"
+        )
+
+
+async def _delete_ticket_rows(session: AsyncSession, ids: List[int]) -> int:
+    """
+    删除问题单及其附件关联、修改记录、附件记录、微信绑定，并写入删除记录（不提交事务）
+
+    全部是按 ticket_id 的集合操作。附件文件按内容寻址、可能被其他问题单共用，不在这里删除：
+    同一事务中新建清理任务，提交后由后台任务删除不再被引用的文件及其缩略图。
+
+    Returns:
+        int: 实际删除的问题单数
+    """
+    content_hashes = (await session.execute(
+        select(Attachment.content_hash).where(Attachment.ticket_id.in_(ids)).distinct()
+    )).scalars().all()
+    attachment_ids = select(Attachment.id).where(Attachment.ticket_id.in_(ids))
+    await session.execute(
+        delete(TicketAttachmentLink)
+        .where(or_(TicketAttachmentLink.ticket_id.in_(ids), TicketAttachmentLink.attachment_id.in_(attachment_ids)))
+        .execution_options(synchronize_session=False)
+    )
+    await session.execute(
+        delete(TicketHistory).where(TicketHistory.ticket_id.in_(ids)).execution_options(synchronize_session=False)
+    )
+    await session.execute(
+        delete(Attachment).where(Attachment.ticket_id.in_(ids)).execution_options(synchronize_session=False)
+    )
+    for model in (WechatTicketCode, WechatTicketBinding):
+        await session.execute(
+            delete(model).where(model.ticket_id.in_(ids)).execution_options(synchronize_session=False)
+        )
+    result = await session.execute(
+        delete(Ticket).where(Ticket.id.in_(ids)).execution_options(synchronize_session=False)
+    )
+    if result.rowcount:
+        deleted_at = datetime.now(timezone.utc)
+        await session.execute(insert(TicketTombstone),
+                              [{"ticket_id": ticket_id, "deleted_at": deleted_at} for ticket_id in ids])
+    await schedule_blob_gc(content_hashes, session=session)
+    return result.rowcount
+
+
+async def bulk_delete_tickets_service(session: AsyncSession, ticket_filter: TicketBulkFilter,
+                                      dry_run: bool = False) -> dict:
+    """
+    按条件批量删除问题单
+
+    每批 TICKET_BULK_CHUNK_SIZE 行在一个事务中依次删除附件关联、修改记录、附件记录和问题单，
+    并批量写入删除记录供增量同步使用，每批推送一条 deleted 事件。
+
+    Args:
+        session: 数据库会话
+        ticket_filter: 筛选条件
+        dry_run: 只统计匹配的问题单数
+
+    Returns:
+        dict: matched、affected、dry_run
+    """
+    conditions = _bulk_conditions(ticket_filter)
+    try:
+        matched = await _count_matching(session, conditions)
+        if dry_run:
+            return {"matched": matched, "affected": 0, "dry_run": True}
+
+        affected, last_id = 0, 0
+        while True:
+            ids = await _next_chunk(session, conditions, last_id, settings.TICKET_BULK_CHUNK_SIZE)
+            if not ids:
+                break
+            affected += await _delete_ticket_rows(session, ids)
+            await session.commit()
+            last_id = ids[-1]
+            await ticket_broadcaster.publish_many("deleted", ids)
+        return {"matched": matched, "affected": affected, "dry_run": False}
+    except Exception as e:
+        await session.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"批量删除工单失败: {str(e)}"
+        )
+
+
+# 同步位置：(变更时间, 行ID)，按此顺序读取，时间相同的行不会遗漏或重复
+Position = Tuple[datetime, int]
+
+
+def _encode_cursor(ticket_position: Optional[Position], tombstone_position: Position) -> str:
+    data = {
+        "t": [ticket_position[0].isoformat(), ticket_position[1]] if ticket_position else None,
+        "d": [tombstone_position[0].isoformat(), tombstone_position[1]]
+    }
+    return base64.urlsafe_b64encode(orjson.dumps(data)).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> Tuple[Optional[Position], Position]:
+    """解析同步游标，格式错误时抛出 ValueError"""
+    try:
+        data = orjson.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        ticket_position = (datetime.fromisoformat(data["t"][0]), int(data["t"][1])) if data["t"] else None
+        tombstone_position = (datetime.fromisoformat(data["d"][0]), int(data["d"][1]))
+    except (ValueError, TypeError, KeyError, IndexError, orjson.JSONDecodeError):
+        raise ValueError("无效的同步游标")
+    return ticket_position, tombstone_position
+
+
+def _after(time_column, id_column, position: Optional[Position]):
+    """(time_column, id_column) 大于 position 的条件，可以利用 (时间, id) 联合索引"""
+    if position is None:
+        return true()
+    changed_at, row_id = position
+    return or_(time_column > changed_at, and_(time_column == changed_at, id_column > row_id))
+
+
+def _next_position(rows, time_attr: str, position: Optional[Position], horizon: datetime, page_full: bool):
+    """
+    计算下次同步的起始位置
+
+    最近 TICKET_SYNC_SAFETY_WINDOW 秒内的变更本次照常返回，但游标不越过它们，下次同步时重复返回，
+    避免同一时刻开始、稍晚提交的事务被跳过。本页已满时直接越过，保证分页能前进。
+    """
+    for row in reversed(rows):
+        changed_at = getattr(row, time_attr).replace(tzinfo=None)
+        if page_full or changed_at <= horizon:
+            return changed_at, row.id
+    return position
+
+
+async def get_ticket_changes_service(session: AsyncSession, since: Optional[str], limit: int):
+    """
+    获取游标之后新建、修改和删除的问题单
+
+    Args:
+        session: 数据库会话
+        since: 上次同步返回的游标，为空时返回全部问题单（首次同步）
+        limit: 最多返回的问题单数和删除记录数
+
+    Returns:
+        dict: changed、deleted、cursor、has_more
+    """
+    # 数据库中的时间均为不带时区的 UTC 时间
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    horizon = now - timedelta(seconds=settings.TICKET_SYNC_SAFETY_WINDOW)
+    if since:
+        ticket_position, tombstone_position = _decode_cursor(since)
+    else:
+        # 首次同步不需要之前的删除记录
+        ticket_position, tombstone_position = None, (horizon, 0)
+
+    try:
+        tickets = (await session.execute(
+            select(Ticket)
+            .where(_after(Ticket.updated_at, Ticket.id, ticket_position))
+            .order_by(Ticket.updated_at, Ticket.id)
+            .limit(limit + 1)
+        )).scalars().all()
+        tombstones = (await session.execute(
+            select(TicketTombstone)
+            .where(_after(TicketTombstone.deleted_at, TicketTombstone.id, tombstone_position))
+            .order_by(TicketTombstone.deleted_at, TicketTombstone.id)
+            .limit(limit + 1)
+        )).scalars().all()
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"获取问题单变更失败: {str(e)}"
+        )
+
+    tickets_full, tombstones_full = len(tickets) > limit, len(tombstones) > limit
+    tickets, tombstones = tickets[:limit], tombstones[:limit]
+    cursor = _encode_cursor(
+        _next_position(tickets, "updated_at", ticket_position, horizon, tickets_full),
+        _next_position(tombstones, "deleted_at", tombstone_position, horizon, tombstones_full)
+    )
+    return {
+        "changed": tickets,
+        "deleted": [tombstone.ticket_id for tombstone in tombstones],
+        "cursor": cursor,
+        "has_more": tickets_full or tombstones_full
+    }
@@ -1,14 +1,15 @@
-from sqlalchemy import select
+from sqlalchemy import func, select
 from passlib.context import CryptContext
-from datetime import timedelta
+from datetime import datetime, timedelta, timezone
 
 from app.db_services.database import AsyncSessionDep
 from app.models.user import User
 from app.schemas.user_schema import UserCreate, UserUpdate, UserLogin
 from app.utils.jwt import create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES
+from app.utils.batch import in_request_order, unique_batch_ids
 from fastapi import HTTPException
 import re
-from typing import Tuple
+from typing import List, Optional, Sequence, Tuple
 
 # 密码加密上下文
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -168,6 +169,14 @@ async def get_users_service(session: AsyncSessionDep):
     result = await session.execute(select(User))
     return result.scalars().all()
 
+# 获取用户列表版本信息
+async def get_users_version_service(session: AsyncSessionDep) -> Tuple[int, Optional[int], Optional[datetime]]:
+    """获取用户列表的数量、最大ID、最后修改时间（聚合查询，不加载行），用于列表的 ETag"""
+    result = await session.execute(
+        select(func.count(), func.max(User.id), func.max(func.coalesce(User.updated_at, User.created_at)))
+    )
+    return tuple(result.one())
+
 # 获取单个用户
 async def get_user_service(session: AsyncSessionDep, user_id: int):
     """根据 ID 获取用户"""
@@ -177,6 +186,13 @@ async def get_user_service(session: AsyncSessionDep, user_id: int):
         raise HTTPException(status_code=404, detail="用户不存在")
     return user
 
+# 批量获取用户
+async def get_users_by_ids_service(session: AsyncSessionDep, ids: Sequence[int]) -> List[Optional[User]]:
+    """按ID批量获取用户（一条 WHERE id IN (...) 查询），结果与 ids 顺序一致，不存在的用户为 None"""
+    unique_ids = unique_batch_ids(ids)
+    result = await session.execute(select(User).where(User.id.in_(unique_ids)))
+    return in_request_order(ids, result.scalars().all())
+
 # 更新用户
 async def update_user_service(session: AsyncSessionDep, user_id: int, user_data: UserUpdate):
     """更新用户信息"""
@@ -241,6 +257,7 @@ async def update_user_service(session: AsyncSessionDep, user_id: int, user_data:
             
         for field, value in update_data.items():
             setattr(user, field, value)
+        user.updated_at = datetime.now(timezone.utc)
             
         await session.commit()
         await session.refresh(user)
@@ -1,16 +1,743 @@
 # 微信处理服务
 
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
+import os
+import re
+import json
+import time
+import hmac
+import random
+import hashlib
+import asyncio
+import itertools
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from xml.etree import ElementTree
 
-class User(BaseModel):
-    name: str
-    age: int
+import httpx
+import orjson
 
-app = FastAPI()
+from app.config import settings
+from app.logger import get_logger
+from app.utils.file_lock import FileLock
+from app.services.session_store import session_store
+from app.services.keyword_rules import keyword_engine
+from app.services.job_service import job_handler
 
-@app.post("/register/")
-async def register_user(user: User):
-    # 如果数据通过验证，这里的`user`就是一个已验证且类型正确的`User`实例
-    # 你可以安全地使用`user.name`和`user.age`，它们已经被验证为`str`和`int`类型
-    return {"name": user.name, "age": user.age}
\ No newline at end of file
+logger = get_logger('wechat_service')
+
+# 消息处理函数：接收解析后的消息字典
+MessageHandler = Callable[[Dict[str, str]], Awaitable[None]]
+
+# access_token 失效相关的错误码，遇到时需要强制刷新
+TOKEN_INVALID_ERRCODES = {40001, 40014, 42001}
+
+# 可重试的临时错误码：-1 系统繁忙，45009 接口调用超过限制，45011 调用太频繁，45047 客服消息下行条数超过上限
+TRANSIENT_ERRCODES = {-1, 45009, 45011, 45047}
+
+# 选择问题单的文本指令：问题单编号加坐席提供的 6 位验证码，如 "问题单 123 482913"、"工单#123 482913"，
+# 之后发送的媒体文件保存为该问题单的附件
+SELECT_TICKET_PATTERN = re.compile(r"^\s*(?:问题单|工单)\s*#?\s*(\d+)(?:\s+(\d{6}))?\s*$")
+
+# 发送优先级，数值越小越先发送
+PRIORITY_REPLY = 0  # 回复客户
+PRIORITY_NOTIFY = 10  # 批量通知
+
+
+class WechatAPIError(Exception):
+    """微信接口返回的业务错误"""
+
+    def __init__(self, errcode: int, errmsg: str):
+        super().__init__(f"微信接口错误 {errcode}: {errmsg}")
+        self.errcode = errcode
+        self.errmsg = errmsg
+
+
+_http_client: Optional[httpx.AsyncClient] = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """获取调用微信接口共用的 HTTP 客户端"""
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(
+            base_url=settings.WECHAT_API_BASE,
+            timeout=10,
+            limits=httpx.Limits(
+                max_connections=settings.WECHAT_HTTP_POOL_SIZE,
+                max_keepalive_connections=settings.WECHAT_HTTP_POOL_SIZE,
+                keepalive_expiry=60
+            )
+        )
+    return _http_client
+
+
+async def close_http_client():
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+def check_signature(signature: str, timestamp: str, nonce: str, token: str = None) -> bool:
+    """
+    校验微信服务器签名
+
+    将 token、timestamp、nonce 按字典序排序后拼接做 sha1，与 signature 比较
+    """
+    token = settings.WECHAT_TOKEN if token is None else token
+    if not token or not signature:
+        return False
+    raw = "".join(sorted([token, timestamp or "", nonce or ""]))
+    return hmac.compare_digest(hashlib.sha1(raw.encode("utf-8")).hexdigest(), signature)
+
+
+def parse_message(body: bytes) -> Dict[str, str]:
+    """解析微信推送的 XML 消息为字典（只取第一层节点）"""
+    root = ElementTree.fromstring(body)
+    return {child.tag: child.text or "" for child in root}
+
+
+def message_key(message: Dict[str, str]) -> str:
+    """消息去重键：普通消息使用 MsgId，事件推送使用 FromUserName + CreateTime"""
+    msg_id = message.get("MsgId")
+    if msg_id:
+        return msg_id
+    return f"{message.get('FromUserName', '')}:{message.get('CreateTime', '')}:{message.get('Event', '')}"
+
+
+class TTLSet:
+    """
+    带过期时间和容量上限的集合
+
+    所有元素的过期时长相同，插入顺序即过期顺序，因此只需从头部淘汰；
+    超过容量上限时同样淘汰最早插入的元素，内存占用有上界。
+    只在本进程内有效，多 worker 部署时配合 RedisDedup 使用。
+    """
+
+    def __init__(self, ttl: float, max_size: int):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._items = OrderedDict()
+
+    def _evict(self, now: float):
+        while self._items:
+            key, expire_at = next(iter(self._items.items()))
+            if expire_at > now and len(self._items) <= self.max_size:
+                break
+            self._items.popitem(last=False)
+
+    def add(self, key: str) -> bool:
+        """添加元素，元素已存在（未过期）时返回 False"""
+        now = time.monotonic()
+        self._evict(now)
+        if key in self._items:
+            return False
+        self._items[key] = now + self.ttl
+        return True
+
+    def discard(self, key: str):
+        self._items.pop(key, None)
+
+    def __len__(self):
+        return len(self._items)
+
+
+class RedisDedup:
+    """通过 Redis SET NX 在多个 worker 之间去重，需要安装 redis"""
+
+    def __init__(self, url: str, ttl: float, prefix: str = "wechat:msg:"):
+        try:
+            import redis.asyncio as aioredis
+        except ImportError:
+            raise RuntimeError("使用 redis 消息去重需要先安装 redis：pip install redis")
+        self._redis = aioredis.from_url(url)
+        self.ttl = max(int(ttl), 1)
+        self.prefix = prefix
+
+    async def add(self, key: str) -> bool:
+        """添加元素，其他 worker 已添加过（未过期）时返回 False"""
+        return bool(await self._redis.set(self.prefix + key, 1, nx=True, ex=self.ttl))
+
+    async def close(self):
+        await self._redis.aclose()
+
+
+class WechatMessageDispatcher:
+    """
+    微信消息后台处理队列
+
+    回调接口只负责校验、解析、去重后入队并立即回复 success，
+    实际处理由后台 worker 协程完成，避免超过微信 5 秒的响应时限。
+
+    入队前用本进程的 TTLSet 去重；微信的重试可能落到其他 worker 上，
+    dedup_backend 为 redis 时 worker 处理前再通过 Redis 做一次跨进程去重。
+    """
+
+    def __init__(self, worker_count: int, queue_size: int, dedup_ttl: float, dedup_max_size: int,
+                 dedup_backend: str = "local", dedup_redis_url: str = ""):
+        self.worker_count = worker_count
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.dedup = TTLSet(dedup_ttl, dedup_max_size)
+        self.dedup_backend = dedup_backend
+        self.dedup_redis_url = dedup_redis_url
+        self.shared_dedup: Optional[RedisDedup] = None
+        self.handlers: List[MessageHandler] = []
+        self._workers: List[asyncio.Task] = []
+        self.received = 0
+        self.duplicated = 0
+        self.processed = 0
+        self.failed = 0
+
+    def register_handler(self, handler: MessageHandler) -> MessageHandler:
+        """注册消息处理函数，可作为装饰器使用"""
+        self.handlers.append(handler)
+        return handler
+
+    def submit(self, message: Dict[str, str]) -> bool:
+        """
+        提交消息到处理队列
+
+        Returns:
+            bool: 重复消息或成功入队返回 True；队列已满返回 False，由微信稍后重试
+        """
+        self.received += 1
+        key = message_key(message)
+        if not self.dedup.add(key):
+            self.duplicated += 1
+            logger.debug(f"忽略重复的微信消息: {key}")
+            return True
+        try:
+            self.queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            # 允许微信重试时重新入队
+            self.dedup.discard(key)
+            logger.warning(f"微信消息队列已满，暂不处理消息: {key}")
+            return False
+
+    async def start(self):
+        if self._workers:
+            return
+        if self.dedup_backend == "redis":
+            self.shared_dedup = RedisDedup(self.dedup_redis_url, self.dedup.ttl)
+        elif self.dedup_backend != "local":
+            raise ValueError(f"未知的微信消息去重方式: {self.dedup_backend}")
+        self._workers = [
+            asyncio.create_task(self._worker(), name=f"wechat-worker-{i}")
+            for i in range(self.worker_count)
+        ]
+        logger.info(f"微信消息处理队列已启动，worker 数 {self.worker_count}")
+
+    async def stop(self, timeout: float = 5.0):
+        """停止处理，最多等待 timeout 秒处理完队列中剩余的消息"""
+        if not self._workers:
+            return
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"微信消息队列关闭时仍有 {self.queue.qsize()} 条消息未处理")
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        if self.shared_dedup is not None:
+            await self.shared_dedup.close()
+            self.shared_dedup = None
+
+    async def _is_shared_duplicate(self, key: str) -> bool:
+        if self.shared_dedup is None:
+            return False
+        try:
+            return not await self.shared_dedup.add(key)
+        except Exception as e:
+            # Redis 不可用时照常处理，退化为本进程去重
+            logger.error(f"跨进程消息去重失败: {key}，{str(e)}")
+            return False
+
+    async def _worker(self):
+        while True:
+            message = await self.queue.get()
+            try:
+                if await self._is_shared_duplicate(message_key(message)):
+                    self.duplicated += 1
+                    logger.debug(f"忽略其他 worker 已处理的微信消息: {message_key(message)}")
+                    continue
+                # 每个处理函数单独捕获异常，一个失败（如自动回复发送失败）不影响后面的处理函数
+                failed = False
+                for handler in self.handlers:
+                    try:
+                        await handler(message)
+                    except Exception as e:
+                        failed = True
+                        logger.error(f"处理微信消息失败: {message_key(message)}，处理函数 {handler.__name__}，{str(e)}",
+                                     exc_info=True)
+                if failed:
+                    self.failed += 1
+                else:
+                    self.processed += 1
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"处理微信消息失败: {message_key(message)}，{str(e)}", exc_info=True)
+            finally:
+                self.queue.task_done()
+
+    def stats(self) -> dict:
+        return {
+            "received": self.received,
+            "duplicated": self.duplicated,
+            "processed": self.processed,
+            "failed": self.failed,
+            "queue_size": self.queue.qsize(),
+            "dedup_size": len(self.dedup)
+        }
+
+
+wechat_dispatcher = WechatMessageDispatcher(
+    worker_count=settings.WECHAT_WORKERS,
+    queue_size=settings.WECHAT_QUEUE_SIZE,
+    dedup_ttl=settings.WECHAT_DEDUP_TTL,
+    dedup_max_size=settings.WECHAT_DEDUP_MAX_SIZE,
+    dedup_backend=settings.WECHAT_DEDUP_BACKEND,
+    dedup_redis_url=settings.WECHAT_DEDUP_REDIS_URL
+)
+
+
+@wechat_dispatcher.register_handler
+async def log_message(message: Dict[str, str]):
+    """记录收到的微信消息"""
+    logger.info(f"处理微信消息: 来自 {message.get('FromUserName')}，类型 {message.get('MsgType')}，"
+                f"ID {message_key(message)}")
+
+
+@wechat_dispatcher.register_handler
+async def record_session(message: Dict[str, str]):
+    """将客户消息记录到会话中"""
+    openid = message.get("FromUserName")
+    if not openid:
+        return
+    session = session_store.get_or_create(openid)
+    if message.get("MsgType") == "text":
+        session.add_message(message.get("Content", ""))
+
+
+class AccessTokenManager:
+    """
+    微信 access_token 管理
+
+    - 进程内缓存 token，在过期前 refresh_margin 秒主动刷新
+    - 同一进程内的并发调用共享同一个刷新任务（single-flight）
+    - 多个 worker 进程通过文件锁保护的本地缓存文件共享 token，
+      拿到锁后先读缓存文件，其他进程已刷新过则直接使用，保证同一时间只有一次真正的接口调用
+    """
+
+    def __init__(self, app_id: str, app_secret: str, cache_file: str, refresh_margin: int = 300,
+                 client: Optional[httpx.AsyncClient] = None):
+        self.app_id = app_id
+        self.app_secret = app_secret
+        self.cache_file = cache_file
+        self.refresh_margin = refresh_margin
+        self._client = client
+        self._lock = FileLock(cache_file + ".lock")
+        self._token: Optional[str] = None
+        self._expires_at = 0.0
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._background_task: Optional[asyncio.Task] = None
+        self.fetch_count = 0
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        return self._client or get_http_client()
+
+    def _is_fresh(self, expires_at: float) -> bool:
+        return time.time() < expires_at - self.refresh_margin
+
+    async def get_token(self) -> str:
+        """获取有效的 access_token"""
+        if self._token and self._is_fresh(self._expires_at):
+            return self._token
+        return await self._refresh()
+
+    async def invalidate(self, token: str) -> str:
+        """接口返回 token 失效时调用，丢弃该 token 并获取新的 token"""
+        if self._token == token:
+            self._token = None
+            self._expires_at = 0.0
+        return await self._refresh(stale_token=token)
+
+    async def _refresh(self, stale_token: Optional[str] = None) -> str:
+        if self._refresh_task is None:
+            self._refresh_task = asyncio.create_task(self._do_refresh(stale_token))
+            self._refresh_task.add_done_callback(self._clear_refresh_task)
+        # shield 保证单个调用方被取消时不会取消共享的刷新任务
+        return await asyncio.shield(self._refresh_task)
+
+    def _clear_refresh_task(self, task: asyncio.Task):
+        self._refresh_task = None
+
+    def _read_cache(self):
+        try:
+            with open(self.cache_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return data["access_token"], float(data["expires_at"])
+        except (OSError, ValueError, KeyError):
+            return None, 0.0
+
+    def _write_cache(self, token: str, expires_at: float):
+        tmp_file = f"{self.cache_file}.{os.getpid()}.tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump({"access_token": token, "expires_at": expires_at}, f)
+        os.replace(tmp_file, self.cache_file)
+
+    async def _acquire_lock(self):
+        """
+        轮询非阻塞地获取文件锁
+
+        不在线程中阻塞等待：等待期间任务被取消时，线程仍会在稍后拿到锁，而此时已没有人释放它。
+        """
+        while not self._lock.acquire(blocking=False):
+            await asyncio.sleep(0.05)
+
+    async def _do_refresh(self, stale_token: Optional[str]) -> str:
+        await self._acquire_lock()
+        try:
+            token, expires_at = await asyncio.to_thread(self._read_cache)
+            if token and token != stale_token and self._is_fresh(expires_at):
+                # 其他 worker 已经刷新过
+                self._token, self._expires_at = token, expires_at
+                return token
+
+            token, expires_in = await self._fetch_token()
+            expires_at = time.time() + expires_in
+            await asyncio.to_thread(self._write_cache, token, expires_at)
+            self._token, self._expires_at = token, expires_at
+            logger.info(f"已刷新微信 access_token，有效期 {expires_in}s")
+            return token
+        finally:
+            await asyncio.to_thread(self._lock.release)
+
+    async def _fetch_token(self):
+        self.fetch_count += 1
+        response = await self.client.get("/cgi-bin/token", params={
+            "grant_type": "client_credential",
+            "appid": self.app_id,
+            "secret": self.app_secret
+        })
+        response.raise_for_status()
+        data = response.json()
+        if "access_token" not in data:
+            raise WechatAPIError(data.get("errcode", -1), data.get("errmsg", "获取 access_token 失败"))
+        return data["access_token"], int(data.get("expires_in", 7200))
+
+    async def start(self):
+        """启动后台主动刷新任务"""
+        if self._background_task is None:
+            self._background_task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        if self._background_task is not None:
+            self._background_task.cancel()
+            await asyncio.gather(self._background_task, return_exceptions=True)
+            self._background_task = None
+
+    async def _refresh_loop(self):
+        while True:
+            try:
+                await self.get_token()
+                delay = max(self._expires_at - self.refresh_margin - time.time(), 0) + 1
+            except Exception as e:
+                logger.error(f"刷新微信 access_token 失败: {str(e)}", exc_info=True)
+                delay = 30
+            await asyncio.sleep(delay)
+
+
+token_manager = AccessTokenManager(
+    app_id=settings.WECHAT_APP_ID,
+    app_secret=settings.WECHAT_APP_SECRET,
+    cache_file=settings.WECHAT_TOKEN_CACHE_FILE,
+    refresh_margin=settings.WECHAT_TOKEN_REFRESH_MARGIN
+)
+
+
+class TokenBucket:
+    """令牌桶限流器，rate 为每秒令牌数，capacity 为允许的突发量"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+                self._updated_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+def _text_payload(openid: str, content: str) -> Dict[str, Any]:
+    return {"touser": openid, "msgtype": "text", "text": {"content": content}}
+
+
+def _consume_result(future: asyncio.Future):
+    # 没有调用方等待结果时避免 "exception was never retrieved" 警告，失败已由发送 worker 记录
+    if not future.cancelled():
+        future.exception()
+
+
+class WechatSender:
+    """
+    微信消息异步发送器
+
+    - 共用 keep-alive 连接池调用微信接口
+    - 每个接口一个令牌桶，按微信接口频率限制发送
+    - 系统繁忙、网络错误等临时错误按指数退避（带随机抖动）重试，token 失效时刷新后重试
+    - 优先级队列保证回复客户的消息先于批量通知发送
+    """
+
+    def __init__(self, tokens: AccessTokenManager, worker_count: int, rate_limits: Dict[str, float],
+                 default_rate: float, max_retries: int = 3, backoff_base: float = 0.5,
+                 client: Optional[httpx.AsyncClient] = None):
+        self.tokens = tokens
+        self.worker_count = worker_count
+        self.rate_limits = rate_limits
+        self.default_rate = default_rate
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self._client = client
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._sequence = itertools.count()
+        self._workers: List[asyncio.Task] = []
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        return self._client or get_http_client()
+
+    def _bucket(self, path: str) -> TokenBucket:
+        bucket = self._buckets.get(path)
+        if bucket is None:
+            bucket = self._buckets[path] = TokenBucket(self.rate_limits.get(path, self.default_rate))
+        return bucket
+
+    def _backoff(self, attempt: int) -> float:
+        # full jitter：在 [0, base * 2^attempt] 内随机等待
+        return random.uniform(0, self.backoff_base * (2 ** attempt))
+
+    async def call_api(self, path: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """调用需要 access_token 的微信 POST 接口，带限流和重试"""
+        bucket = self._bucket(path)
+        token = await self.tokens.get_token()
+        attempt = 0
+        while True:
+            await bucket.acquire()
+            try:
+                response = await self.client.post(
+                    path,
+                    params={"access_token": token},
+                    content=orjson.dumps(payload),  # 中文不转义，否则微信会原样显示 \uXXXX
+                    headers={"Content-Type": "application/json"}
+                )
+                if response.status_code >= 500:
+                    response.raise_for_status()
+                data = response.json()
+                if not isinstance(data, dict):
+                    raise ValueError("响应不是 JSON 对象")
+                errcode = data.get("errcode", 0)
+            except (httpx.TransportError, httpx.HTTPStatusError) as e:
+                errcode, data = -1, {"errcode": -1, "errmsg": str(e)}
+            except ValueError as e:
+                # 网关等返回的非 JSON 响应（JSONDecodeError 是 ValueError 的子类），按系统繁忙重试
+                errcode, data = -1, {"errcode": -1, "errmsg": f"无法解析的响应（HTTP {response.status_code}）: {str(e)}"}
+
+            if errcode == 0:
+                self.sent += 1
+                return data
+            if attempt >= self.max_retries or (errcode not in TRANSIENT_ERRCODES
+                                               and errcode not in TOKEN_INVALID_ERRCODES):
+                self.failed += 1
+                raise WechatAPIError(errcode, data.get("errmsg", ""))
+
+            attempt += 1
+            self.retried += 1
+            if errcode in TOKEN_INVALID_ERRCODES:
+                token = await self.tokens.invalidate(token)
+            else:
+                delay = self._backoff(attempt)
+                logger.warning(f"调用微信接口 {path} 失败（{errcode}），{delay:.2f}s 后第 {attempt} 次重试")
+                await asyncio.sleep(delay)
+
+    def submit(self, path: str, payload: Dict[str, Any], priority: int = PRIORITY_NOTIFY) -> asyncio.Future:
+        """加入发送队列，返回可等待发送结果的 Future"""
+        if self._queue is None:
+            raise RuntimeError("微信消息发送器未启动")
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((priority, next(self._sequence), path, payload, future))
+        return future
+
+    async def send_text(self, openid: str, content: str, priority: int = PRIORITY_REPLY) -> Dict[str, Any]:
+        """发送客服文本消息"""
+        return await self.submit("/cgi-bin/message/custom/send", _text_payload(openid, content), priority)
+
+    def send_text_nowait(self, openid: str, content: str, priority: int = PRIORITY_REPLY) -> asyncio.Future:
+        """
+        发送客服文本消息，加入发送队列后立即返回
+
+        消息处理函数回复客户时使用，不等待发送和重试完成，不占用消息处理 worker；发送失败由发送 worker 记录日志。
+        """
+        future = self.submit("/cgi-bin/message/custom/send", _text_payload(openid, content), priority)
+        future.add_done_callback(_consume_result)
+        return future
+
+    async def send_template(self, openid: str, template_id: str, data: Dict[str, Any],
+                            url: Optional[str] = None, priority: int = PRIORITY_NOTIFY) -> Dict[str, Any]:
+        """发送模板消息（用于通知坐席工单变更）"""
+        payload = {"touser": openid, "template_id": template_id, "data": data}
+        if url:
+            payload["url"] = url
+        return await self.submit("/cgi-bin/message/template/send", payload, priority)
+
+    async def start(self):
+        if self._workers:
+            return
+        self._queue = asyncio.PriorityQueue()
+        self._workers = [
+            asyncio.create_task(self._worker(), name=f"wechat-sender-{i}")
+            for i in range(self.worker_count)
+        ]
+        logger.info(f"微信消息发送器已启动，worker 数 {self.worker_count}")
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        if self._queue is not None:
+            while not self._queue.empty():
+                *_, future = self._queue.get_nowait()
+                if not future.done():
+                    future.cancel()
+            self._queue = None
+
+    async def _worker(self):
+        while True:
+            priority, _, path, payload, future = await self._queue.get()
+            if future.done():  # 调用方已放弃等待
+                continue
+            try:
+                result = await self.call_api(path, payload)
+                if not future.done():
+                    future.set_result(result)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+                logger.error(f"发送微信消息失败: {path}，{str(e)}")
+
+    def stats(self) -> dict:
+        return {
+            "sent": self.sent,
+            "retried": self.retried,
+            "failed": self.failed,
+            "queue_size": self._queue.qsize() if self._queue is not None else 0
+        }
+
+
+wechat_sender = WechatSender(
+    tokens=token_manager,
+    worker_count=settings.WECHAT_SENDER_WORKERS,
+    rate_limits=settings.WECHAT_RATE_LIMITS,
+    default_rate=settings.WECHAT_DEFAULT_RATE,
+    max_retries=settings.WECHAT_MAX_RETRIES
+)
+
+
+@job_handler("wechat_send_text")
+async def send_text_job(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """后台任务：发送客服文本消息，参数 openid、content"""
+    return await wechat_sender.send_text(payload["openid"], payload["content"], priority=PRIORITY_NOTIFY)
+
+
+@job_handler("wechat_send_template")
+async def send_template_job(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """后台任务：发送模板消息，参数 openid、template_id、data，可选 url"""
+    return await wechat_sender.send_template(payload["openid"], payload["template_id"], payload["data"],
+                                             url=payload.get("url"))
+
+
+@wechat_dispatcher.register_handler
+async def keyword_auto_reply(message: Dict[str, str]):
+    """文本消息命中关键词规则时自动回复"""
+    if message.get("MsgType") != "text" or not settings.WECHAT_APP_ID:
+        return
+    rule = keyword_engine.match(message.get("Content", ""))
+    if rule is None:
+        return
+    logger.info(f"微信消息 {message_key(message)} 命中关键词规则 {rule.rule_id}，自动回复")
+    wechat_sender.send_text_nowait(message["FromUserName"], rule.reply, priority=PRIORITY_REPLY)
+
+
+@wechat_dispatcher.register_handler
+async def select_ticket(message: Dict[str, str]):
+    """
+    客户发送选择问题单的指令时，校验验证码后绑定到该问题单，供 attach_media 使用
+
+    验证码由问题单创建人或坐席通过 POST /tickets/{id}/wechat-code 生成并告知客户，
+    只凭问题单编号不能选择，避免他人把文件写入不属于自己的问题单。
+    """
+    if message.get("MsgType") != "text":
+        return
+    match = SELECT_TICKET_PATTERN.match(message.get("Content", ""))
+    if match is None:
+        return
+    # 在函数内导入，避免与模型、数据库模块循环导入
+    from app.db_services.database import async_session_factory
+    from app.services.wechat_ticket_service import RedeemResult, redeem_ticket_code
+
+    ticket_id, code = int(match.group(1)), match.group(2)
+    openid = message["FromUserName"]
+    if code is None:
+        reply = f"请发送“问题单 {ticket_id} 验证码”选择问题单，验证码请向客服索取"
+    else:
+        async with async_session_factory() as db:
+            result = await redeem_ticket_code(db, openid, ticket_id, code)
+        if result == RedeemResult.BOUND:
+            logger.info(f"微信用户 {openid} 选择了问题单 {ticket_id}")
+            reply = f"已选择问题单 {ticket_id}，之后发送的图片、视频和文件将保存为该问题单的附件"
+        elif result == RedeemResult.INVALID:
+            logger.warning(f"微信用户 {openid} 选择问题单 {ticket_id} 时验证码错误")
+            reply = "验证码错误，请核对后重新发送"
+        else:
+            reply = "验证码已失效，请向客服重新索取"
+    if settings.WECHAT_APP_ID:
+        wechat_sender.send_text_nowait(openid, reply, priority=PRIORITY_REPLY)
+
+
+@wechat_dispatcher.register_handler
+async def attach_media(message: Dict[str, str]):
+    """客户已选择问题单（见 select_ticket）时，将发送的图片、视频等媒体文件保存为问题单附件"""
+    # 在函数内导入，避免与 media_service 循环导入
+    from app.services.media_service import MEDIA_MSG_TYPES, media_downloader
+    from app.services.wechat_ticket_service import get_bound_ticket
+    from app.db_services.database import async_session_factory
+
+    file_type = MEDIA_MSG_TYPES.get(message.get("MsgType"))
+    if file_type is None or not message.get("MediaId") or not settings.WECHAT_APP_ID:
+        return
+    openid = message.get("FromUserName", "")
+    async with async_session_factory() as db:
+        ticket_id = await get_bound_ticket(db, openid)
+        if ticket_id is None:
+            logger.info(f"微信消息 {message_key(message)} 的媒体文件未保存：用户 {openid} 未选择问题单")
+            wechat_sender.send_text_nowait(openid, "文件未保存：请先发送“问题单 编号 验证码”选择问题单，再重新发送文件",
+                                           priority=PRIORITY_REPLY)
+            return
+        attachment = await media_downloader.download_to_ticket(db, ticket_id, message["MediaId"], file_type)
+    logger.info(f"微信消息 {message_key(message)} 的媒体文件已保存为问题单 {ticket_id} 的附件 {attachment.id}")
@@ -0,0 +1,88 @@
+# 微信用户与问题单的绑定
+
+import hmac
+import secrets
+import hashlib
+from datetime import datetime, timedelta, timezone
+from enum import Enum
+from typing import Optional, Tuple
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.models.wechat import WechatTicketBinding, WechatTicketCode
+
+
+class RedeemResult(str, Enum):
+    BOUND = "bound"  # 验证码正确，已绑定
+    INVALID = "invalid"  # 验证码错误
+    EXPIRED = "expired"  # 问题单没有有效的验证码（未生成、已过期、已使用或输错次数过多）
+
+
+def _utcnow() -> datetime:
+    # 数据库中的时间均为不带时区的 UTC 时间
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _hash_code(code: str) -> str:
+    return hashlib.sha256(code.encode()).hexdigest()
+
+
+async def issue_ticket_code(session: AsyncSession, ticket_id: int, user_id: int) -> Tuple[str, datetime]:
+    """
+    生成问题单绑定验证码，同一问题单之前的验证码作废
+
+    Returns:
+        Tuple[str, datetime]: 6 位数字验证码及其过期时间（UTC）
+    """
+    code = f"{secrets.randbelow(10 ** 6):06d}"
+    expires_at = _utcnow() + timedelta(seconds=settings.WECHAT_TICKET_CODE_TTL)
+    await session.execute(delete(WechatTicketCode).where(WechatTicketCode.ticket_id == ticket_id))
+    session.add(WechatTicketCode(ticket_id=ticket_id, code_hash=_hash_code(code), created_by=user_id,
+                                 expires_at=expires_at))
+    await session.commit()
+    return code, expires_at
+
+
+async def redeem_ticket_code(session: AsyncSession, openid: str, ticket_id: int, code: str) -> RedeemResult:
+    """
+    校验客户发送的验证码，正确时把该微信用户绑定到问题单
+
+    验证码只能使用一次；输错 WECHAT_TICKET_CODE_MAX_ATTEMPTS 次后作废，需要重新生成。
+    """
+    result = await session.execute(
+        select(WechatTicketCode).where(WechatTicketCode.ticket_id == ticket_id)
+        .order_by(WechatTicketCode.id.desc()).limit(1)
+    )
+    record = result.scalars().first()
+    if record is None or record.expires_at.replace(tzinfo=None) <= _utcnow() \
+            or record.attempts >= settings.WECHAT_TICKET_CODE_MAX_ATTEMPTS:
+        return RedeemResult.EXPIRED
+    if not hmac.compare_digest(record.code_hash, _hash_code(code)):
+        # 原子地累加，并发输错时计数不会丢失
+        await session.execute(
+            update(WechatTicketCode).where(WechatTicketCode.id == record.id)
+            .values(attempts=WechatTicketCode.attempts + 1)
+        )
+        await session.commit()
+        return RedeemResult.INVALID
+
+    result = await session.execute(delete(WechatTicketCode).where(WechatTicketCode.id == record.id))
+    if result.rowcount != 1:  # 同时被其他请求使用
+        await session.rollback()
+        return RedeemResult.EXPIRED
+    binding = await session.get(WechatTicketBinding, openid)
+    if binding is None:
+        session.add(WechatTicketBinding(openid=openid, ticket_id=ticket_id))
+    else:
+        binding.ticket_id = ticket_id
+        binding.bound_at = datetime.now(timezone.utc)
+    await session.commit()
+    return RedeemResult.BOUND
+
+
+async def get_bound_ticket(session: AsyncSession, openid: str) -> Optional[int]:
+    """微信用户当前绑定的问题单ID，未绑定时返回 None"""
+    binding = await session.get(WechatTicketBinding, openid)
+    return binding.ticket_id if binding is not None else None
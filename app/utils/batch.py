@@ -0,0 +1,30 @@
+# 按ID批量查询
+
+from typing import Dict, List, Optional, Sequence, TypeVar
+
+from fastapi import HTTPException, status
+
+from app.config import settings
+
+T = TypeVar("T")
+
+
+def unique_batch_ids(ids: Sequence[int]) -> List[int]:
+    """校验批量查询的ID列表，返回去重后的ID（保持原顺序），超过上限时抛出 400"""
+    errors = []
+    if not ids:
+        errors.append("ids 不能为空")
+    elif len(ids) > settings.BATCH_GET_MAX_IDS:
+        errors.append(f"每次最多查询 {settings.BATCH_GET_MAX_IDS} 个ID")
+    if errors:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={"message": "参数错误", "errors": errors}
+        )
+    return list(dict.fromkeys(ids))
+
+
+def in_request_order(ids: Sequence[int], rows: Sequence[T]) -> List[Optional[T]]:
+    """按请求中的ID顺序排列查询结果，不存在的ID对应 None，重复的ID重复返回"""
+    by_id: Dict[int, T] = {row.id: row for row in rows}
+    return [by_id.get(id_) for id_ in ids]
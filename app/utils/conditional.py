@@ -0,0 +1,112 @@
+# 条件请求（ETag / If-None-Match / If-Modified-Since）
+
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Dict, Optional
+
+from fastapi import HTTPException, Request, Response, status
+
+
+# 压缩中间件给强 ETag 加上的编码后缀，如 "5" 压缩后为 "5-gzip"；比较 ETag 时去掉
+ENCODING_SUFFIXES = ("-gzip", "-br")
+
+
+def encoded_etag(etag: str, encoding: str) -> str:
+    """
+    压缩后响应的 ETag
+
+    强 ETag 表示逐字节相同，压缩后的内容与原内容不同，需要带上编码后缀；弱 ETag 原样返回。
+    """
+    if etag.startswith("W/") or len(etag) < 2 or not etag.endswith('"'):
+        return etag
+    return f'{etag[:-1]}-{encoding}"'
+
+
+def _strip_encoding(opaque: str) -> str:
+    # opaque 为带引号的 ETag 值，如 "5-gzip"
+    for suffix in ENCODING_SUFFIXES:
+        if opaque.endswith(f'{suffix}"'):
+            return opaque[:-len(suffix) - 1] + '"'
+    return opaque
+
+
+def _as_utc(value: datetime) -> datetime:
+    # 数据库读出的时间不带时区，按 UTC 处理
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+
+def weak_etag(*parts) -> str:
+    """根据行版本信息（ID、修改时间、数量等）生成弱 ETag"""
+    raw = "|".join("" if part is None else _as_utc(part).isoformat() if isinstance(part, datetime) else str(part)
+                   for part in parts)
+    return f'W/"{hashlib.sha1(raw.encode()).hexdigest()[:20]}"'
+
+
+def version_etag(version: int) -> str:
+    """根据行版本号生成强 ETag，可用于 If-Match"""
+    return f'"{version}"'
+
+
+def if_match_version(request: Request) -> int:
+    """
+    从 If-Match 请求头解析客户端持有的版本号
+
+    缺少 If-Match 时抛出 428；If-Match 使用强比较，弱 ETag 或无法识别的值不可能匹配，抛出 412。
+    压缩响应的 ETag 带有编码后缀（如 "5-gzip"），比较的是同一版本，去掉后缀后解析。
+    """
+    header = request.headers.get("if-match")
+    if header is None:
+        raise HTTPException(
+            status_code=status.HTTP_428_PRECONDITION_REQUIRED,
+            detail={"message": "缺少 If-Match 请求头", "errors": ["请先获取最新数据，修改时通过 If-Match 带上其 ETag"]}
+        )
+    value = _strip_encoding(header.strip())
+    if len(value) > 2 and value[0] == value[-1] == '"' and value[1:-1].isdigit():
+        return int(value[1:-1])
+    raise HTTPException(
+        status_code=status.HTTP_412_PRECONDITION_FAILED,
+        detail={"message": "If-Match 不匹配", "errors": [f"无效的 ETag: {value}"]}
+    )
+
+
+def cache_headers(etag: str, last_modified: Optional[datetime] = None) -> Dict[str, str]:
+    """条件请求相关的响应头，no-cache 表示客户端可以缓存，但每次使用前都要带 ETag 重新验证"""
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if last_modified is not None:
+        headers["Last-Modified"] = format_datetime(_as_utc(last_modified), usegmt=True)
+    return headers
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    # If-None-Match 使用弱比较：忽略 W/ 前缀和压缩中间件加的编码后缀
+    if header.strip() == "*":
+        return True
+    opaque = _strip_encoding(etag.removeprefix("W/"))
+    return any(_strip_encoding(candidate.strip().removeprefix("W/")) == opaque for candidate in header.split(","))
+
+
+def is_not_modified(request: Request, etag: str, last_modified: Optional[datetime] = None) -> bool:
+    """
+    判断客户端缓存是否仍然有效
+
+    同时带 If-None-Match 和 If-Modified-Since 时只看 If-None-Match（RFC 9110）。
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return _etag_matches(if_none_match, etag)
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        # HTTP 日期精确到秒
+        return _as_utc(last_modified).replace(microsecond=0) <= since
+    return False
+
+
+def not_modified(etag: str, last_modified: Optional[datetime] = None) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=cache_headers(etag, last_modified))
@@ -0,0 +1,34 @@
+import orjson
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel
+
+
+def _orm_default(obj):
+    """orjson 无法直接处理的 ORM/SQLModel 对象，交给 pydantic-core 直接序列化为 JSON 字节"""
+    if isinstance(obj, BaseModel):
+        return orjson.Fragment(obj.__pydantic_serializer__.to_json(obj))
+    raise TypeError(f"无法序列化类型: {type(obj).__name__}")
+
+
+def dumps(content) -> bytes:
+    """序列化为 JSON 字节，支持 ORM/SQLModel 对象"""
+    return orjson.dumps(content, default=_orm_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+def sse_event(data, event: str = None) -> bytes:
+    """格式化一条 Server-Sent Event，data 为已序列化的 JSON 字节或可序列化对象"""
+    prefix = f"event: {event}\n".encode() if event else b""
+    body = data if isinstance(data, bytes) else dumps(data)
+    return prefix + b"data: " + body + b"\n\n"
+
+
+class FastJSONResponse(ORJSONResponse):
+    """
+    基于 orjson 的 JSON 响应，作为应用默认响应类
+
+    可以直接传入 ORM 对象（或包含 ORM 对象的 dict/list），每个对象只序列化一次，直接得到字节，
+    不再经过 model_dump() 转 dict。路由直接返回该响应实例时，FastAPI 不会再按 response_model 校验。
+    """
+
+    def render(self, content) -> bytes:
+        return dumps(content)
@@ -0,0 +1,38 @@
+# 缩略图生成（在进程池中执行）
+#
+# 该模块只依赖 Pillow 和标准库，进程池的子进程导入它时不会加载整个应用。
+
+import os
+import uuid
+
+from PIL import Image, ImageOps
+
+
+def render_thumbnail(src: str, dst: str, max_side: int, quality: int) -> int:
+    """
+    生成长边不超过 max_side 的 JPEG 缩略图，返回文件大小
+
+    先写临时文件再原子替换，并发生成或进程中途退出时不会留下不完整的缩略图。
+    """
+    with Image.open(src) as image:
+        # JPEG 可在解码时按比例缩小，大图只解码需要的分辨率
+        image.draft("RGB", (max_side, max_side))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+        if image.mode in ("RGBA", "LA", "P"):
+            image = image.convert("RGBA")
+            background = Image.new("RGB", image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel("A"))
+            image = background
+        elif image.mode != "RGB":
+            image = image.convert("RGB")
+
+        tmp_path = f"{dst}.{uuid.uuid4().hex}.tmp"
+        try:
+            image.save(tmp_path, "JPEG", quality=quality, optimize=True, progressive=True)
+            os.replace(tmp_path, dst)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+    return os.path.getsize(dst)
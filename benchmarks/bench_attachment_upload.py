@@ -0,0 +1,108 @@
+# 附件大文件上传压测：吞吐、内存占用、内容去重及 Range 下载
+#
+# 用法：DATABASE_URL=sqlite+aiosqlite:////tmp/bench_attachment.db python -m benchmarks.bench_attachment_upload --size-mb 128
+#
+# 在进程内启动应用（跳过登录校验），用 httpx 流式上传到 /api/v1/tickets/{id}/attachments
+import time
+import asyncio
+import argparse
+import random
+import hashlib
+import resource
+import tempfile
+import tracemalloc
+
+import httpx
+import uvicorn
+from sqlmodel import SQLModel
+
+from app.dependencies.auth import get_current_user
+from app.models.user import User
+
+
+def body_chunks(size_mb: int, seed: bytes):
+    """生成 size_mb MB 的内容（每块前缀不同，避免被整块去重），同时计算期望的哈希"""
+    block = random.Random(0).randbytes(1024 * 1024 - 16)
+    digest = hashlib.sha256()
+
+    async def chunks():
+        for i in range(size_mb):
+            chunk = seed + i.to_bytes(8, "big") + block
+            digest.update(chunk)
+            yield chunk
+
+    return chunks(), digest
+
+
+async def run(args):
+    from main import app
+    from app.db_services.database import engine, async_session_factory
+    from app.models.ticket import Ticket
+    from app.services import attachment_storage
+
+    attachment_storage.STORAGE_DIR = tempfile.mkdtemp()
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+    async with async_session_factory() as session:
+        ticket = Ticket(user_id=1, device_model="bench", customer="bench", fault_phenomenon="bench")
+        session.add(ticket)
+        await session.commit()
+        ticket_id = ticket.id
+
+    app.dependency_overrides[get_current_user] = lambda: User(id=1, name="bench", phone="", email="", password="")
+    server = uvicorn.Server(uvicorn.Config(app, port=args.port, log_level="warning"))
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    url = f"http://127.0.0.1:{args.port}/api/v1/tickets/{ticket_id}/attachments"
+    headers = {"Content-Type": "application/octet-stream"}
+    async with httpx.AsyncClient(timeout=300) as client:
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        chunks, digest = body_chunks(args.size_mb, b"run-1---")
+        start = time.perf_counter()
+        response = await client.post(url, content=chunks, headers=headers)
+        elapsed = time.perf_counter() - start
+        rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        attachment = response.json()
+        assert attachment["content_hash"] == digest.hexdigest(), "哈希不一致"
+        print(f"上传 {args.size_mb} MB，耗时 {elapsed:.2f}s，吞吐 {args.size_mb / elapsed:.0f} MB/s，"
+              f"进程峰值 RSS 增长 {(rss_after - rss_before) / 1024:.1f} MB")
+
+        # 再上传一次相同内容：开启 tracemalloc 统计 Python 内存峰值，并验证去重
+        chunks, _ = body_chunks(args.size_mb, b"run-1---")
+        tracemalloc.start()
+        response = await client.post(url, content=chunks, headers=headers)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        duplicate = response.json()
+        print(f"重复上传返回同一附件: {duplicate['id'] == attachment['id']}，Python 内存峰值 {peak / 1024 / 1024:.1f} MB")
+
+        download_url = f"{url}/{attachment['id']}"
+        size = attachment["file_size"]
+        response = await client.get(download_url, headers={"Range": f"bytes={size - 1024}-"})
+        print(f"Range 下载: {response.status_code}，{response.headers.get('content-range')}，{len(response.content)} 字节")
+        response = await client.get(download_url, headers={"If-None-Match": response.headers["etag"]})
+        print(f"If-None-Match: {response.status_code}")
+
+        start = time.perf_counter()
+        downloaded = 0
+        async with client.stream("GET", download_url) as response:
+            async for chunk in response.aiter_bytes():
+                downloaded += len(chunk)
+        elapsed = time.perf_counter() - start
+        print(f"完整下载 {downloaded / 1024 / 1024:.0f} MB，耗时 {elapsed:.2f}s，吞吐 {downloaded / 1024 / 1024 / elapsed:.0f} MB/s")
+
+    server.should_exit = True
+    await server_task
+
+
+def main():
+    parser = argparse.ArgumentParser(description="附件大文件上传压测")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--size-mb", type=int, default=128, help="需不超过 ATTACHMENT_MAX_SIZE")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
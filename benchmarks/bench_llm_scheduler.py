@@ -0,0 +1,73 @@
+# 大模型调度器压测：一个用户大量请求时其他用户的排队时间，以及批量合并的吞吐
+#
+# 用法：python -m benchmarks.bench_llm_scheduler --heavy 40 --light 5
+#
+# 直接在进程内调用调度器，后端为假后端
+import time
+import asyncio
+import argparse
+
+from app.services.llm_service import FakeLLMBackend, current_llm_user
+from app.services.llm_scheduler import FairScheduler
+
+
+async def request(scheduler, user, prompt, params, latencies, label=None):
+    current_llm_user.set(user)
+    start = time.perf_counter()
+    async for _ in scheduler.stream(prompt, params):
+        pass
+    latencies.setdefault(label or user, []).append(time.perf_counter() - start)
+
+
+async def scenario(args, fair: bool, batch_max_size: int = 1):
+    backend = FakeLLMBackend(args.first_token_delay, args.token_interval)
+    scheduler = FairScheduler(backend, args.concurrency, queue_timeout=300, max_queued_per_user=10000,
+                              batch_max_size=batch_max_size)
+    params = {"max_tokens": args.max_tokens}
+    latencies = {}
+    tasks = [asyncio.create_task(request(scheduler, "heavy", f"heavy {i}", params, latencies))
+             for i in range(args.heavy)]
+    await asyncio.sleep(0.01)
+    # 不公平调度：轻量用户的请求和重度用户进同一个队列，等价于先来先服务
+    tasks += [asyncio.create_task(request(scheduler, f"light{i}" if fair else "heavy", f"light {i}", params,
+                                          latencies, label="light"))
+              for i in range(args.light)]
+    start = time.perf_counter()
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+    return elapsed, latencies["light"], scheduler.stats()
+
+
+async def run(args):
+    for label, fair in (("先来先服务", False), ("按用户公平排队", True)):
+        elapsed, light, stats = await scenario(args, fair)
+        print(f"{label}: 总耗时 {elapsed:.2f}s，轻量用户平均等待 {sum(light) / len(light):.2f}s，"
+              f"最长 {max(light):.2f}s")
+
+    for size in (1, args.batch):
+        elapsed, _, stats = await scenario(args, True, size)
+        print(f"批次上限 {size}: 总耗时 {elapsed:.2f}s，{(args.heavy + args.light) / elapsed:.1f} 请求/秒，"
+              f"批次数 {stats['batches']}")
+
+    backend = FakeLLMBackend(args.first_token_delay, args.token_interval)
+    scheduler = FairScheduler(backend, 1, queue_timeout=0.1, max_queued_per_user=100)
+    results = await asyncio.gather(*(request(scheduler, "u", f"p{i}", {"max_tokens": args.max_tokens}, {})
+                                     for i in range(5)), return_exceptions=True)
+    print(f"排队截止 0.1s：{sum(1 for r in results if r is None)} 个完成，"
+          f"{sum(1 for r in results if isinstance(r, Exception))} 个被丢弃，统计 {scheduler.stats()['timed_out']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="大模型调度器压测")
+    parser.add_argument("--heavy", type=int, default=40, help="重度用户的请求数")
+    parser.add_argument("--light", type=int, default=5, help="轻量用户数（每人一个请求）")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--max-tokens", type=int, default=10)
+    parser.add_argument("--first-token-delay", type=float, default=0.2)
+    parser.add_argument("--token-interval", type=float, default=0.01)
+    parser.add_argument("--batch", type=int, default=8)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
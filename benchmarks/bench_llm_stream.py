@@ -0,0 +1,82 @@
+# 大模型流式接口延迟压测：客户端视角的首 token 延迟和总耗时
+#
+# 用法：LLM_BACKEND=fake python -m benchmarks.bench_llm_stream --concurrency 50 --requests 500
+#
+# 在进程内启动应用（跳过登录校验），用 httpx 并发请求 /api/v1/llm/chat
+import time
+import asyncio
+import argparse
+
+import httpx
+import uvicorn
+
+from app.dependencies.auth import get_current_user
+from app.models.user import User
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(int(len(values) * p / 100), len(values) - 1)] * 1000
+
+
+async def run(args):
+    from main import app
+    from app.services.llm_service import llm_metrics
+
+    app.dependency_overrides[get_current_user] = lambda: User(
+        id=args.users, name="bench", phone="", email="", password=""
+    )
+    server = uvicorn.Server(uvicorn.Config(app, port=args.port, log_level="warning"))
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    url = f"http://127.0.0.1:{args.port}/api/v1/llm/chat"
+    ttft, totals = [], []
+    queue = asyncio.Queue()
+    for i in range(args.requests):
+        queue.put_nowait(i)
+
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(timeout=60, limits=limits) as client:
+        async def worker():
+            while not queue.empty():
+                i = queue.get_nowait()
+                start = time.perf_counter()
+                first = None
+                async with client.stream("POST", url, json={
+                    "prompt": f"设备不开机怎么办 {i % args.distinct}", "max_tokens": args.max_tokens
+                }) as response:
+                    async for line in response.aiter_lines():
+                        if first is None and line.startswith("data:"):
+                            first = time.perf_counter() - start
+                ttft.append(first)
+                totals.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - start
+
+    server.should_exit = True
+    await server_task
+
+    print(f"{args.requests} 个请求，并发 {args.concurrency}，耗时 {elapsed:.2f}s，{args.requests / elapsed:.1f} 请求/秒")
+    print(f"首 token 延迟 p50 {percentile(ttft, 50):.0f} ms，p95 {percentile(ttft, 95):.0f} ms，"
+          f"p99 {percentile(ttft, 99):.0f} ms")
+    print(f"总耗时 p50 {percentile(totals, 50):.0f} ms，p99 {percentile(totals, 99):.0f} ms")
+    print(f"服务端统计: {llm_metrics.summary()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="大模型流式接口延迟压测")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--max-tokens", type=int, default=32)
+    parser.add_argument("--distinct", type=int, default=1000000, help="不同提示词的数量")
+    parser.add_argument("--users", type=int, default=1, help="模拟的用户ID")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+# 1000 条问题单列表响应的序列化耗时对比
+#
+# 用法：python -m benchmarks.bench_ticket_response
+#
+# 优化前：model_dump() 转 dict -> 按 response_model 校验 -> jsonable_encoder -> 标准库 json
+# 优化后：FastJSONResponse 直接将 ORM 对象序列化为字节
+import json
+import timeit
+from datetime import datetime, timezone
+from typing import List
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from app.models.ticket import Ticket
+from app.schemas.ticket_schema import TicketResponse
+from app.utils.response import FastJSONResponse
+
+TICKET_COUNT = 1000
+ROUNDS = 20
+
+
+def make_tickets(count: int) -> List[Ticket]:
+    return [
+        Ticket(
+            id=i,
+            user_id=i % 50,
+            device_model=f"WX-{i % 30:03d}",
+            customer=f"客户{i}",
+            fault_phenomenon="设备开机后屏幕无显示，指示灯闪烁三次后熄灭。" * 10,
+            fault_reason="电源板电容老化" * 5,
+            handling_method="更换电源板并重新校准传感器，测试运行两小时无异常。" * 8,
+            create_at=datetime.now(timezone.utc)
+        )
+        for i in range(count)
+    ]
+
+
+adapter = TypeAdapter(List[TicketResponse])
+
+
+def before(tickets) -> bytes:
+    content = [ticket.model_dump() for ticket in tickets]
+    validated = adapter.validate_python(content)
+    encoded = jsonable_encoder(validated)
+    return json.dumps(encoded, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def after(tickets) -> bytes:
+    return FastJSONResponse(tickets).body
+
+
+def main():
+    tickets = make_tickets(TICKET_COUNT)
+    assert json.loads(before(tickets)) == json.loads(after(tickets))
+    before_time = timeit.timeit(lambda: before(tickets), number=ROUNDS) / ROUNDS
+    after_time = timeit.timeit(lambda: after(tickets), number=ROUNDS) / ROUNDS
+    print(f"{TICKET_COUNT} 条问题单，响应体 {len(after(tickets)) / 1024:.0f} KB")
+    print(f"优化前: {before_time * 1000:.2f} ms/次")
+    print(f"优化后: {after_time * 1000:.2f} ms/次")
+    print(f"加速比: {before_time / after_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+# 验证多进程、高并发下 access_token 只会被获取一次
+#
+# 用法：
+#   uvicorn benchmarks.stub_wechat_api:app --port 9000
+#   python -m benchmarks.bench_token_manager --api-base http://127.0.0.1:9000 --processes 4 --concurrency 200
+import os
+import time
+import asyncio
+import argparse
+import tempfile
+import multiprocessing
+
+import httpx
+
+from app.services.wechat_service import AccessTokenManager
+
+
+async def worker_main(api_base: str, cache_file: str, concurrency: int):
+    async with httpx.AsyncClient(base_url=api_base) as client:
+        manager = AccessTokenManager("stub-app", "stub-secret", cache_file, client=client)
+        tokens = await asyncio.gather(*(manager.get_token() for _ in range(concurrency)))
+    return set(tokens), manager.fetch_count
+
+
+def run_worker(api_base: str, cache_file: str, concurrency: int, results):
+    tokens, fetch_count = asyncio.run(worker_main(api_base, cache_file, concurrency))
+    results.put((os.getpid(), tokens, fetch_count))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="access_token 管理器多进程测试")
+    parser.add_argument("--api-base", default="http://127.0.0.1:9000")
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, default=200, help="每个进程并发获取 token 的协程数")
+    args = parser.parse_args()
+
+    httpx.post(f"{args.api_base}/stub/reset")
+    cache_file = os.path.join(tempfile.mkdtemp(), "wechat_access_token.json")
+    results = multiprocessing.Queue()
+    start = time.perf_counter()
+    processes = [
+        multiprocessing.Process(target=run_worker, args=(args.api_base, cache_file, args.concurrency, results))
+        for _ in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+    all_tokens = set()
+    for _ in processes:
+        pid, tokens, fetch_count = results.get()
+        all_tokens |= tokens
+        print(f"进程 {pid}: 实际请求接口 {fetch_count} 次，拿到 token {tokens}")
+    for process in processes:
+        process.join()
+
+    stub_calls = httpx.get(f"{args.api_base}/stub/stats").json().get("token", 0)
+    print(f"{args.processes} 个进程 x {args.concurrency} 个并发调用，耗时 {time.perf_counter() - start:.2f}s")
+    print(f"模拟接口收到获取 token 请求 {stub_calls} 次，共 {len(all_tokens)} 个不同的 token")
+    assert stub_calls == 1 and len(all_tokens) == 1, "access_token 被重复获取"
+
+
+if __name__ == "__main__":
+    main()
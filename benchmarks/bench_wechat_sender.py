@@ -0,0 +1,83 @@
+# 微信消息发送器压测：连接池复用、限流、重试及优先级
+#
+# 用法：
+#   uvicorn benchmarks.stub_wechat_api:app --port 9000
+#   python -m benchmarks.bench_wechat_sender --api-base http://127.0.0.1:9000 --notifications 2000 --replies 200
+#
+# 先提交大量批量通知，再提交客户回复，对比两类消息的完成耗时，验证回复优先发送
+import os
+import time
+import asyncio
+import argparse
+import tempfile
+
+import httpx
+
+from app.services.wechat_service import (
+    AccessTokenManager, WechatSender, PRIORITY_NOTIFY, PRIORITY_REPLY
+)
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[max(int(len(values) * p / 100) - 1, 0)] * 1000
+
+
+async def run(args):
+    httpx.post(f"{args.api_base}/stub/reset")
+    limits = httpx.Limits(max_connections=args.pool_size, max_keepalive_connections=args.pool_size)
+    async with httpx.AsyncClient(base_url=args.api_base, limits=limits, timeout=10) as client:
+        cache_file = os.path.join(tempfile.mkdtemp(), "wechat_access_token.json")
+        tokens = AccessTokenManager("stub-app", "stub-secret", cache_file, client=client)
+        sender = WechatSender(
+            tokens, worker_count=args.workers,
+            rate_limits={"/cgi-bin/message/custom/send": args.rate, "/cgi-bin/message/template/send": args.rate},
+            default_rate=args.rate, backoff_base=0.05, client=client
+        )
+        await sender.start()
+
+        async def timed(coro):
+            start = time.perf_counter()
+            try:
+                await coro
+            except Exception:
+                pass
+            return time.perf_counter() - start
+
+        start = time.perf_counter()
+        notify_tasks = [
+            asyncio.create_task(timed(sender.send_template(f"agent_{i}", "tpl", {"id": {"value": i}},
+                                                           priority=PRIORITY_NOTIFY)))
+            for i in range(args.notifications)
+        ]
+        await asyncio.sleep(0.1)
+        reply_tasks = [
+            asyncio.create_task(timed(sender.send_text(f"customer_{i}", "您好，请稍候", priority=PRIORITY_REPLY)))
+            for i in range(args.replies)
+        ]
+        reply_latencies = await asyncio.gather(*reply_tasks)
+        notify_latencies = await asyncio.gather(*notify_tasks)
+        elapsed = time.perf_counter() - start
+        await sender.stop()
+
+    stats = sender.stats()
+    print(f"共发送 {stats['sent']} 条，失败 {stats['failed']} 条，重试 {stats['retried']} 次，"
+          f"耗时 {elapsed:.2f}s，吞吐 {stats['sent'] / elapsed:.0f} 条/秒")
+    print(f"客户回复 p50 {percentile(reply_latencies, 50):.0f} ms，p99 {percentile(reply_latencies, 99):.0f} ms")
+    print(f"批量通知 p50 {percentile(notify_latencies, 50):.0f} ms，p99 {percentile(notify_latencies, 99):.0f} ms")
+    print(f"模拟接口统计: {httpx.get(f'{args.api_base}/stub/stats').json()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="微信消息发送器压测")
+    parser.add_argument("--api-base", default="http://127.0.0.1:9000")
+    parser.add_argument("--notifications", type=int, default=2000)
+    parser.add_argument("--replies", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=20)
+    parser.add_argument("--pool-size", type=int, default=50)
+    parser.add_argument("--rate", type=float, default=500, help="每个接口每秒最大调用次数")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+# 模拟微信服务器推送消息，对 /api/v1/wechat/callback 做压测
+#
+# 用法：python -m benchmarks.mock_wechat_sender --url http://127.0.0.1:8001/api/v1/wechat/callback \
+#           --token <WECHAT_TOKEN> --total 20000 --concurrency 200 --duplicate-rate 0.1
+#
+# 按一定比例重复发送相同 MsgId 的消息，模拟微信的超时重试
+import time
+import random
+import asyncio
+import hashlib
+import argparse
+
+import httpx
+
+MESSAGE_TEMPLATE = (
+    "<xml>"
+    "<ToUserName><![CDATA[gh_mock]]></ToUserName>"
+    "<FromUserName><![CDATA[{openid}]]></FromUserName>"
+    "<CreateTime>{create_time}</CreateTime>"
+    "<MsgType><![CDATA[text]]></MsgType>"
+    "<Content><![CDATA[{content}]]></Content>"
+    "<MsgId>{msg_id}</MsgId>"
+    "</xml>"
+)
+
+
+def sign_params(token: str) -> dict:
+    timestamp = str(int(time.time()))
+    nonce = str(random.randint(100000, 999999))
+    signature = hashlib.sha1("".join(sorted([token, timestamp, nonce])).encode()).hexdigest()
+    return {"signature": signature, "timestamp": timestamp, "nonce": nonce}
+
+
+def build_message(msg_id: int) -> bytes:
+    return MESSAGE_TEMPLATE.format(
+        openid=f"o_mock_{msg_id % 1000}",
+        create_time=int(time.time()),
+        content=f"设备不开机怎么办 {msg_id}",
+        msg_id=msg_id
+    ).encode("utf-8")
+
+
+async def run(args):
+    msg_ids = list(range(1, args.total + 1))
+    duplicates = random.sample(msg_ids, int(args.total * args.duplicate_rate))
+    msg_ids.extend(duplicates)
+    random.shuffle(msg_ids)
+
+    latencies = []
+    errors = 0
+    queue = asyncio.Queue()
+    for msg_id in msg_ids:
+        queue.put_nowait(msg_id)
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=10) as client:
+        async def sender():
+            nonlocal errors
+            while not queue.empty():
+                msg_id = queue.get_nowait()
+                start = time.perf_counter()
+                try:
+                    response = await client.post(args.url, params=sign_params(args.token), content=build_message(msg_id))
+                    if response.status_code != 200 or response.text != "success":
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append(time.perf_counter() - start)
+
+        start_time = time.perf_counter()
+        await asyncio.gather(*(sender() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - start_time
+
+    latencies.sort()
+    print(f"发送 {len(msg_ids)} 条消息（其中重复 {len(duplicates)} 条），耗时 {elapsed:.2f}s，"
+          f"吞吐 {len(msg_ids) / elapsed:.0f} 条/秒，失败 {errors} 条")
+    for p in (50, 90, 99):
+        print(f"p{p} 延迟: {latencies[int(len(latencies) * p / 100) - 1] * 1000:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="模拟微信服务器推送消息")
+    parser.add_argument("--url", default="http://127.0.0.1:8001/api/v1/wechat/callback")
+    parser.add_argument("--token", required=True, help="与服务端 WECHAT_TOKEN 一致")
+    parser.add_argument("--total", type=int, default=10000, help="发送的不同消息数")
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--duplicate-rate", type=float, default=0.1, help="重复发送的消息比例")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
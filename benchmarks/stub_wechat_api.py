@@ -0,0 +1,89 @@
+# 本地模拟的微信接口，用于测试和压测，不依赖真实的微信服务器
+#
+# 用法：uvicorn benchmarks.stub_wechat_api:app --port 9000
+# 然后将 WECHAT_API_BASE 配置为 http://127.0.0.1:9000
+import random
+import asyncio
+import secrets
+import hashlib
+from collections import Counter
+
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+app = FastAPI()
+
+# 各接口被调用次数
+calls = Counter()
+
+# 模拟的 token 有效期（秒）、接口延迟（秒）和系统繁忙（errcode -1）的比例
+TOKEN_EXPIRES_IN = 7200
+LATENCY = 0.05
+BUSY_RATE = 0.05
+
+# 模拟的媒体文件大小（字节）
+MEDIA_SIZE = 2 * 1024 * 1024
+
+
+@app.get("/cgi-bin/token")
+async def get_token(grant_type: str, appid: str, secret: str):
+    calls["token"] += 1
+    await asyncio.sleep(LATENCY)
+    return {"access_token": f"stub-{calls['token']}-{secrets.token_hex(8)}", "expires_in": TOKEN_EXPIRES_IN}
+
+
+@app.post("/cgi-bin/message/custom/send")
+@app.post("/cgi-bin/message/template/send")
+async def send_message(request: Request, access_token: str):
+    payload = await request.json()
+    await asyncio.sleep(LATENCY)
+    if random.random() < BUSY_RATE:
+        calls["busy"] += 1
+        return {"errcode": -1, "errmsg": "system error"}
+    calls[request.url.path] += 1
+    return {"errcode": 0, "errmsg": "ok", "msgid": calls[request.url.path], "touser": payload.get("touser")}
+
+
+def _media_content(media_id: str):
+    """按 media_id 生成确定的伪随机内容，相同 media_id 内容相同，分块流式返回"""
+    async def content():
+        block = hashlib.sha256(media_id.encode()).digest() * 2048  # 64KB
+        sent = 0
+        while sent < MEDIA_SIZE:
+            chunk = block[:MEDIA_SIZE - sent]
+            sent += len(chunk)
+            yield chunk
+            await asyncio.sleep(0)
+    return content()
+
+
+@app.get("/cgi-bin/media/get")
+async def get_media(request: Request, access_token: str, media_id: str):
+    """以 video 开头的 media_id 模拟视频素材：返回 video_url，内容需要再下载一次"""
+    calls["media"] += 1
+    if media_id.startswith("missing"):
+        return {"errcode": 40007, "errmsg": "invalid media_id"}
+    if media_id.startswith("video"):
+        return {"video_url": str(request.url_for("get_video", media_id=media_id))}
+    return StreamingResponse(_media_content(media_id), media_type="image/jpeg", headers={
+        "Content-Disposition": f'attachment; filename="{media_id}.jpg"',
+        "Content-Length": str(MEDIA_SIZE)
+    })
+
+
+@app.get("/stub/video/{media_id}")
+async def get_video(media_id: str):
+    calls["video"] += 1
+    return StreamingResponse(_media_content(media_id), media_type="video/mp4",
+                             headers={"Content-Length": str(MEDIA_SIZE)})
+
+
+@app.get("/stub/stats")
+async def get_stats():
+    return dict(calls)
+
+
+@app.post("/stub/reset")
+async def reset():
+    calls.clear()
+    return {}
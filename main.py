@@ -4,15 +4,35 @@ from fastapi.middleware.cors import CORSMiddleware
 
 from app.routers import router  # 从 __init__.py 导入聚合后的路由
 from app.logger import setup_logger, RequestLoggerMiddleware
+from app.config import settings
+from app.db_services.database import engine
+from app.services.wechat_service import wechat_dispatcher, wechat_sender, token_manager, close_http_client
+from app.services.session_store import session_store
+from app.services.keyword_rules import keyword_engine
+from app.services.llm_service import llm_backend
+from app.services.job_service import job_runner
+from app.services.ticket_events import ticket_broadcaster
+from app.services.thumbnail_service import thumbnail_service
+from app.services.idempotency_service import idempotency_store
+from app.monitor import ProfilerMiddleware, loop_monitor
+from app.middleware import CompressionMiddleware
+from app.utils.response import FastJSONResponse
 
 # 设置日志系统
 logger = setup_logger()
 
-app = FastAPI()
+# 默认使用 orjson 序列化响应
+app = FastAPI(default_response_class=FastJSONResponse)
 
 # 添加请求日志中间件（确保最先执行）
 app.add_middleware(RequestLoggerMiddleware)
 
+# 添加按请求剖析中间件（未开启时无额外开销）
+app.add_middleware(ProfilerMiddleware)
+
+# 添加响应压缩中间件（gzip / brotli）
+app.add_middleware(CompressionMiddleware)
+
 # 配置CORS
 app.add_middleware(
     CORSMiddleware,
@@ -29,10 +49,36 @@ app.include_router(router)
 @app.on_event("startup")
 async def startup_event():
     logger.info("应用启动")
+    if settings.LOOP_LAG_ENABLED:
+        await loop_monitor.start()
+    await session_store.start()
+    await keyword_engine.start()
+    await wechat_dispatcher.start()
+    if settings.WECHAT_APP_ID:
+        await token_manager.start()
+    await wechat_sender.start()
+    await ticket_broadcaster.start()
+    await idempotency_store.start()
+    if settings.JOB_RUNNER_ENABLED:
+        await job_runner.start()
 
 @app.on_event("shutdown")
 async def shutdown_event():
     logger.info("应用关闭")
+    await job_runner.stop()
+    await ticket_broadcaster.stop()
+    await thumbnail_service.stop()
+    await idempotency_store.stop()
+    await wechat_dispatcher.stop()
+    await session_store.stop()
+    await keyword_engine.stop()
+    await wechat_sender.stop()
+    await token_manager.stop()
+    await close_http_client()
+    await llm_backend.close()
+    await loop_monitor.stop()
+    # 释放数据库连接池
+    await engine.dispose()
 
 if __name__ == "__main__":
     logger.info("正在启动服务器...")
@@ -0,0 +1,57 @@
+# 测试公共配置
+#
+# 使用临时目录中的 SQLite 数据库和附件目录，不依赖 MySQL、Redis 和真实的微信服务器。
+# 异步测试使用 anyio 自带的 pytest 插件（@pytest.mark.anyio）。
+import os
+import tempfile
+
+# 必须在导入 app 之前设置，Settings 在导入时读取环境变量
+TMP_DIR = tempfile.mkdtemp(prefix="wechat-backend-test-")
+os.environ.update({
+    "DATABASE_URL": f"sqlite+aiosqlite:///{TMP_DIR}/test.db",
+    "ATTACHMENT_DIR": os.path.join(TMP_DIR, "attachments"),
+    "WECHAT_TOKEN_CACHE_FILE": os.path.join(TMP_DIR, "wechat_access_token.json"),
+    "JOB_RUNNER_ENABLED": "false",
+    "LOOP_LAG_ENABLED": "false",
+})
+for name in ("DB_HOST", "DB_USER", "DB_PASSWORD", "DB_NAME", "JWT_SECRET_KEY"):
+    os.environ.setdefault(name, "test")
+os.environ.setdefault("DB_PORT", "3306")
+
+import pytest
+from sqlmodel import SQLModel
+
+import app.models  # noqa: F401,E402  导入所有模型，注册到 SQLModel.metadata
+from app.db_services.database import async_session_factory, engine  # noqa: E402
+from app.models.user import User  # noqa: E402
+from app.models.ticket import Ticket  # noqa: E402
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+async def db():
+    """每个测试使用重新建立的空表"""
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.drop_all)
+        await conn.run_sync(SQLModel.metadata.create_all)
+    async with async_session_factory() as session:
+        yield session
+    # 每个测试运行在新的事件循环中，释放绑定在旧循环上的连接
+    await engine.dispose()
+
+
+@pytest.fixture
+async def ticket(db) -> Ticket:
+    """一个用户及其创建的问题单"""
+    user = User(name="alice", phone="13800000000", email="alice@example.com", password="x")
+    db.add(user)
+    await db.flush()
+    ticket = Ticket(device_model="M1", customer="ACME", fault_phenomenon="不开机", user_id=user.id)
+    db.add(ticket)
+    await db.commit()
+    await db.refresh(ticket)
+    return ticket
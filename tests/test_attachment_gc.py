@@ -0,0 +1,79 @@
+# 不再被引用的附件文件清理
+import os
+import time
+
+import orjson
+import pytest
+from sqlalchemy import select
+
+from app.config import settings
+from app.models.job import Job
+from app.models.ticket import AttachmentType
+from app.services.attachment_service import collect_unreferenced_blobs, record_attachment
+from app.services.attachment_storage import absolute_path, store_stream
+from app.services.thumbnail_service import thumbnail_service
+from app.services.ticket_service import delete_ticket_service
+
+pytestmark = pytest.mark.anyio
+
+
+async def _chunks(data: bytes):
+    yield data
+
+
+def _age(file_path: str, seconds: float):
+    past = time.time() - seconds
+    os.utime(absolute_path(file_path), (past, past))
+
+
+async def test_removes_idle_unreferenced_blob_and_thumbnails(db):
+    stored = await store_stream(_chunks(b"orphan"))
+    thumbnail = absolute_path(thumbnail_service.thumbnail_file(stored.file_path, "small"))
+    open(thumbnail, "wb").close()
+    _age(stored.file_path, settings.ATTACHMENT_GC_GRACE + 1)
+
+    result = await collect_unreferenced_blobs({"hashes": [stored.content_hash]})
+
+    assert result == {"removed": 1, "deferred": 0}
+    assert not os.path.exists(absolute_path(stored.file_path))
+    assert not os.path.exists(thumbnail)
+
+
+async def test_keeps_referenced_blob(db, ticket):
+    stored = await store_stream(_chunks(b"referenced"))
+    await record_attachment(db, ticket.id, stored, AttachmentType.DOCUMENT)
+    await db.commit()
+    _age(stored.file_path, settings.ATTACHMENT_GC_GRACE + 1)
+
+    result = await collect_unreferenced_blobs({"hashes": [stored.content_hash]})
+
+    assert result == {"removed": 0, "deferred": 0}
+    assert os.path.exists(absolute_path(stored.file_path))
+
+
+async def test_defers_blob_reused_by_concurrent_upload(db):
+    stored = await store_stream(_chunks(b"reused"))
+    _age(stored.file_path, settings.ATTACHMENT_GC_GRACE + 1)
+    # 相同内容的上传复用了该文件，但还没有提交附件记录
+    reused = await store_stream(_chunks(b"reused"))
+    assert reused.deduplicated
+
+    result = await collect_unreferenced_blobs({"hashes": [stored.content_hash]})
+
+    assert result == {"removed": 0, "deferred": 1}
+    assert os.path.exists(absolute_path(stored.file_path))
+    jobs = (await db.execute(select(Job).where(Job.name == "attachment_gc"))).scalars().all()
+    assert len(jobs) == 1
+
+
+async def test_ticket_delete_schedules_cleanup(db, ticket):
+    stored = await store_stream(_chunks(b"deleted with ticket"))
+    await record_attachment(db, ticket.id, stored, AttachmentType.DOCUMENT)
+    await db.commit()
+    _age(stored.file_path, settings.ATTACHMENT_GC_GRACE + 1)
+
+    assert await delete_ticket_service(db, ticket.id)
+    job = (await db.execute(select(Job).where(Job.name == "attachment_gc"))).scalars().one()
+    await collect_unreferenced_blobs(orjson.loads(job.payload))
+
+    assert not os.path.exists(absolute_path(stored.file_path))
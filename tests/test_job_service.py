@@ -0,0 +1,149 @@
+# 后台任务执行器：领取、重试、锁定超时和锁被接管
+import asyncio
+
+import pytest
+from sqlalchemy import update
+
+from app.db_services.database import async_session_factory
+from app.models.job import Job, JobStatus
+from app.services import job_service
+from app.services.job_service import JobRunner, enqueue_job
+
+pytestmark = pytest.mark.anyio
+
+
+def make_runner(visibility_timeout: float = 30) -> JobRunner:
+    return JobRunner(worker_count=1, poll_interval=0.05, visibility_timeout=visibility_timeout,
+                     retry_base_delay=0, retry_max_delay=0)
+
+
+async def load_job(job_id: int) -> Job:
+    async with async_session_factory() as session:
+        return await session.get(Job, job_id)
+
+
+async def test_claim_once(db, monkeypatch):
+    calls = []
+
+    async def handler(payload):
+        calls.append(payload)
+        return {"ok": True}
+
+    monkeypatch.setitem(job_service.JOB_HANDLERS, "test_ok", handler)
+    job = await enqueue_job("test_ok", {"n": 1})
+    runner = make_runner()
+
+    claimed = await runner.claim("w1")
+    assert claimed.id == job.id and claimed.attempts == 1
+    # 已被领取且未超时的任务不会被再次领取
+    assert await runner.claim("w2") is None
+
+    await runner._execute(claimed, "w1")
+    stored = await load_job(job.id)
+    assert calls == [{"n": 1}]
+    assert stored.status == JobStatus.SUCCEEDED
+    assert stored.locked_by is None
+    assert runner.succeeded == 1
+
+
+async def test_retry_then_fail(db, monkeypatch):
+    async def handler(payload):
+        raise RuntimeError("boom")
+
+    monkeypatch.setitem(job_service.JOB_HANDLERS, "test_fail", handler)
+    job = await enqueue_job("test_fail", max_attempts=2)
+    runner = make_runner()
+
+    await runner._execute(await runner.claim("w1"), "w1")
+    stored = await load_job(job.id)
+    assert stored.status == JobStatus.PENDING
+    assert stored.attempts == 1
+    assert "boom" in stored.last_error
+    assert runner.retried == 1
+
+    await runner._execute(await runner.claim("w1"), "w1")
+    stored = await load_job(job.id)
+    assert stored.status == JobStatus.FAILED
+    assert stored.attempts == 2
+    assert stored.finished_at is not None
+    assert runner.failed == 1
+    assert await runner.claim("w1") is None
+
+
+async def test_reclaim_after_visibility_timeout(db, monkeypatch):
+    monkeypatch.setitem(job_service.JOB_HANDLERS, "test_slow", lambda payload: asyncio.sleep(0))
+    job = await enqueue_job("test_slow")
+    runner = make_runner(visibility_timeout=0.2)
+
+    first = await runner.claim("w1")
+    assert first.id == job.id
+    assert await runner.claim("w2") is None
+
+    # w1 没有续期（进程崩溃），锁定超时后由其他 worker 重新领取
+    await asyncio.sleep(0.3)
+    second = await runner.claim("w2")
+    assert second.id == job.id
+    assert second.attempts == 2
+    assert second.locked_by == "w2"
+
+    # 原 worker 的执行结果被忽略
+    assert await runner._update(first, "w1", status=JobStatus.SUCCEEDED) is False
+    assert (await load_job(job.id)).status == JobStatus.RUNNING
+
+
+async def test_lock_lost_cancels_handler(db, monkeypatch):
+    started = asyncio.Event()
+    cancelled = asyncio.Event()
+
+    async def handler(payload):
+        started.set()
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    monkeypatch.setitem(job_service.JOB_HANDLERS, "test_long", handler)
+    job = await enqueue_job("test_long")
+    runner = make_runner(visibility_timeout=0.3)
+    claimed = await runner.claim("w1")
+
+    execute = asyncio.create_task(runner._execute(claimed, "w1"))
+    await started.wait()
+    # 模拟任务已被其他 worker 接管
+    async with async_session_factory() as session:
+        await session.execute(update(Job).where(Job.id == job.id).values(locked_by="w2"))
+        await session.commit()
+
+    await asyncio.wait_for(execute, 2)
+    assert cancelled.is_set()
+    assert runner.lost == 1
+    assert runner.running == {}
+    stored = await load_job(job.id)
+    # 任务状态交给接管的 worker，不放回队列
+    assert stored.status == JobStatus.RUNNING
+    assert stored.locked_by == "w2"
+
+
+async def test_stop_requeues_running_job(db, monkeypatch):
+    started = asyncio.Event()
+
+    async def handler(payload):
+        started.set()
+        await asyncio.sleep(10)
+
+    monkeypatch.setitem(job_service.JOB_HANDLERS, "test_long", handler)
+    job = await enqueue_job("test_long")
+    runner = make_runner()
+    claimed = await runner.claim("w1")
+
+    execute = asyncio.create_task(runner._execute(claimed, "w1"))
+    await started.wait()
+    # 执行器关闭时取消执行中的任务，任务放回队列且不计执行次数
+    execute.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await execute
+    stored = await load_job(job.id)
+    assert stored.status == JobStatus.PENDING
+    assert stored.attempts == 0
+    assert runner.lost == 0
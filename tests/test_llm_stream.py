@@ -0,0 +1,84 @@
+# 大模型流式回复（使用本地确定性假后端）
+import httpx
+import orjson
+import pytest
+
+from app.dependencies.auth import get_current_user
+from app.models.user import User
+from app.services import llm_service
+from app.services.llm_service import FakeLLMBackend, LLMMetrics, stream_reply
+
+pytestmark = pytest.mark.anyio
+
+PARAMS = {"temperature": 0.7, "max_tokens": 16}
+
+
+@pytest.fixture
+def backend(monkeypatch) -> FakeLLMBackend:
+    backend = FakeLLMBackend(first_token_delay=0, token_interval=0)
+    monkeypatch.setattr(llm_service, "llm_backend", backend)
+    monkeypatch.setattr(llm_service, "llm_metrics", LLMMetrics())
+    return backend
+
+
+def parse_sse(body: bytes):
+    """解析 SSE 响应体，返回 (event, data) 列表"""
+    events = []
+    for block in body.decode().split("\n\n"):
+        if not block:
+            continue
+        event = "message"
+        data = None
+        for line in block.split("\n"):
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+            elif line.startswith("data: "):
+                data = orjson.loads(line[len("data: "):])
+        events.append((event, data))
+    return events
+
+
+async def test_fake_backend_is_deterministic(backend):
+    first = [token async for token in backend.stream("设备不开机", PARAMS)]
+    second = [token async for token in backend.stream("设备不开机", PARAMS)]
+
+    assert first == second == backend._tokens("设备不开机", PARAMS)
+    assert len(first) == PARAMS["max_tokens"]
+
+
+async def test_stream_reply_records_metrics(backend):
+    tokens = [token async for token in stream_reply("设备不开机", PARAMS, user_id=1)]
+
+    assert tokens == backend._tokens("设备不开机", PARAMS)
+    metrics = llm_service.llm_metrics.summary()
+    assert metrics["requests"] == metrics["completed"] == 1
+    assert metrics["tokens"] == PARAMS["max_tokens"]
+    assert metrics["ttft_p50"] is not None
+
+
+async def test_stream_reply_closed_early_counts_cancelled(backend):
+    generator = stream_reply("设备不开机", PARAMS, user_id=1)
+    assert await generator.__anext__()
+    await generator.aclose()
+
+    metrics = llm_service.llm_metrics.summary()
+    assert metrics["cancelled"] == 1
+    assert metrics["completed"] == 0
+
+
+async def test_chat_endpoint_streams_sse(backend):
+    from main import app
+
+    app.dependency_overrides[get_current_user] = lambda: User(id=1, name="alice", phone="13800000000",
+                                                              email="alice@example.com", password="x")
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            response = await client.post("/api/v1/llm/chat", json={"prompt": "设备不开机", **PARAMS})
+    finally:
+        app.dependency_overrides.pop(get_current_user, None)
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = parse_sse(response.content)
+    assert events[-1] == ("done", {})
+    assert [data["token"] for event, data in events[:-1]] == backend._tokens("设备不开机", PARAMS)
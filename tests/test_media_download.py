@@ -0,0 +1,61 @@
+# 微信媒体文件下载（使用本地模拟的微信接口 benchmarks/stub_wechat_api.py）
+import os
+
+import httpx
+import pytest
+from sqlalchemy import select
+
+from benchmarks import stub_wechat_api as stub
+from app.models.ticket import Attachment, AttachmentType
+from app.services.attachment_storage import absolute_path
+from app.services.media_service import MediaDownloader
+from app.services.wechat_service import AccessTokenManager, WechatAPIError
+from tests.conftest import TMP_DIR
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def downloader():
+    stub.calls.clear()
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=stub.app), base_url="http://stub") as client:
+        tokens = AccessTokenManager("appid", "secret", os.path.join(TMP_DIR, "media-token.json"), client=client)
+        yield MediaDownloader(tokens, concurrency=4, client=client)
+    if os.path.exists(tokens.cache_file):
+        os.remove(tokens.cache_file)
+
+
+async def test_download_image_to_ticket(db, ticket, downloader):
+    attachment = await downloader.download_to_ticket(db, ticket.id, "image-1", AttachmentType.IMAGE)
+
+    assert attachment.ticket_id == ticket.id
+    assert attachment.content_type == "image/jpeg"
+    assert attachment.file_size == stub.MEDIA_SIZE
+    assert os.path.getsize(absolute_path(attachment.file_path)) == stub.MEDIA_SIZE
+
+
+async def test_same_media_recorded_once(db, ticket, downloader):
+    attachments = await downloader.download_many(db, ticket.id, [("image-2", AttachmentType.IMAGE)] * 3)
+
+    assert len({attachment.id for attachment in attachments}) == 1
+    assert downloader.deduplicated >= 2
+    rows = (await db.execute(select(Attachment).where(Attachment.ticket_id == ticket.id))).scalars().all()
+    assert len(rows) == 1
+
+
+async def test_video_follows_video_url(db, ticket, downloader):
+    attachment = await downloader.download_to_ticket(db, ticket.id, "video-1", AttachmentType.VIDEO)
+
+    assert stub.calls["video"] == 1
+    assert attachment.content_type == "video/mp4"
+    assert attachment.file_size == stub.MEDIA_SIZE
+
+
+async def test_error_response_raises_and_records_nothing(db, ticket, downloader):
+    with pytest.raises(WechatAPIError) as exc_info:
+        await downloader.download_many(db, ticket.id, [("image-3", AttachmentType.IMAGE),
+                                                       ("missing-1", AttachmentType.IMAGE)])
+
+    assert exc_info.value.errcode == 40007
+    rows = (await db.execute(select(Attachment).where(Attachment.ticket_id == ticket.id))).scalars().all()
+    assert rows == []
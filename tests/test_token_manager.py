@@ -0,0 +1,68 @@
+# 微信 access_token 刷新（使用本地模拟的微信接口 benchmarks/stub_wechat_api.py）
+import asyncio
+import os
+
+import httpx
+import pytest
+
+from benchmarks import stub_wechat_api as stub
+from app.services.wechat_service import AccessTokenManager
+from tests.conftest import TMP_DIR
+
+pytestmark = pytest.mark.anyio
+
+CACHE_FILE = os.path.join(TMP_DIR, "token-test.json")
+
+
+@pytest.fixture
+async def client():
+    stub.calls.clear()
+    if os.path.exists(CACHE_FILE):
+        os.remove(CACHE_FILE)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=stub.app), base_url="http://stub") as client:
+        yield client
+
+
+def make_manager(client) -> AccessTokenManager:
+    return AccessTokenManager("appid", "secret", CACHE_FILE, client=client)
+
+
+async def test_concurrent_calls_fetch_once(client):
+    tokens = make_manager(client)
+
+    results = await asyncio.gather(*(tokens.get_token() for _ in range(20)))
+
+    assert len(set(results)) == 1
+    assert tokens.fetch_count == 1
+    assert stub.calls["token"] == 1
+    # 有效期内直接使用进程内缓存
+    assert await tokens.get_token() == results[0]
+    assert stub.calls["token"] == 1
+
+
+async def test_cache_file_shared_between_managers(client):
+    first = make_manager(client)
+    second = make_manager(client)
+
+    token = await first.get_token()
+
+    # 另一个 worker 进程从缓存文件读到已刷新的 token，不再调用接口
+    assert await second.get_token() == token
+    assert second.fetch_count == 0
+    assert stub.calls["token"] == 1
+
+
+async def test_invalidate_fetches_new_token(client):
+    first = make_manager(client)
+    second = make_manager(client)
+    token = await first.get_token()
+    assert await second.get_token() == token
+
+    new_token = await first.invalidate(token)
+    assert new_token != token
+    assert stub.calls["token"] == 2
+
+    # 其他 worker 也发现 token 失效时，使用缓存文件中已刷新的 token
+    assert await second.invalidate(token) == new_token
+    assert second.fetch_count == 0
+    assert stub.calls["token"] == 2
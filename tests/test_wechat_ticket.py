@@ -0,0 +1,43 @@
+# 微信用户通过验证码选择问题单
+import pytest
+
+from app.config import settings
+from app.services.wechat_ticket_service import (
+    RedeemResult, get_bound_ticket, issue_ticket_code, redeem_ticket_code
+)
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_code_binds_openid_once(db, ticket):
+    code, _ = await issue_ticket_code(db, ticket.id, ticket.user_id)
+
+    assert await redeem_ticket_code(db, "openid-1", ticket.id, code) == RedeemResult.BOUND
+    assert await get_bound_ticket(db, "openid-1") == ticket.id
+    # 验证码只能使用一次
+    assert await redeem_ticket_code(db, "openid-2", ticket.id, code) == RedeemResult.EXPIRED
+    assert await get_bound_ticket(db, "openid-2") is None
+
+
+async def test_ticket_id_alone_is_not_enough(db, ticket):
+    assert await redeem_ticket_code(db, "openid-1", ticket.id, "000000") == RedeemResult.EXPIRED
+    assert await get_bound_ticket(db, "openid-1") is None
+
+
+async def test_code_revoked_after_too_many_failures(db, ticket):
+    code, _ = await issue_ticket_code(db, ticket.id, ticket.user_id)
+    wrong = f"{(int(code) + 1) % 10 ** 6:06d}"
+
+    for _ in range(settings.WECHAT_TICKET_CODE_MAX_ATTEMPTS):
+        assert await redeem_ticket_code(db, "openid-1", ticket.id, wrong) == RedeemResult.INVALID
+    assert await redeem_ticket_code(db, "openid-1", ticket.id, code) == RedeemResult.EXPIRED
+    assert await get_bound_ticket(db, "openid-1") is None
+
+
+async def test_new_code_replaces_old(db, ticket):
+    old_code, _ = await issue_ticket_code(db, ticket.id, ticket.user_id)
+    new_code, _ = await issue_ticket_code(db, ticket.id, ticket.user_id)
+
+    if old_code != new_code:
+        assert await redeem_ticket_code(db, "openid-1", ticket.id, old_code) == RedeemResult.INVALID
+    assert await redeem_ticket_code(db, "openid-1", ticket.id, new_code) == RedeemResult.BOUND